@@ -3,17 +3,24 @@ import logging
 from flask import Flask
 from flask_cors import CORS
 
+# Size Polars and NumPy thread pools to this worker's share of the CPUs before either is imported
+from utils.serving import apply_thread_budget, init_admission_control
+THREAD_BUDGET = apply_thread_budget()
+
 # Import route registration function
 from routes import register_routes
+from services.job_service import init_job_manager
+from services.result_cache import init_result_cache
+from services.catalog import init_catalog
+from services.upload_sessions import init_upload_sessions
+from services.simulation_service import init_simulator
+from services.partition_service import init_partition_optimizer
+from services.results_service import init_result_query_memo
+from utils.instrumentation import init_instrumentation
+from utils.logging_config import configure_logging, init_request_logging
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+# Configure logging from LOG_LEVEL, LOG_FORMAT and LOG_FILE; records are written off-thread
+configure_logging()
 logger = logging.getLogger('inventory_optimizer_app')
 
 # Create the Flask app
@@ -23,22 +30,97 @@ CORS(app)  # Enable CORS for all routes
 # Configure file upload settings
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+JOBS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs')
+CACHE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+DEMAND_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'demand')
+DATASETS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datasets')
+UPLOAD_SESSIONS_FOLDER = os.path.join(UPLOAD_FOLDER, 'sessions')
+PARTITIONS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'partitions')
+LOGS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
 ALLOWED_EXTENSIONS = {'csv'}
 
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+os.makedirs(JOBS_FOLDER, exist_ok=True)
+os.makedirs(CACHE_FOLDER, exist_ok=True)
+os.makedirs(DEMAND_FOLDER, exist_ok=True)
+os.makedirs(DATASETS_FOLDER, exist_ok=True)
+os.makedirs(UPLOAD_SESSIONS_FOLDER, exist_ok=True)
+os.makedirs(PARTITIONS_FOLDER, exist_ok=True)
+os.makedirs(LOGS_FOLDER, exist_ok=True)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max upload
+app.config['JOBS_FOLDER'] = JOBS_FOLDER
+app.config['CACHE_FOLDER'] = CACHE_FOLDER
+app.config['DEMAND_FOLDER'] = DEMAND_FOLDER
+app.config['DATASETS_FOLDER'] = DATASETS_FOLDER
+app.config['UPLOAD_SESSIONS_FOLDER'] = UPLOAD_SESSIONS_FOLDER
+app.config['PARTITIONS_FOLDER'] = PARTITIONS_FOLDER
+app.config['PROFILE_FOLDER'] = LOGS_FOLDER
+app.config['CATALOG_PATH'] = os.environ.get('CATALOG_PATH', os.path.join(UPLOAD_FOLDER, 'catalog.db'))  # SQLite catalog of uploaded datasets
+app.config['UPLOAD_WORKERS'] = int(os.environ['UPLOAD_WORKERS']) if os.environ.get('UPLOAD_WORKERS') else None  # Files converted at once per upload (default: a share of Polars' thread pool)
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))  # Chunk size for resumable uploads; must fit under MAX_CONTENT_LENGTH
+app.config['UPLOAD_MAX_SIZE'] = int(os.environ.get('UPLOAD_MAX_SIZE', 10 * 1024 * 1024 * 1024))  # Largest file accepted by resumable uploads (10 GB)
+app.config['UPLOAD_SESSION_TTL'] = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))  # Seconds before an untouched upload session is removed
+app.config['UPLOAD_CONVERT_TIMEOUT'] = int(os.environ.get('UPLOAD_CONVERT_TIMEOUT', 3600))  # Seconds before an unfinished conversion may be restarted
+app.config['THREAD_BUDGET'] = THREAD_BUDGET  # Threads this worker may use; each process pool splits them between its processes
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', min(2, THREAD_BUDGET)))  # Size of the optimization process pool
+app.config['SIMULATION_WORKERS'] = int(os.environ.get('SIMULATION_WORKERS', THREAD_BUDGET))  # Processes used by Monte Carlo simulations
+app.config['PARTITION_WORKERS'] = int(os.environ.get('PARTITION_WORKERS', THREAD_BUDGET))  # Processes optimizing partitions in parallel
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 1024 * 1024 * 1024))  # 1 GB of cached results
+app.config['RESULTS_QUERY_MEMO_ENTRIES'] = int(os.environ.get('RESULTS_QUERY_MEMO_ENTRIES', 256))  # Top-N, rollup and histogram responses kept per worker
+app.config['RESULT_CACHE_MAX_AGE'] = int(os.environ.get('RESULT_CACHE_MAX_AGE', 7 * 24 * 3600))  # Seconds before a cached result expires
+# Profile requests and dump those slower than this many seconds (disabled when unset)
+app.config['PROFILE_SLOW_REQUEST_SECONDS'] = float(os.environ['PROFILE_SLOW_REQUEST_SECONDS']) if os.environ.get('PROFILE_SLOW_REQUEST_SECONDS') else None
+app.config['PROFILE_MAX_DUMPS'] = int(os.environ.get('PROFILE_MAX_DUMPS', 1))  # Slow-request profiles written per process
+app.config['MAX_HEAVY_REQUESTS'] = int(os.environ.get('MAX_HEAVY_REQUESTS', 1))  # CPU-heavy requests run at once per worker; more get 429
+app.config['ADMISSION_WAIT_SECONDS'] = float(os.environ.get('ADMISSION_WAIT_SECONDS', 0.5))  # Wait for a free slot before answering 429
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max request; larger files use chunked uploads via /api/uploads
 
-logger.info(f"Upload folder: {UPLOAD_FOLDER}")
-logger.info(f"Output folder: {OUTPUT_FOLDER}")
+logger.info("Upload folder: %s", UPLOAD_FOLDER)
+logger.info("Output folder: %s", OUTPUT_FOLDER)
+logger.info("Jobs folder: %s", JOBS_FOLDER)
+logger.info("Cache folder: %s", CACHE_FOLDER)
+logger.info("Demand history folder: %s", DEMAND_FOLDER)
+logger.info("Datasets folder: %s", DATASETS_FOLDER)
+logger.info("Partitioned datasets folder: %s", PARTITIONS_FOLDER)
 
 # Register all route blueprints
 register_routes(app)
 
+# Tag log records with a per-request ID
+init_request_logging(app)
+
+# Time requests and pipeline stages for the /api/metrics endpoint
+init_instrumentation(app)
+
+# Cap concurrent CPU-heavy requests so a saturated worker answers 429 instead of queueing
+init_admission_control(app)
+
+# Load the content-addressed optimization result cache
+init_result_cache(app)
+
+# Start the background job manager used for asynchronous optimizations; completed
+# jobs store their results in the result cache
+init_job_manager(app)
+
+# Memoize top-N, rollup and histogram queries per result set
+init_result_query_memo(app)
+
+# Open the catalog of uploaded datasets (schemas, stats and previews)
+init_catalog(app)
+
+# Accept large files as resumable chunked uploads, converted as soon as the last chunk lands
+init_upload_sessions(app)
+
+# Create the Monte Carlo simulator, whose worker pool starts on first use
+init_simulator(app)
+
+# Create the per-partition optimizer, whose worker pool starts on first use
+init_partition_optimizer(app)
+
 if __name__ == '__main__':
     logger.info("Starting Flask application on port 5000")
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
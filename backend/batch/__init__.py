@@ -0,0 +1 @@
+# Batch optimization package initialization
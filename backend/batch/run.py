@@ -0,0 +1,351 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import logging
+import tempfile
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.dataset_loader import COMBINE_MODES
+from utils.logging_config import configure_logging
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_batch')
+
+INPUT_EXTENSIONS = ('.csv', '.parquet')
+
+OUTPUT_FORMATS = ('parquet', 'csv')
+
+# SKUs optimized and written at a time, which bounds memory for very large inputs
+BATCH_CHUNK_ROWS = 500_000
+
+
+def expand_inputs(patterns):
+    """
+    Resolve input arguments to a sorted list of CSV and Parquet files.
+
+    Args:
+        patterns (list): Files, directories (their CSV and Parquet files are
+            used) or glob patterns; '**' matches subdirectories
+
+    Returns:
+        list: Absolute paths, without duplicates
+
+    Raises:
+        ValueError: If a pattern matches no input files
+    """
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        matches = [path for path in matches
+                   if os.path.isfile(path) and path.lower().endswith(INPUT_EXTENSIONS)]
+        if not matches:
+            raise ValueError(f"No CSV or Parquet files match '{pattern}'")
+        paths.extend(os.path.abspath(path) for path in matches)
+    return sorted(set(paths))
+
+
+def _to_parquet(path, work_dir):
+    """Convert a CSV input with the same ingestion the upload endpoint uses; Parquet passes through"""
+    from utils.data_processor import ingest_csv
+
+    if path.lower().endswith('.parquet'):
+        return path, None
+    stem = os.path.splitext(os.path.basename(path))[0]
+    fd, parquet_path = tempfile.mkstemp(prefix=f"{stem}_", suffix='.parquet', dir=work_dir)
+    os.close(fd)
+    return parquet_path, ingest_csv(path, parquet_path)
+
+
+def optimize_to_file(parquet_paths, output_path, output_format='parquet', combine='concat',
+                     params=None, demand_stats_path=None, chunk_rows=BATCH_CHUNK_ROWS):
+    """
+    Optimize inventory files and write the results to disk in bounded memory.
+
+    Builds the same lazy query as optimize_inventory. With combine='concat'
+    each file is read as record batches of at most chunk_rows SKUs, straight
+    from its row groups, and the model runs on one batch at a time, so every
+    row is decoded once and each chunk is appended to the output before the
+    next is read. Joined inputs need every file at once and are collected
+    with the streaming engine.
+
+    Args:
+        parquet_paths (list): Input Parquet files, treated as one dataset
+        output_path (str): Result file to write
+        output_format (str): 'parquet' or 'csv'
+        combine (str): How multiple files are combined, 'concat' or 'join'
+        params (dict, optional): Optimization model parameters
+        demand_stats_path (str, optional): Demand statistics from sales history
+        chunk_rows (int): SKUs optimized per chunk
+
+    Returns:
+        int: Rows written
+
+    Raises:
+        ValueError: If the inputs lack columns the model needs; unlike the
+            web app, a batch run never falls back to the sample inventory
+    """
+    import polars as pl
+    import pyarrow.parquet as pq
+    from services.optimization_service import (
+        REQUIRED_COLUMNS, OPTIONAL_COLUMNS, apply_demand_stats, build_optimization_plan
+    )
+    from utils.dataset_loader import scan_dataset, unify_schemas, conform_to_schema
+    from utils.instrumentation import span, file_sizes
+
+    inventory = scan_dataset(parquet_paths, how=combine, columns=REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
+    missing = [col for col in REQUIRED_COLUMNS if col not in inventory.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    def plan(lf):
+        if demand_stats_path:
+            lf = apply_demand_stats(lf, demand_stats_path)
+        return build_optimization_plan(lf, params)
+
+    if combine == 'concat':
+        def concat_chunks():
+            # Polars does not push slices into Parquet scans, so chunks come
+            # from pyarrow's batch reader rather than from inventory.slice
+            target = unify_schemas([pl.read_parquet_schema(path) for path in parquet_paths],
+                                   REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
+            produced = False
+            for path in parquet_paths:
+                source = pq.ParquetFile(path)
+                present = [col for col in target if col in source.schema_arrow.names]
+                for batch in source.iter_batches(batch_size=chunk_rows, columns=present):
+                    df = pl.from_arrow(batch)
+                    produced = True
+                    yield plan(conform_to_schema(df.lazy(), df.schema, target)).collect()
+            if not produced:
+                # Empty inputs still produce a result file with the output columns
+                yield plan(inventory.limit(0)).collect()
+
+        chunks = concat_chunks()
+    else:
+        chunks = iter([plan(inventory).collect(streaming=True)])
+
+    rows = 0
+    with span('optimize', bytes_read=file_sizes(parquet_paths)) as stage, open(output_path, 'wb') as f:
+        writer = None
+        try:
+            for results in chunks:
+                if output_format == 'csv':
+                    results.write_csv(f, has_header=rows == 0)
+                else:
+                    table = results.to_arrow()
+                    if writer is None:
+                        writer = pq.ParquetWriter(f, table.schema, compression='zstd')
+                    writer.write_table(table)
+                rows += len(results)
+        finally:
+            if writer is not None:
+                writer.close()
+        stage.rows = rows
+    return rows
+
+
+def run_task(task):
+    """
+    Ingest and optimize one batch task; runs inside a worker process.
+
+    Args:
+        task (dict): inputs (list of files), output (result path), plus
+            output_format, combine, params and demand_stats_path
+
+    Returns:
+        dict: Per-task statistics, with 'error' set instead of raising
+    """
+    start = time.perf_counter()
+    stats = {
+        "inputs": task['inputs'],
+        "output": task['output'],
+        "bytes_read": sum(os.path.getsize(path) for path in task['inputs']),
+        "rows": None,
+        "ingest_seconds": 0.0,
+        "optimize_seconds": None,
+        "seconds": None,
+        "rows_per_sec": None,
+        "error": None
+    }
+    work_dir = tempfile.mkdtemp(prefix='batch_')
+    try:
+        parquet_paths = []
+        for path in task['inputs']:
+            parquet_path, ingest_stats = _to_parquet(path, work_dir)
+            parquet_paths.append(parquet_path)
+            if ingest_stats is not None:
+                stats['ingest_seconds'] += ingest_stats['seconds']
+
+        optimize_start = time.perf_counter()
+        stats['rows'] = optimize_to_file(parquet_paths, task['output'], task['output_format'],
+                                         task['combine'], task['params'], task['demand_stats_path'])
+        stats['optimize_seconds'] = round(time.perf_counter() - optimize_start, 4)
+    except Exception as e:
+        logger.error("Batch task for %s failed: %s", task['inputs'], e, exc_info=True)
+        stats['error'] = str(e)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    stats['seconds'] = round(elapsed, 4)
+    stats['ingest_seconds'] = round(stats['ingest_seconds'], 4)
+    if stats['rows'] is not None and elapsed > 0:
+        stats['rows_per_sec'] = round(stats['rows'] / elapsed, 1)
+    return stats
+
+
+def plan_tasks(input_paths, output_dir, output_format='parquet', combine=None, params=None,
+               demand_stats_path=None):
+    """
+    Split the inputs into tasks: one per file, or a single task when combining.
+
+    Returns:
+        list: Task dicts for run_task
+    """
+    settings = {"output_format": output_format, "combine": combine or 'concat', "params": params,
+                "demand_stats_path": demand_stats_path}
+    if combine:
+        output = os.path.join(output_dir, f"optimization_results.{output_format}")
+        return [dict(settings, inputs=input_paths, output=output)]
+
+    tasks = []
+    used = set()
+    for path in input_paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name, suffix = f"{stem}_optimized", 1
+        while name in used:
+            suffix += 1
+            name = f"{stem}_optimized_{suffix}"
+        used.add(name)
+        tasks.append(dict(settings, inputs=[path], output=os.path.join(output_dir, f"{name}.{output_format}")))
+    return tasks
+
+
+def run_batch(tasks, workers=1, on_result=None):
+    """
+    Run batch tasks, in parallel worker processes when workers > 1.
+
+    Each worker gets an equal share of the cores for its Polars thread pool
+    (unless POLARS_MAX_THREADS is already set), so running several files at
+    once does not oversubscribe the machine.
+
+    Args:
+        tasks (list): Tasks from plan_tasks
+        workers (int): Worker processes
+        on_result (callable, optional): Called with each task's statistics as it finishes
+
+    Returns:
+        dict: Totals and the per-task statistics
+    """
+    start = time.perf_counter()
+    results = []
+
+    def finished(stats):
+        results.append(stats)
+        if on_result is not None:
+            on_result(stats)
+
+    workers = max(1, min(workers, len(tasks)))
+    if workers == 1:
+        for task in tasks:
+            finished(run_task(task))
+    else:
+        # Spawned workers inherit the environment, and read it before importing Polars
+        os.environ.setdefault('POLARS_MAX_THREADS', str(max(1, (os.cpu_count() or 1) // workers)))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=configure_logging) as executor:
+            for future in as_completed([executor.submit(run_task, task) for task in tasks]):
+                finished(future.result())
+
+    elapsed = time.perf_counter() - start
+    rows = sum(stats['rows'] or 0 for stats in results)
+    bytes_read = sum(stats['bytes_read'] for stats in results)
+    return {
+        "created_at": datetime.now().isoformat(),
+        "workers": workers,
+        "tasks": len(tasks),
+        "failed": sum(1 for stats in results if stats['error']),
+        "rows": rows,
+        "bytes_read": bytes_read,
+        "seconds": round(elapsed, 4),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None,
+        "mb_per_sec": round(bytes_read / 1024 / 1024 / elapsed, 2) if elapsed > 0 else None,
+        "results": sorted(results, key=lambda stats: stats['output'])
+    }
+
+
+def _parse_params(values):
+    """Turn repeated name=value arguments into validated model parameters"""
+    from services.optimization_service import resolve_parameters
+
+    overrides = {}
+    for value in values or []:
+        name, sep, number = value.partition('=')
+        if not sep:
+            raise ValueError(f"Parameters must look like name=value, got '{value}'")
+        overrides[name.strip()] = number
+    return resolve_parameters(overrides)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize inventory files offline, without the web server")
+    parser.add_argument('inputs', nargs='+', help="CSV/Parquet files, directories or glob patterns")
+    parser.add_argument('--output-dir', required=True, help="Directory for the result files")
+    parser.add_argument('--format', default='parquet', choices=OUTPUT_FORMATS, help="Result file format")
+    parser.add_argument('--combine', choices=COMBINE_MODES,
+                        help="Optimize all inputs as one dataset, combined this way (default: one run per file)")
+    parser.add_argument('--param', action='append', metavar='NAME=VALUE',
+                        help="Override a model parameter, e.g. --param safety_factor=1.65")
+    parser.add_argument('--demand-stats', help="Demand statistics Parquet file from a demand history")
+    parser.add_argument('--workers', type=int, default=1, help="Files optimized in parallel processes")
+    parser.add_argument('--summary', help="JSON summary path (default: <output-dir>/batch_summary.json)")
+    args = parser.parse_args()
+
+    # Human-readable warnings on stderr; per-file statistics go to stdout
+    os.environ.setdefault('LOG_FORMAT', 'text')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    configure_logging()
+
+    try:
+        input_paths = expand_inputs(args.inputs)
+        params = _parse_params(args.param)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.demand_stats and not os.path.isfile(args.demand_stats):
+        parser.error(f"Demand statistics file not found: {args.demand_stats}")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    tasks = plan_tasks(input_paths, args.output_dir, args.format, args.combine, params, args.demand_stats)
+    print(f"Optimizing {len(input_paths)} files as {len(tasks)} tasks with {args.workers} workers", flush=True)
+
+    def report(stats):
+        if stats['error']:
+            print(f"FAILED {stats['output']}: {stats['error']}", flush=True)
+        else:
+            print(f"{stats['output']}: {stats['rows']} rows in {stats['seconds']}s "
+                  f"({stats['rows_per_sec']} rows/sec, ingest {stats['ingest_seconds']}s, "
+                  f"optimize {stats['optimize_seconds']}s)", flush=True)
+
+    summary = run_batch(tasks, workers=args.workers, on_result=report)
+    summary['parameters'] = params
+    summary_path = args.summary or os.path.join(args.output_dir, 'batch_summary.json')
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"{summary['rows']} rows from {summary['bytes_read'] / 1024 / 1024:.1f} MB in {summary['seconds']}s: "
+          f"{summary['rows_per_sec']} rows/sec, {summary['mb_per_sec']} MB/sec, "
+          f"{summary['failed']} of {summary['tasks']} tasks failed. Summary: {summary_path}", flush=True)
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
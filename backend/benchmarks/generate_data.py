@@ -0,0 +1,123 @@
+import os
+import time
+import argparse
+import logging
+import numpy as np
+import polars as pl
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_benchmarks')
+
+# Rows generated and written per chunk, which bounds memory for very large files
+GENERATE_CHUNK_ROWS = 1_000_000
+
+# Column headers as they tend to appear in exported spreadsheets; the upload
+# standardizes them to the lowercase names the optimizer expects
+CSV_HEADERS = {
+    'product_id': 'Product ID',
+    'name': 'Name',
+    'category': 'Category',
+    'current_stock': 'Current Stock',
+    'unit_cost': 'Unit Cost',
+    'lead_time_days': 'Lead Time Days',
+    'daily_demand': 'Daily Demand',
+    'demand_std_dev': 'Demand Std Dev'
+}
+
+CATEGORIES = ['Hardware', 'Electrical', 'Plumbing', 'Garden', 'Paint', 'Tools, Hand', 'Fasteners "Bulk"']
+
+
+def _with_nulls(rng, values, null_rate):
+    """Replace a random null_rate fraction of an array with nulls"""
+    series = pl.Series(values)
+    if null_rate <= 0:
+        return series
+    return series.set(pl.Series(rng.random(len(series)) < null_rate), None)
+
+
+def generate_inventory_chunk(rng, start, rows, null_rate=0.01):
+    """
+    Generate one chunk of synthetic inventory data.
+
+    Values follow the shapes seen in real inventory exports: demand is
+    long-tailed, unit costs are log-normal and stock levels are loosely tied
+    to demand. Product ids mix zero-padded numeric codes with prefixed SKU
+    codes, names and categories contain commas and quotes that need CSV
+    quoting, and every numeric column has a null_rate share of empty values.
+
+    Args:
+        rng (np.random.Generator): Random source
+        start (int): Index of the first row, used for unique product ids
+        rows (int): Number of rows to generate
+        null_rate (float): Fraction of numeric values left empty
+
+    Returns:
+        pl.DataFrame: Chunk with the columns in CSV_HEADERS
+    """
+    index = np.arange(start, start + rows)
+    daily_demand = np.round(rng.lognormal(mean=1.5, sigma=1.0, size=rows), 2)
+    stock_cover_days = rng.gamma(shape=2.0, scale=20.0, size=rows)
+
+    raw = pl.DataFrame({
+        'index': index,
+        'category': pl.Series(CATEGORIES)[rng.integers(0, len(CATEGORIES), size=rows)]
+    })
+    padded = pl.col('index').cast(pl.Utf8).str.zfill(9)
+    labels = raw.select([
+        pl.when(pl.col('index') % 3 == 0).then(pl.lit('SKU-') + padded).otherwise(padded).alias('product_id'),
+        (pl.lit('Item ') + pl.col('index').cast(pl.Utf8) + pl.lit(', size ') +
+         (pl.col('index') % 7).cast(pl.Utf8)).alias('name'),
+        pl.col('category')
+    ])
+
+    return labels.with_columns([
+        _with_nulls(rng, np.round(daily_demand * stock_cover_days).astype(np.int64), null_rate).alias('current_stock'),
+        _with_nulls(rng, np.round(rng.lognormal(mean=2.5, sigma=0.8, size=rows), 2), null_rate).alias('unit_cost'),
+        _with_nulls(rng, rng.integers(1, 30, size=rows), null_rate).alias('lead_time_days'),
+        _with_nulls(rng, daily_demand, null_rate).alias('daily_demand'),
+        _with_nulls(rng, np.round(daily_demand * rng.uniform(0.1, 0.5, size=rows), 2), null_rate).alias('demand_std_dev')
+    ])
+
+
+def generate_inventory_csv(path, rows, null_rate=0.01, seed=0, chunk_rows=GENERATE_CHUNK_ROWS):
+    """
+    Write a synthetic inventory CSV of the given size.
+
+    The file is generated and appended chunk by chunk, so files far larger
+    than memory (tens of millions of rows) can be produced.
+
+    Args:
+        path (str): Output CSV path
+        rows (int): Number of data rows
+        null_rate (float): Fraction of numeric values left empty
+        seed (int): Seed for reproducible files
+        chunk_rows (int): Rows generated per chunk
+
+    Returns:
+        str: The output path
+    """
+    start_time = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    with open(path, 'wb') as f:
+        for start in range(0, max(rows, 1), chunk_rows):
+            chunk = generate_inventory_chunk(rng, start, min(chunk_rows, rows - start), null_rate)
+            chunk.rename(CSV_HEADERS).write_csv(f, has_header=(start == 0))
+    logger.info("Generated %s rows in %s (%s bytes) in %.2fs",
+                rows, path, os.path.getsize(path), time.perf_counter() - start_time)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic inventory CSV")
+    parser.add_argument('path', help="Output CSV path")
+    parser.add_argument('--rows', type=int, default=100_000, help="Number of data rows")
+    parser.add_argument('--null-rate', type=float, default=0.01, help="Fraction of numeric values left empty")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    generate_inventory_csv(args.path, args.rows, null_rate=args.null_rate, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import shutil
+import platform
+import argparse
+import logging
+import tempfile
+import statistics
+import subprocess
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.generate_data import generate_inventory_csv
+from utils.instrumentation import current_rss_bytes, peak_rss_bytes, PeakRssWindow
+from utils.serving import pool_environment, threads_per_worker
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_benchmarks')
+
+STAGES = ['process_csv', 'scan_parquet', 'combine_dataframes', 'optimize_inventory', 'format_output', 'api_roundtrip']
+
+DEFAULT_ROWS = [1_000, 100_000, 1_000_000]
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def _run_stage(stage, inputs, work_dir):
+    """Run one stage and return extra metrics; called inside a fresh worker process"""
+    if stage == 'process_csv':
+        from utils.data_processor import process_csv_with_stats
+        csv_copy = os.path.join(work_dir, os.path.basename(inputs['csv_path']))
+        shutil.copy(inputs['csv_path'], csv_copy)
+        return lambda: process_csv_with_stats(csv_copy)[1]
+
+    if stage == 'scan_parquet':
+        from utils.data_processor import measure_scan
+        return lambda: measure_scan(inputs['parquet_path'])
+
+    if stage == 'combine_dataframes':
+        from utils.data_processor import combine_dataframes
+        # Two copies of the dataset exercise schema unification and concatenation
+        return lambda: {"rows_out": len(combine_dataframes([inputs['parquet_path']] * 2))}
+
+    if stage == 'optimize_inventory':
+        from services.optimization_service import optimize_inventory
+        return lambda: {"rows_out": len(optimize_inventory([inputs['parquet_path']]))}
+
+    if stage == 'format_output':
+        import polars as pl
+        from utils.data_processor import format_output
+        results = pl.read_parquet(inputs['results_path'])
+        output_path = os.path.join(work_dir, 'formatted.csv')
+        return lambda: {"bytes_written": os.path.getsize(format_output(results, output_path))}
+
+    if stage == 'api_roundtrip':
+        from app import app
+        from services.job_service import init_job_manager
+        from services.result_cache import init_result_cache
+        from services.catalog import init_catalog
+        for key in [k for k in app.config if k.endswith('_FOLDER')]:
+            app.config[key] = os.path.join(work_dir, key.lower())
+            os.makedirs(app.config[key], exist_ok=True)
+        app.config['CATALOG_PATH'] = os.path.join(work_dir, 'catalog.db')
+        # Large benchmark files exceed the interactive upload limit
+        app.config['MAX_CONTENT_LENGTH'] = None
+        init_job_manager(app)
+        init_result_cache(app)
+        init_catalog(app)
+        client = app.test_client()
+
+        def roundtrip():
+            timings = {}
+            start = time.perf_counter()
+            with open(inputs['csv_path'], 'rb') as f:
+                response = client.post('/api/upload', data={'files': (f, 'benchmark.csv')},
+                                       content_type='multipart/form-data')
+            if response.status_code != 200:
+                raise RuntimeError(f"Upload failed: {response.status_code} {response.get_data(as_text=True)[:200]}")
+            timings['upload_seconds'] = round(time.perf_counter() - start, 4)
+
+            start = time.perf_counter()
+            response = client.post('/api/optimize', json={'files': response.get_json()['files']})
+            if response.status_code != 200:
+                raise RuntimeError(f"Optimize failed: {response.status_code} {response.get_data(as_text=True)[:200]}")
+            timings['optimize_seconds'] = round(time.perf_counter() - start, 4)
+            return timings
+        return roundtrip
+
+    raise ValueError(f"Unknown benchmark stage '{stage}'")
+
+
+def _measure(stage, inputs):
+    """
+    Time one stage and record its memory use.
+
+    Runs in a freshly spawned process. Setup (imports, reading inputs)
+    happens before the baseline is taken and is not timed. The kernel's
+    peak RSS mark is then reset, so the peak covers the stage alone. Where
+    the mark cannot be reset (outside Linux) the process's lifetime peak is
+    reported and the peak over the baseline is left out.
+    """
+    # Configured before the app is imported so its debug logging setup is a no-op
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{stage}_")
+    try:
+        run = _run_stage(stage, inputs, work_dir)
+        peak_window = PeakRssWindow()
+        peak_reset = peak_window.start()
+        baseline_rss = current_rss_bytes()
+        start = time.perf_counter()
+        extra = run() or {}
+        seconds = time.perf_counter() - start
+        peak_rss = peak_window.stop() if peak_reset else peak_rss_bytes()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "seconds": seconds,
+        "peak_rss_bytes": peak_rss,
+        "peak_rss_over_baseline_bytes": max(peak_rss - baseline_rss, 0) if peak_reset else None,
+        "extra": extra
+    }
+
+
+def _prepare_inputs(rows, data_dir, null_rate, seed):
+    """Generate the CSV for a size and the derived Parquet inputs later stages read"""
+    from utils.data_processor import process_csv
+    from services.optimization_service import optimize_inventory
+
+    csv_path = os.path.join(data_dir, f"inventory_{rows}.csv")
+    if not os.path.exists(csv_path):
+        generate_inventory_csv(csv_path, rows, null_rate=null_rate, seed=seed)
+    parquet_path = process_csv(csv_path)
+    results_path = os.path.join(data_dir, f"results_{rows}.parquet")
+    optimize_inventory([parquet_path]).write_parquet(results_path)
+    return {"csv_path": csv_path, "parquet_path": parquet_path, "results_path": results_path,
+            "csv_bytes": os.path.getsize(csv_path)}
+
+
+def _environment():
+    """Versions and hardware details recorded with every run"""
+    import numpy
+    import polars
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "polars": polars.__version__,
+        "numpy": numpy.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit
+    }
+
+
+def _max_mb(values):
+    """Largest of some byte counts in MB, or None if none was measured"""
+    values = [value for value in values if value is not None]
+    return round(max(values) / 2 ** 20, 1) if values else None
+
+
+def run_benchmarks(sizes, stages=STAGES, repeat=3, data_dir=None, null_rate=0.01, seed=0):
+    """
+    Benchmark each stage at each dataset size.
+
+    Args:
+        sizes (list): Row counts to generate and benchmark
+        stages (list): Stage names, see STAGES
+        repeat (int): Measurements per stage and size, each in a fresh process
+        data_dir (str, optional): Where generated data is kept; a temporary
+            directory is used and removed when omitted
+        null_rate (float): Fraction of numeric values left empty
+        seed (int): Seed for the generated data
+
+    Returns:
+        dict: Environment details and one record per (stage, size)
+    """
+    own_data_dir = data_dir is None
+    data_dir = data_dir or tempfile.mkdtemp(prefix='bench_data_')
+    os.makedirs(data_dir, exist_ok=True)
+    context = multiprocessing.get_context('spawn')
+
+    records = []
+    try:
+        for rows in sizes:
+            logger.info("Preparing %s rows", rows)
+            inputs = _prepare_inputs(rows, data_dir, null_rate, seed)
+            for stage in stages:
+                samples = []
+                for _ in range(repeat):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        # Measured like a single server worker, whose budget is every CPU
+                        with pool_environment(threads_per_worker(1)):
+                            future = executor.submit(_measure, stage, inputs)
+                        samples.append(future.result())
+
+                seconds = [s['seconds'] for s in samples]
+                median = statistics.median(seconds)
+                record = {
+                    "stage": stage,
+                    "rows": rows,
+                    "csv_bytes": inputs['csv_bytes'],
+                    "repeat": repeat,
+                    "seconds_median": round(median, 4),
+                    "seconds_min": round(min(seconds), 4),
+                    "seconds_max": round(max(seconds), 4),
+                    "rows_per_sec": round(rows / median, 1) if median > 0 else None,
+                    "peak_rss_mb": _max_mb(s['peak_rss_bytes'] for s in samples),
+                    "peak_rss_over_baseline_mb": _max_mb(s['peak_rss_over_baseline_bytes'] for s in samples),
+                    "extra": samples[-1]['extra']
+                }
+                logger.info("%s @ %s rows: %ss, peak %s MB (+%s MB)", stage, rows, record['seconds_median'],
+                            record['peak_rss_mb'], record['peak_rss_over_baseline_mb'])
+                records.append(record)
+    finally:
+        if own_data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    return {
+        "created_at": datetime.now().isoformat(),
+        "environment": _environment(),
+        "settings": {"sizes": sizes, "stages": stages, "repeat": repeat, "null_rate": null_rate, "seed": seed},
+        "results": records
+    }
+
+
+def compare_runs(baseline, current):
+    """
+    Compare two benchmark runs stage by stage.
+
+    Args:
+        baseline (dict): Earlier output of run_benchmarks
+        current (dict): Newer output of run_benchmarks
+
+    Returns:
+        list: One dict per (stage, rows) present in both runs with time and
+            peak memory ratios (current / baseline)
+    """
+    previous = {(r['stage'], r['rows']): r for r in baseline['results']}
+    comparison = []
+    for record in current['results']:
+        before = previous.get((record['stage'], record['rows']))
+        if before is None:
+            continue
+        comparison.append({
+            "stage": record['stage'],
+            "rows": record['rows'],
+            "seconds_before": before['seconds_median'],
+            "seconds_after": record['seconds_median'],
+            "time_ratio": round(record['seconds_median'] / before['seconds_median'], 3) if before['seconds_median'] else None,
+            "peak_rss_ratio": round(record['peak_rss_mb'] / before['peak_rss_mb'], 3) if before['peak_rss_mb'] else None
+        })
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, optimization and the upload/optimize API")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="Dataset sizes in rows")
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES, help="Stages to benchmark")
+    parser.add_argument('--repeat', type=int, default=3, help="Measurements per stage and size")
+    parser.add_argument('--data-dir', help="Keep generated datasets here and reuse them across runs")
+    parser.add_argument('--null-rate', type=float, default=0.01, help="Fraction of numeric values left empty")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the generated data")
+    parser.add_argument('--output', help="JSON output path (default: benchmarks/results/benchmark_<timestamp>.json)")
+    parser.add_argument('--compare', help="Earlier JSON output to compare this run against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # Keep the application's own info logs out of the benchmark output
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(lambda record: record.name == logger.name or record.levelno >= logging.WARNING)
+
+    report = run_benchmarks(args.rows, stages=args.stages, repeat=args.repeat, data_dir=args.data_dir,
+                            null_rate=args.null_rate, seed=args.seed)
+
+    if args.compare:
+        with open(args.compare) as f:
+            report['comparison'] = compare_runs(json.load(f), report)
+        for row in report['comparison']:
+            logger.info("%s @ %s rows: %ss -> %ss (x%s), peak memory x%s", row['stage'], row['rows'],
+                        row['seconds_before'], row['seconds_after'], row['time_ratio'], row['peak_rss_ratio'])
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        output = os.path.join(RESULTS_FOLDER, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info("Benchmark results written to %s", output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+# Gunicorn settings for serving the API: gunicorn -c gunicorn.conf.py app:app
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.serving import apply_thread_budget
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', max(1, min(4, (os.cpu_count() or 1) // 2))))  # Server processes
+threads = int(os.environ.get('GUNICORN_THREADS', 4))  # Request threads per worker; extra threads answer 429s and light requests
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))  # Synchronous optimizations of large files take minutes
+graceful_timeout = 30
+
+# Import the app and its libraries once in the master so forked workers start warm
+preload_app = True
+
+# Split the CPUs between workers; the environment is inherited by the preloaded
+# app and by every worker, so Polars and NumPy size their pools to the share
+os.environ['WEB_CONCURRENCY'] = str(workers)
+apply_thread_budget(workers)
+
+
+def post_fork(server, worker):
+    """Restart the logging listener thread, which does not survive the fork"""
+    from utils.logging_config import configure_logging
+    configure_logging(force=True)
@@ -2,13 +2,33 @@ from flask import Flask
 
 # Import blueprints
 from .health import health_bp
+from .metrics import metrics_bp
 from .upload import upload_bp
+from .resumable_upload import resumable_upload_bp
+from .files import files_bp
 from .optimize import optimize_bp
 from .download import download_bp
+from .jobs import jobs_bp
+from .results import results_bp
+from .demand import demand_bp
+from .scenarios import scenarios_bp
+from .simulations import simulations_bp
+from .datasets import datasets_bp
+from .partitions import partitions_bp
 
 def register_routes(app: Flask):
     """Register all route blueprints with the Flask application"""
     app.register_blueprint(health_bp)
+    app.register_blueprint(metrics_bp)
     app.register_blueprint(upload_bp)
+    app.register_blueprint(resumable_upload_bp)
+    app.register_blueprint(files_bp)
     app.register_blueprint(optimize_bp)
-    app.register_blueprint(download_bp) 
\ No newline at end of file
+    app.register_blueprint(download_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(results_bp)
+    app.register_blueprint(demand_bp)
+    app.register_blueprint(scenarios_bp)
+    app.register_blueprint(simulations_bp)
+    app.register_blueprint(datasets_bp)
+    app.register_blueprint(partitions_bp) 
\ No newline at end of file
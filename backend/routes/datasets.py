@@ -0,0 +1,122 @@
+import os
+import logging
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.utils import secure_filename
+
+# Import services
+from services.dataset_store import dataset_path, upsert_delta, optimize_dataset, describe_dataset
+from services.optimization_service import resolve_parameters
+from utils.serving import heavy_request
+from .jobs import resolve_demand_stats
+
+# Configure logger
+logger = logging.getLogger('inventory_optimizer_datasets_api')
+
+# Create blueprint
+datasets_bp = Blueprint('datasets', __name__)
+
+ALLOWED_EXTENSIONS = {'csv', 'parquet'}
+
+def allowed_file(filename):
+    """Check if the delta file extension is allowed"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+@datasets_bp.route('/api/datasets/<name>/upsert', methods=['POST'])
+@heavy_request
+def upsert(name):
+    """Insert, replace or delete (with a true 'deleted' column) inventory rows of a dataset, keyed by product_id"""
+    logger.info("Dataset upsert called for '%s'", name)
+    try:
+        dataset_dir = dataset_path(current_app.config['DATASETS_FOLDER'], name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    files = request.files.getlist('files')
+    if not files or files[0].filename == '':
+        logger.warning("No files selected")
+        return jsonify({"error": "No files selected"}), 400
+
+    results = []
+    for file in files:
+        if not allowed_file(file.filename):
+            logger.warning("Invalid file format: %s", file.filename)
+            return jsonify({"error": f"Invalid file format: {file.filename}"}), 400
+
+        filename = secure_filename(file.filename)
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        file.save(file_path)
+        try:
+            summary = upsert_delta(file_path, dataset_dir)
+        except ValueError as e:
+            logger.warning("Invalid delta file %s: %s", filename, e)
+            return jsonify({"error": f"Error processing file {filename}: {str(e)}"}), 400
+        except Exception as e:
+            logger.error("Error upserting %s into dataset %s: %s", filename, name, e, exc_info=True)
+            return jsonify({"error": f"Error processing file {filename}: {str(e)}"}), 500
+        summary['name'] = filename
+        results.append(summary)
+
+    return jsonify({
+        "message": f"Upserted {len(results)} files into dataset '{name}'",
+        "files": results,
+        "dataset": describe_dataset(dataset_dir)
+    })
+
+@datasets_bp.route('/api/datasets/<name>/optimize', methods=['POST'])
+@heavy_request
+def optimize(name):
+    """
+    Bring a dataset's results up to date for a parameter set.
+
+    The body may carry parameters and demand_history as for /api/optimize.
+    Only rows changed since the last run with the same settings are
+    recomputed; results are paged through /api/results.
+    """
+    logger.info("Dataset optimization called for '%s'", name)
+    data = request.get_json(silent=True) or {}
+    try:
+        dataset_dir = dataset_path(current_app.config['DATASETS_FOLDER'], name)
+        params = resolve_parameters(data.get('parameters'))
+        demand_stats_path = resolve_demand_stats(data.get('demand_history'))
+    except ValueError as e:
+        logger.warning("Invalid dataset optimization request: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+    if describe_dataset(dataset_dir) is None:
+        return jsonify({"error": f"Unknown dataset: {name}"}), 404
+
+    try:
+        run = optimize_dataset(dataset_dir, params, demand_stats_path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error optimizing dataset %s: %s", name, e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "message": f"Optimized dataset '{name}': {run['rows_recomputed']} rows recomputed, {run['rows_reused']} reused",
+        "parameters": params,
+        "summary": run['summary'],
+        "dataset_version": run['dataset_version'],
+        "rows_recomputed": run['rows_recomputed'],
+        "rows_reused": run['rows_reused'],
+        "shards_rewritten": run['shards_rewritten'],
+        "seconds": run['seconds'],
+        "result_id": run['result_id'],
+        "results_url": f"/api/results/{run['result_id']}",
+        "total_rows": run['total_rows']
+    })
+
+@datasets_bp.route('/api/datasets/<name>', methods=['GET'])
+def get_dataset(name):
+    """Describe a dataset: version, row and shard counts and its result sets"""
+    try:
+        dataset_dir = dataset_path(current_app.config['DATASETS_FOLDER'], name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    description = describe_dataset(dataset_dir)
+    if description is None:
+        return jsonify({"error": f"Unknown dataset: {name}"}), 404
+    description['name'] = name
+    return jsonify(description)
@@ -0,0 +1,96 @@
+import os
+import logging
+import tempfile
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.utils import secure_filename
+
+# Import services
+from services.demand_service import history_path, ingest_sales_history, rebuild_state, describe_history
+from utils.serving import heavy_request
+
+# Configure logger
+logger = logging.getLogger('inventory_optimizer_demand_api')
+
+# Create blueprint
+demand_bp = Blueprint('demand', __name__)
+
+ALLOWED_EXTENSIONS = {'csv', 'parquet'}
+
+def allowed_file(filename):
+    """Check if the sales history file extension is allowed"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+@demand_bp.route('/api/demand/<name>/ingest', methods=['POST'])
+@heavy_request
+def ingest_history(name):
+    """Add uploaded sales transaction files (date, product_id, qty) to a demand history"""
+    logger.info("Demand history ingest called for '%s'", name)
+    try:
+        history_dir = history_path(current_app.config['DEMAND_FOLDER'], name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    files = request.files.getlist('files')
+    if not files or files[0].filename == '':
+        logger.warning("No files selected")
+        return jsonify({"error": "No files selected"}), 400
+
+    results = []
+    for file in files:
+        if not allowed_file(file.filename):
+            logger.warning("Invalid file format: %s", file.filename)
+            return jsonify({"error": f"Invalid file format: {file.filename}"}), 400
+
+        filename = secure_filename(file.filename)
+        # Sales files are only read once, so they go to a temporary file rather than
+        # replacing an uploaded inventory file of the same name
+        fd, file_path = tempfile.mkstemp(prefix='sales_', suffix=os.path.splitext(filename)[1],
+                                         dir=current_app.config['UPLOAD_FOLDER'])
+        os.close(fd)
+        try:
+            file.save(file_path)
+            summary = ingest_sales_history(file_path, history_dir)
+        except ValueError as e:
+            logger.warning("Invalid sales history file %s: %s", filename, e)
+            return jsonify({"error": f"Error processing file {filename}: {str(e)}"}), 400
+        except Exception as e:
+            logger.error("Error ingesting sales history %s: %s", filename, e, exc_info=True)
+            return jsonify({"error": f"Error processing file {filename}: {str(e)}"}), 500
+        finally:
+            os.remove(file_path)
+        summary['name'] = filename
+        results.append(summary)
+
+    return jsonify({
+        "message": f"Ingested {len(results)} files into demand history '{name}'",
+        "files": results,
+        "history": describe_history(history_dir)
+    })
+
+@demand_bp.route('/api/demand/<name>', methods=['GET'])
+def get_history(name):
+    """Describe a demand history: date range, day count and SKUs with statistics"""
+    try:
+        history_dir = history_path(current_app.config['DEMAND_FOLDER'], name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    description = describe_history(history_dir)
+    if description is None:
+        return jsonify({"error": f"Unknown demand history: {name}"}), 404
+    description['name'] = name
+    return jsonify(description)
+
+@demand_bp.route('/api/demand/<name>/rebuild', methods=['POST'])
+@heavy_request
+def rebuild_history(name):
+    """Recompute a history's per-SKU statistics from every stored day"""
+    try:
+        history_dir = history_path(current_app.config['DEMAND_FOLDER'], name)
+        skus = rebuild_state(history_dir)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error rebuilding demand history %s: %s", name, e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"message": f"Rebuilt demand history '{name}'", "skus": skus})
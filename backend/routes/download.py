@@ -1,6 +1,10 @@
 import os
 import logging
-from flask import Blueprint, jsonify, send_file, current_app
+from flask import Blueprint, request, jsonify, send_file, current_app
+from werkzeug.security import safe_join
+
+# Import services
+from services.download_service import DOWNLOAD_FORMATS, TYPED_FORMATS, ensure_variant
 
 # Configure logger
 logger = logging.getLogger('inventory_optimizer_download')
@@ -10,12 +14,37 @@ download_bp = Blueprint('download', __name__)
 
 @download_bp.route('/api/download/<filename>', methods=['GET'])
 def download_file(filename):
-    """Send requested optimization result file to the client"""
-    logger.info(f"Download request for file: {filename}")
+    """
+    Send requested optimization result file to the client.
+
+    The format query parameter selects csv (default), csv.gz, csv.zst,
+    parquet or arrow. Responses carry an ETag and support If-None-Match
+    and Range requests, so clients can skip unchanged files and resume
+    interrupted downloads.
+    """
+    logger.info("Download request for file: %s", filename)
+    output_format = request.args.get('format', 'csv')
+    if output_format not in DOWNLOAD_FORMATS:
+        return jsonify({"error": f"Unknown format '{output_format}', expected one of {list(DOWNLOAD_FORMATS)}"}), 400
+
+    output_folder = current_app.config['OUTPUT_FOLDER']
+    if safe_join(output_folder, filename) is None:
+        return jsonify({"error": f"Invalid file name: {filename}"}), 400
+
+    # Parquet and Arrow downloads are written from the typed results behind the CSV
+    results_path = None
+    if output_format in TYPED_FORMATS:
+        results_path = (current_app.extensions['result_cache'].output_results_path(filename) or
+                        current_app.extensions['job_manager'].output_results_path(filename))
+
     try:
-        file_path = os.path.join(current_app.config['OUTPUT_FOLDER'], filename)
-        logger.debug(f"Sending file: {file_path}")
-        return send_file(file_path, as_attachment=True)
+        file_path = ensure_variant(output_folder, filename, output_format, results_path)
     except Exception as e:
-        logger.error(f"Error downloading file {filename}: {str(e)}", exc_info=True)
-        return jsonify({"error": str(e)}), 404 
\ No newline at end of file
+        logger.error("Error preparing %s download of %s: %s", output_format, filename, e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+    if file_path is None:
+        return jsonify({"error": f"File not found: {filename}"}), 404
+
+    logger.debug("Sending file: %s", file_path)
+    return send_file(file_path, mimetype=DOWNLOAD_FORMATS[output_format][1], as_attachment=True,
+                     download_name=os.path.basename(file_path), conditional=True, etag=True)
@@ -0,0 +1,48 @@
+import logging
+from flask import Blueprint, request, jsonify, current_app
+
+# Import services
+from services.optimization_service import REQUIRED_COLUMNS
+
+# Configure logger
+logger = logging.getLogger('inventory_optimizer_files')
+
+# Create blueprint
+files_bp = Blueprint('files', __name__)
+
+@files_bp.route('/api/files', methods=['GET'])
+def list_files():
+    """List uploaded datasets from the catalog: name, schema, row count and content hash"""
+    files = current_app.extensions['catalog'].list()
+    return jsonify({"files": files, "total": len(files)})
+
+@files_bp.route('/api/files/<int:file_id>', methods=['GET'])
+def get_file(file_id):
+    """Return a dataset's catalog entry with per-column stats and its cached preview"""
+    entry = current_app.extensions['catalog'].get(file_id)
+    if entry is None:
+        return jsonify({"error": f"Unknown file: {file_id}"}), 404
+    return jsonify(entry)
+
+@files_bp.route('/api/files/validate', methods=['POST'])
+def validate_files():
+    """
+    Check uploaded files for the columns the optimizer needs, from the catalog alone.
+
+    The body carries the same files list as /api/optimize. When the files
+    together lack a required column, optimization falls back to sample data.
+    """
+    data = request.get_json(silent=True)
+    if not data or 'files' not in data:
+        return jsonify({"error": "No data provided or missing files information"}), 400
+
+    file_paths = [file['parquet_path'] for file in data['files'] if 'parquet_path' in file]
+    if not file_paths:
+        return jsonify({"error": "No valid file paths provided"}), 400
+
+    report = current_app.extensions['catalog'].validate(file_paths, REQUIRED_COLUMNS)
+    report['valid'] = not report['missing_columns'] and not report['unknown_files']
+    if not report['valid']:
+        logger.info("Files failed validation: missing %s, unknown %s",
+                    report['missing_columns'], report['unknown_files'])
+    return jsonify(report)
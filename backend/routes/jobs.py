@@ -0,0 +1,116 @@
+import os
+import logging
+from flask import Blueprint, request, jsonify, current_app
+
+from utils.dataset_loader import COMBINE_MODES
+from services.optimization_service import resolve_parameters
+from services.demand_service import history_path, stats_path
+
+# Configure logger
+logger = logging.getLogger('inventory_optimizer_jobs_api')
+
+# Create blueprint
+jobs_bp = Blueprint('jobs', __name__)
+
+def resolve_demand_stats(history_name):
+    """
+    Map an optional demand history name from a request to its statistics file.
+
+    Raises:
+        ValueError: If the name is invalid or the history has no statistics yet
+    """
+    if not history_name:
+        return None
+    path = stats_path(history_path(current_app.config['DEMAND_FOLDER'], history_name))
+    if not os.path.exists(path):
+        raise ValueError(f"Demand history '{history_name}' has no statistics yet")
+    return path
+
+def submit_optimization_job(file_paths, combine='concat', params=None, demand_stats_path=None,
+                            cache_key=None):
+    """Queue an optimization job and build the 202 response for it"""
+    if cache_key is None:
+        cache_key = current_app.extensions['result_cache'].make_key(file_paths, combine, params,
+                                                                    demand_stats_path)
+    status = current_app.extensions['job_manager'].submit(file_paths, combine=combine, params=params,
+                                                          demand_stats_path=demand_stats_path,
+                                                          cache_key=cache_key)
+    status['status_url'] = f"/api/jobs/{status['job_id']}"
+    status['result_url'] = f"/api/jobs/{status['job_id']}/result"
+    return jsonify(status), 202
+
+@jobs_bp.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue an optimization job for the given files and return its id"""
+    logger.info("Job submission endpoint called")
+    data = request.json
+
+    if not data or 'files' not in data:
+        logger.warning("No data provided or missing files information")
+        return jsonify({"error": "No data provided or missing files information"}), 400
+
+    file_paths = [file['parquet_path'] for file in data['files'] if 'parquet_path' in file]
+    if not file_paths:
+        logger.warning("No valid file paths provided")
+        return jsonify({"error": "No valid file paths provided"}), 400
+
+    combine = data.get('combine', 'concat')
+    if combine not in COMBINE_MODES:
+        logger.warning("Invalid combine mode: %s", combine)
+        return jsonify({"error": f"Invalid combine mode '{combine}', expected one of {list(COMBINE_MODES)}"}), 400
+
+    try:
+        params = resolve_parameters(data.get('parameters'))
+    except ValueError as e:
+        logger.warning("Invalid optimization parameters: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        demand_stats_path = resolve_demand_stats(data.get('demand_history'))
+    except ValueError as e:
+        logger.warning("Invalid demand history: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        return submit_optimization_job(file_paths, combine, params, demand_stats_path)
+    except Exception as e:
+        logger.error("Error submitting job: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the status, current stage and progress of a job"""
+    status = current_app.extensions['job_manager'].get_status(job_id)
+    if status is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(status)
+
+@jobs_bp.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Return the results of a completed job"""
+    manager = current_app.extensions['job_manager']
+    status = manager.get_status(job_id)
+    if status is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    if status['status'] != 'completed':
+        return jsonify({"error": f"Job is {status['status']}", "status": status}), 409
+
+    result = manager.get_result(job_id)
+    return jsonify({
+        "message": "Optimization completed successfully",
+        "job_id": job_id,
+        "summary": result['summary'],
+        "result_id": job_id,
+        "results_url": f"/api/results/{job_id}",
+        "total_rows": result['rows'],
+        "output_file": result['output_file']
+    })
+
+@jobs_bp.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    logger.info("Cancel requested for job %s", job_id)
+    status = current_app.extensions['job_manager'].cancel(job_id)
+    if status is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(status)
@@ -0,0 +1,16 @@
+import logging
+from flask import Blueprint, Response
+
+# Import utilities
+from utils.instrumentation import REGISTRY
+
+# Configure logger
+logger = logging.getLogger('inventory_optimizer_metrics')
+
+# Create blueprint
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Stage timings, row and byte counters, request latency and memory in Prometheus text format"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,12 +1,14 @@
 import os
 import logging
-import json
-from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 
 # Import services
-from services.optimization_service import optimize_inventory
+from services.optimization_service import optimize_inventory, summarize_results, resolve_parameters
+from services.partition_service import PARTITION_KEY_PATTERN
 from utils.data_processor import format_output
+from utils.dataset_loader import COMBINE_MODES
+from utils.serving import heavy_request
+from .jobs import submit_optimization_job, resolve_demand_stats
 
 # Configure logger
 logger = logging.getLogger('inventory_optimizer_optimize')
@@ -14,68 +16,99 @@ logger = logging.getLogger('inventory_optimizer_optimize')
 # Create blueprint
 optimize_bp = Blueprint('optimize', __name__)
 
-def convert_to_json_serializable(df_dict):
-    """Convert Polars Series objects to Python native types for JSON serialization"""
-    result = {}
-    for key, series in df_dict.items():
-        if hasattr(series, 'to_list'):  # Check if it's a Series-like object
-            result[key] = series.to_list()
-        else:
-            result[key] = series
-    return result
+def build_result_response(result_id, summary, output_file, rows, cached):
+    """Build the optimize response: summary statistics plus a handle to the stored results"""
+    return {
+        "message": "Optimization completed successfully",
+        "summary": summary,
+        "result_id": result_id,
+        "results_url": f"/api/results/{result_id}",
+        "total_rows": rows,
+        "output_file": output_file,
+        "cached": cached
+    }
 
 @optimize_bp.route('/api/optimize', methods=['POST'])
+@heavy_request
 def optimize():
     """Process uploaded files and run inventory optimization algorithms"""
     logger.info("Optimization endpoint called")
     try:
         data = request.json
-        logger.debug(f"Received optimization request data: {json.dumps(data, default=str)[:1000]}...")
         
         if not data or 'files' not in data:
             logger.warning("No data provided or missing files information")
             return jsonify({"error": "No data provided or missing files information"}), 400
         
         file_paths = [file['parquet_path'] for file in data['files'] if 'parquet_path' in file]
-        logger.info(f"Files to process: {file_paths}")
+        logger.info("Files to process: %s", file_paths)
         
         if not file_paths:
             logger.warning("No valid file paths provided")
             return jsonify({"error": "No valid file paths provided"}), 400
         
+        combine = data.get('combine', 'concat')
+        if combine not in COMBINE_MODES:
+            logger.warning("Invalid combine mode: %s", combine)
+            return jsonify({"error": f"Invalid combine mode '{combine}', expected one of {list(COMBINE_MODES)}"}), 400
+        
+        try:
+            params = resolve_parameters(data.get('parameters'))
+            demand_stats_path = resolve_demand_stats(data.get('demand_history'))
+            partition_by = data.get('partition_by')
+            if partition_by is not None and not (isinstance(partition_by, str) and PARTITION_KEY_PATTERN.match(partition_by)):
+                raise ValueError(f"Invalid partition_by column: {partition_by!r}")
+            if partition_by and data.get('async'):
+                raise ValueError("partition_by is not supported for async optimization")
+        except ValueError as e:
+            logger.warning("Invalid optimization request: %s", e)
+            return jsonify({"error": str(e)}), 400
+        
+        # Identical inputs and parameters are served from the result cache
+        cache = current_app.extensions['result_cache']
+        cache_key = cache.make_key(file_paths, combine, params, demand_stats_path, partition_by)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info("Result cache hit for key %s", cache_key)
+            return jsonify(build_result_response(cache_key, cached['summary'],
+                                                 cached['output_file'], cached['rows'], cached=True))
+        
+        # Hand long-running work to the job pool instead of blocking this worker
+        if data.get('async'):
+            logger.info("Queueing optimization as a background job")
+            return submit_optimization_job(file_paths, combine, params, demand_stats_path, cache_key)
+        
         # Run optimization algorithm
-        logger.info("Starting optimization process")
-        optimization_results = optimize_inventory(file_paths)
-        logger.info(f"Optimization completed. Result shape: {optimization_results.shape}")
+        logger.info("Starting optimization process with parameters: %s", params)
+        optimization_results = optimize_inventory(file_paths, combine=combine, params=params,
+                                                  demand_stats_path=demand_stats_path,
+                                                  partition_by=partition_by)
+        logger.info("Optimization completed. Result shape: %s", optimization_results.shape)
         
-        # Format and save output
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"optimization_results_{timestamp}.csv"
+        # Format and save output under a name derived from the cache key
+        output_filename = cache.output_filename(cache_key)
         output_path = os.path.join(current_app.config['OUTPUT_FOLDER'], output_filename)
         
-        logger.info(f"Formatting and saving results to: {output_path}")
+        logger.info("Formatting and saving results to: %s", output_path)
         format_output(optimization_results, output_path)
         
         # Prepare summary statistics
-        summary = {
-            "totalSavings": float(optimization_results["cost_savings"].sum()),
-            "averageStockReduction": float(optimization_results["stock_reduction_pct"].mean()),
-            "optimizationDate": datetime.now().isoformat()
-        }
-        logger.info(f"Summary statistics: {summary}")
-        
-        # Convert to JSON serializable format
-        result_data = convert_to_json_serializable(optimization_results.to_dict())
+        summary = summarize_results(optimization_results)
+        logger.info("Summary statistics: %s", summary)
+        cache.put(cache_key, optimization_results, summary)
         
-        response_data = {
-            "message": "Optimization completed successfully",
-            "summary": summary,
-            "data": result_data,
-            "output_file": output_filename
-        }
-        logger.debug(f"Sending response with {len(optimization_results)} rows of data")
+        response_data = build_result_response(cache_key, summary, output_filename,
+                                              len(optimization_results), cached=False)
         return jsonify(response_data)
         
+    except ValueError as e:
+        logger.warning("Invalid optimization request: %s", e)
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        logger.error(f"Error in optimization process: {str(e)}", exc_info=True)
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        logger.error("Error in optimization process: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500 
+
+@optimize_bp.route('/api/optimize/cache', methods=['GET'])
+def cache_stats():
+    """Report result cache hit/miss counters and size"""
+    return jsonify(current_app.extensions['result_cache'].stats())
@@ -0,0 +1,145 @@
+import os
+import logging
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.utils import secure_filename
+
+# Import services
+from services.partition_service import (
+    partitioned_dataset_path, ingest_partitioned, describe_partitioned, rollup_results,
+    partition_results_path
+)
+from services.optimization_service import resolve_parameters
+from utils.data_processor import process_csv_files
+from utils.serving import heavy_request
+from .jobs import resolve_demand_stats
+from .upload import allowed_file
+
+# Configure logger
+logger = logging.getLogger('inventory_optimizer_partitions_api')
+
+# Create blueprint
+partitions_bp = Blueprint('partitions', __name__)
+
+@partitions_bp.route('/api/partitions/<name>/ingest', methods=['POST'])
+@heavy_request
+def ingest(name):
+    """
+    Add CSV files to a dataset partitioned by the partition_by form field.
+
+    Each partition present in the files replaces the stored partition with
+    the same key value; other partitions are kept.
+    """
+    logger.info("Partitioned ingest called for '%s'", name)
+    key = request.form.get('partition_by', 'location_id')
+    try:
+        dataset_dir = partitioned_dataset_path(current_app.config['PARTITIONS_FOLDER'], name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    files = request.files.getlist('files')
+    if not files or files[0].filename == '':
+        logger.warning("No files selected")
+        return jsonify({"error": "No files selected"}), 400
+
+    csv_paths = []
+    for file in files:
+        if not allowed_file(file.filename):
+            logger.warning("Invalid file format: %s", file.filename)
+            return jsonify({"error": f"Invalid file format: {file.filename}"}), 400
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
+        file.save(file_path)
+        csv_paths.append(file_path)
+
+    outcomes = process_csv_files(csv_paths, max_workers=current_app.config['UPLOAD_WORKERS'])
+    failed = [outcome for outcome in outcomes if outcome['error'] is not None]
+    if failed:
+        return jsonify({"error": f"Error processing file {os.path.basename(failed[0]['csv_path'])}: {failed[0]['error']}"}), 500
+
+    try:
+        summary = ingest_partitioned([outcome['parquet_path'] for outcome in outcomes], dataset_dir, key)
+    except ValueError as e:
+        logger.warning("Invalid partitioned ingest for %s: %s", name, e)
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error ingesting into partitioned dataset %s: %s", name, e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    summary['dataset'] = describe_partitioned(dataset_dir)
+    return jsonify(summary)
+
+@partitions_bp.route('/api/partitions/<name>/optimize', methods=['POST'])
+@heavy_request
+def optimize(name):
+    """
+    Optimize the partitions of a dataset in parallel.
+
+    The body may carry parameters and demand_history as for /api/optimize,
+    and a list of partitions to re-run just those. Without it, only
+    partitions ingested since the last run with the same settings are
+    recomputed.
+    """
+    logger.info("Partitioned optimization called for '%s'", name)
+    data = request.get_json(silent=True) or {}
+    try:
+        dataset_dir = partitioned_dataset_path(current_app.config['PARTITIONS_FOLDER'], name)
+        params = resolve_parameters(data.get('parameters'))
+        demand_stats_path = resolve_demand_stats(data.get('demand_history'))
+        partitions = data.get('partitions')
+        if partitions is not None and (not isinstance(partitions, list) or
+                                       not all(isinstance(value, str) for value in partitions)):
+            raise ValueError("partitions must be a list of partition values")
+    except ValueError as e:
+        logger.warning("Invalid partitioned optimization request: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+    if describe_partitioned(dataset_dir) is None:
+        return jsonify({"error": f"Unknown dataset: {name}"}), 404
+
+    try:
+        run = current_app.extensions['partition_optimizer'].optimize(
+            dataset_dir, params, demand_stats_path, partitions=partitions)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error optimizing partitioned dataset %s: %s", name, e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    run.pop('results_dir')
+    run.update(message=f"Optimized {len(run['partitions_recomputed'])} partitions of '{name}', "
+                       f"reused {run['partitions_reused']}",
+               parameters=params, results_url=f"/api/results/{run['result_id']}")
+    return jsonify(run)
+
+@partitions_bp.route('/api/partitions/<name>', methods=['GET'])
+def get_partitioned(name):
+    """Describe a partitioned dataset: key, per-partition row counts and its result sets"""
+    try:
+        dataset_dir = partitioned_dataset_path(current_app.config['PARTITIONS_FOLDER'], name)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    description = describe_partitioned(dataset_dir)
+    if description is None:
+        return jsonify({"error": f"Unknown dataset: {name}"}), 404
+    description['name'] = name
+    return jsonify(description)
+
+@partitions_bp.route('/api/partitions/results/<result_id>/rollup', methods=['GET'])
+def rollup(result_id):
+    """
+    Roll a partitioned result set up across warehouses.
+
+    Query parameters: by ('partition' for per-warehouse totals or 'product'
+    for per-SKU totals across warehouses) and limit (products returned).
+    """
+    results_dir = partition_results_path(current_app.config['PARTITIONS_FOLDER'], result_id)
+    if results_dir is None:
+        return jsonify({"error": f"Unknown result: {result_id}"}), 404
+    try:
+        limit = int(request.args.get('limit', 100))
+        if limit < 1:
+            raise ValueError("limit must be >= 1")
+        return jsonify(dict(rollup_results(results_dir, by=request.args.get('by', 'partition'), limit=limit),
+                            result_id=result_id))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
@@ -0,0 +1,212 @@
+import os
+import re
+import logging
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+
+# Import services
+from services.results_service import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, build_results_query, read_page, decode_cursor,
+    stream_arrow_ipc, stream_ndjson, top_results, aggregate_results, histogram_results
+)
+from services.dataset_store import dataset_results_path
+from services.partition_service import partition_results_path
+from .scenarios import scenario_detail_path
+from .simulations import simulation_results_path
+
+# Configure logger
+logger = logging.getLogger('inventory_optimizer_results_api')
+
+# Create blueprint
+results_bp = Blueprint('results', __name__)
+
+_RESULT_ID_PATTERN = re.compile(r'^[0-9a-f]{32}([0-9a-f]{32})?$')
+
+STREAM_FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', stream_arrow_ipc),
+    'ndjson': ('application/x-ndjson', stream_ndjson)
+}
+
+def resolve_results_path(result_id):
+    """
+    Find the stored Parquet results for a result handle.
+
+    Handles are result cache keys (synchronous optimizations), job ids
+    (background jobs), scenario sweep ids (per-SKU sweep detail), simulation
+    ids (per-SKU simulation statistics), dataset result set ids or
+    partitioned dataset result set ids.
+
+    Returns:
+        str: Path to the results Parquet file, or to a directory of Parquet
+            shards for dataset and partitioned results; None if the handle is unknown
+    """
+    if not _RESULT_ID_PATTERN.match(result_id):
+        return None
+
+    path = current_app.extensions['result_cache'].results_path(result_id)
+    if os.path.exists(path):
+        return path
+
+    job_result = current_app.extensions['job_manager'].get_result(result_id)
+    if job_result is not None and os.path.exists(job_result['results_path']):
+        return job_result['results_path']
+
+    for path in (scenario_detail_path(result_id), simulation_results_path(result_id)):
+        if os.path.exists(path):
+            return path
+    return (dataset_results_path(current_app.config['DATASETS_FOLDER'], result_id) or
+            partition_results_path(current_app.config['PARTITIONS_FOLDER'], result_id))
+
+def _query_args():
+    """Read the filter and sort query string arguments shared by the results endpoints"""
+    return {
+        "filters": request.args.getlist('filter'),
+        "sort": request.args.get('sort'),
+        "descending": request.args.get('order', 'asc').lower() == 'desc'
+    }
+
+@results_bp.route('/api/results/<result_id>', methods=['GET'])
+def get_results_page(result_id):
+    """
+    Return one page of an optimization result set.
+
+    Query parameters: offset or cursor, limit, sort, order (asc/desc) and any
+    number of filter=column:operator:value arguments.
+    """
+    results_path = resolve_results_path(result_id)
+    if results_path is None:
+        return jsonify({"error": f"Unknown or expired result: {result_id}"}), 404
+
+    try:
+        cursor = request.args.get('cursor')
+        offset = decode_cursor(cursor) if cursor else int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        if offset < 0 or limit < 1:
+            raise ValueError("offset must be >= 0 and limit must be >= 1")
+        limit = min(limit, MAX_PAGE_SIZE)
+
+        lf = build_results_query(results_path, **_query_args())
+        page = read_page(lf, offset, limit)
+    except ValueError as e:
+        logger.warning("Invalid results query for %s: %s", result_id, e)
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error reading results %s: %s", result_id, e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    page['result_id'] = result_id
+    return jsonify(page)
+
+@results_bp.route('/api/results/<result_id>/stream', methods=['GET'])
+def stream_results(result_id):
+    """
+    Stream a whole result set for programmatic clients.
+
+    Query parameters: format ('arrow' for an Arrow IPC stream or 'ndjson'),
+    plus the same sort and filter arguments as the paged endpoint.
+    """
+    results_path = resolve_results_path(result_id)
+    if results_path is None:
+        return jsonify({"error": f"Unknown or expired result: {result_id}"}), 404
+
+    output_format = request.args.get('format', 'arrow')
+    if output_format not in STREAM_FORMATS:
+        return jsonify({"error": f"Unknown format '{output_format}', expected one of {list(STREAM_FORMATS)}"}), 400
+
+    query = _query_args()
+    try:
+        # Validate filters and sort column before the response starts streaming
+        build_results_query(results_path, **query)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype, stream = STREAM_FORMATS[output_format]
+    logger.info("Streaming result %s as %s", result_id, output_format)
+    return Response(stream_with_context(stream(results_path, **query)), mimetype=mimetype)
+
+def _list_arg(name):
+    """Read a query argument given repeatedly or as a comma-separated list"""
+    return [item for value in request.args.getlist(name) for item in value.split(',') if item]
+
+def _memoized_query(result_id, kind, args, compute):
+    """
+    Answer a results query, reusing the response of an identical earlier query.
+
+    Args:
+        result_id (str): Result handle from the URL
+        kind (str): Query name, part of the memo key
+        args (tuple): Hashable query arguments, part of the memo key
+        compute (callable): Builds the response from the lazy results query
+
+    Returns:
+        Response: JSON response, 400 for invalid arguments or 404 for unknown results
+    """
+    results_path = resolve_results_path(result_id)
+    if results_path is None:
+        return jsonify({"error": f"Unknown or expired result: {result_id}"}), 404
+
+    filters = request.args.getlist('filter')
+    memo = current_app.extensions['result_query_memo']
+    try:
+        response = memo.get_or_compute(
+            results_path, (kind, tuple(sorted(filters))) + args,
+            lambda: compute(build_results_query(results_path, filters=filters)))
+    except ValueError as e:
+        logger.warning("Invalid %s query for %s: %s", kind, result_id, e)
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error running %s query on %s: %s", kind, result_id, e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+    return jsonify(dict(response, result_id=result_id, filters=filters))
+
+@results_bp.route('/api/results/<result_id>/top', methods=['GET'])
+def get_top_results(result_id):
+    """
+    Return the top rows of a result set ranked by a numeric column.
+
+    Query parameters: by (default cost_savings), n (default 10), order
+    (desc for the largest values, the default, or asc), columns to return
+    and any number of filter=column:operator:value arguments.
+    """
+    by = request.args.get('by', 'cost_savings')
+    descending = request.args.get('order', 'desc').lower() != 'asc'
+    columns = _list_arg('columns')
+    try:
+        n = int(request.args.get('n', 10))
+    except ValueError:
+        return jsonify({"error": "n must be an integer"}), 400
+    return _memoized_query(result_id, 'top', (by, n, descending, tuple(columns)),
+                           lambda lf: top_results(lf, by, n, descending, columns or None))
+
+@results_bp.route('/api/results/<result_id>/aggregate', methods=['GET'])
+def get_aggregate(result_id):
+    """
+    Roll a result set up into totals, optionally per group.
+
+    Query parameters: group_by columns, metric=column:aggregation (sum, mean,
+    median, min, max or count; repeatable), limit on the groups returned
+    and any number of filter=column:operator:value arguments.
+    """
+    group_by = _list_arg('group_by')
+    metrics = _list_arg('metric') or None
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return _memoized_query(result_id, 'aggregate', (tuple(group_by), tuple(metrics or ()), limit),
+                           lambda lf: aggregate_results(lf, group_by, metrics, limit))
+
+@results_bp.route('/api/results/<result_id>/histogram', methods=['GET'])
+def get_histogram(result_id):
+    """
+    Return the distribution of a numeric column in equal-width bins.
+
+    Query parameters: column (default stock_reduction_pct), bins (default
+    20) and any number of filter=column:operator:value arguments.
+    """
+    column = request.args.get('column', 'stock_reduction_pct')
+    try:
+        bins = int(request.args.get('bins', 20))
+    except ValueError:
+        return jsonify({"error": "bins must be an integer"}), 400
+    return _memoized_query(result_id, 'histogram', (column, bins),
+                           lambda lf: histogram_results(lf, column, bins))
@@ -0,0 +1,80 @@
+import logging
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.utils import secure_filename
+
+from .upload import allowed_file, build_file_info
+from utils.serving import heavy_request
+
+# Configure logger
+logger = logging.getLogger('inventory_optimizer_resumable_upload')
+
+# Create blueprint
+resumable_upload_bp = Blueprint('resumable_upload', __name__)
+
+def build_session_response(status):
+    """Add URLs to a session status and, once converted, the uploaded file's info"""
+    upload_id = status['upload_id']
+    status['status_url'] = f"/api/uploads/{upload_id}"
+    status['chunk_url'] = f"/api/uploads/{upload_id}/chunks/<index>"
+    if status['status'] == 'completed':
+        entry = current_app.extensions['catalog'].get(status['dataset_id'])
+        status['file'] = build_file_info(entry, status['filename']) if entry is not None else None
+    return status
+
+@resumable_upload_bp.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Start a chunked upload from the file name and total size"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    if not allowed_file(filename):
+        logger.warning("Invalid file format: %s", filename)
+        return jsonify({"error": f"Invalid file format: {filename}"}), 400
+
+    try:
+        status = current_app.extensions['upload_sessions'].create(secure_filename(filename), data.get('size'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(build_session_response(status)), 201
+
+@resumable_upload_bp.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Session status, including the chunks still missing so an upload can resume"""
+    status = current_app.extensions['upload_sessions'].get_status(upload_id)
+    if status is None:
+        return jsonify({"error": f"Unknown upload: {upload_id}"}), 404
+    return jsonify(build_session_response(status))
+
+@resumable_upload_bp.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@heavy_request
+def upload_chunk(upload_id, index):
+    """Store one chunk, sent as the raw request body; the last chunk starts the conversion"""
+    try:
+        status = current_app.extensions['upload_sessions'].write_chunk(
+            upload_id, index, request.stream, request.content_length)
+    except ValueError as e:
+        logger.warning("Rejected chunk %s of upload %s: %s", index, upload_id, e)
+        return jsonify({"error": str(e)}), 400
+    if status is None:
+        return jsonify({"error": f"Unknown upload: {upload_id}"}), 404
+    return jsonify(build_session_response(status))
+
+@resumable_upload_bp.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@heavy_request
+def finalize_upload(upload_id):
+    """
+    Finish an upload.
+
+    Returns the file info once the upload is converted, or 202 with the
+    session status while conversion is still running.
+    """
+    try:
+        status = current_app.extensions['upload_sessions'].finalize(upload_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    if status is None:
+        return jsonify({"error": f"Unknown upload: {upload_id}"}), 404
+
+    response = build_session_response(status)
+    if status['status'] == 'failed':
+        return jsonify(dict(response, error=f"Error processing file {status['filename']}: {status['error']}")), 500
+    return jsonify(response), 200 if status['status'] == 'completed' else 202
@@ -0,0 +1,78 @@
+import os
+import uuid
+import logging
+from flask import Blueprint, request, jsonify, current_app
+
+# Import services
+from services.scenario_service import expand_grid, run_scenario_sweep
+from utils.dataset_loader import COMBINE_MODES
+from utils.serving import heavy_request
+from .jobs import resolve_demand_stats
+
+# Configure logger
+logger = logging.getLogger('inventory_optimizer_scenarios_api')
+
+# Create blueprint
+scenarios_bp = Blueprint('scenarios', __name__)
+
+def scenario_detail_path(sweep_id):
+    """Path of the per-SKU detail Parquet written for a scenario sweep"""
+    return os.path.join(current_app.config['OUTPUT_FOLDER'], 'scenarios', f"{sweep_id}.parquet")
+
+@scenarios_bp.route('/api/scenarios', methods=['POST'])
+@heavy_request
+def sweep_scenarios():
+    """
+    Evaluate every SKU under a grid of optimization parameters.
+
+    The body carries the same files, combine and demand_history fields as
+    /api/optimize, plus a grid such as {"safety_factor": [1.65, 1.96, 2.33]}
+    and an optional include_detail flag for per-SKU results.
+    """
+    logger.info("Scenario sweep endpoint called")
+    data = request.json
+
+    if not data or 'files' not in data:
+        logger.warning("No data provided or missing files information")
+        return jsonify({"error": "No data provided or missing files information"}), 400
+
+    file_paths = [file['parquet_path'] for file in data['files'] if 'parquet_path' in file]
+    if not file_paths:
+        logger.warning("No valid file paths provided")
+        return jsonify({"error": "No valid file paths provided"}), 400
+
+    combine = data.get('combine', 'concat')
+    if combine not in COMBINE_MODES:
+        return jsonify({"error": f"Invalid combine mode '{combine}', expected one of {list(COMBINE_MODES)}"}), 400
+
+    try:
+        scenarios = expand_grid(data.get('grid'))
+        demand_stats_path = resolve_demand_stats(data.get('demand_history'))
+    except ValueError as e:
+        logger.warning("Invalid scenario sweep request: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+    sweep_id = uuid.uuid4().hex
+    detail_path = None
+    if data.get('include_detail'):
+        detail_path = scenario_detail_path(sweep_id)
+        os.makedirs(os.path.dirname(detail_path), exist_ok=True)
+
+    try:
+        summaries = run_scenario_sweep(file_paths, scenarios, combine=combine,
+                                       demand_stats_path=demand_stats_path, detail_path=detail_path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error in scenario sweep: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    response = {
+        "message": f"Evaluated {len(scenarios)} scenarios",
+        "sweep_id": sweep_id,
+        "scenarios": summaries
+    }
+    if detail_path is not None:
+        response['result_id'] = sweep_id
+        response['results_url'] = f"/api/results/{sweep_id}"
+    return jsonify(response)
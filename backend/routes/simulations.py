@@ -0,0 +1,104 @@
+import os
+import glob
+import uuid
+import logging
+from flask import Blueprint, request, jsonify, current_app
+
+# Import services
+from services.optimization_service import resolve_parameters
+from services.simulation_service import resolve_simulation, summarize_simulation
+from utils.dataset_loader import COMBINE_MODES
+from utils.serving import heavy_request
+from .jobs import resolve_demand_stats
+
+# Configure logger
+logger = logging.getLogger('inventory_optimizer_simulations_api')
+
+# Create blueprint
+simulations_bp = Blueprint('simulations', __name__)
+
+# Simulation result sets kept in the output folder
+MAX_SIMULATION_RESULTS = 32
+
+def simulation_results_path(simulation_id):
+    """Path of the per-SKU results Parquet written for a simulation"""
+    return os.path.join(current_app.config['OUTPUT_FOLDER'], 'simulations', f"{simulation_id}.parquet")
+
+def _prune_simulation_results(keep):
+    """Remove the oldest simulation results beyond MAX_SIMULATION_RESULTS"""
+    paths = [path for path in glob.glob(os.path.join(os.path.dirname(keep), '*.parquet')) if path != keep]
+
+    def written_at(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0
+
+    paths.sort(key=written_at)
+    for path in paths[:max(0, len(paths) - (MAX_SIMULATION_RESULTS - 1))]:
+        logger.info("Removing simulation results %s", path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+@simulations_bp.route('/api/simulations', methods=['POST'])
+@heavy_request
+def run_simulation():
+    """
+    Monte Carlo check of the optimized reorder policy.
+
+    The body carries the same files, combine, parameters and demand_history
+    fields as /api/optimize, plus optional days, trials and seed. Per-SKU fill
+    rates and stockout statistics are stored and paged through /api/results.
+    """
+    logger.info("Simulation endpoint called")
+    data = request.json
+
+    if not data or 'files' not in data:
+        logger.warning("No data provided or missing files information")
+        return jsonify({"error": "No data provided or missing files information"}), 400
+
+    file_paths = [file['parquet_path'] for file in data['files'] if 'parquet_path' in file]
+    if not file_paths:
+        logger.warning("No valid file paths provided")
+        return jsonify({"error": "No valid file paths provided"}), 400
+
+    combine = data.get('combine', 'concat')
+    if combine not in COMBINE_MODES:
+        return jsonify({"error": f"Invalid combine mode '{combine}', expected one of {list(COMBINE_MODES)}"}), 400
+
+    try:
+        params = resolve_parameters(data.get('parameters'))
+        settings = resolve_simulation(data.get('days'), data.get('trials'), data.get('seed'))
+        demand_stats_path = resolve_demand_stats(data.get('demand_history'))
+    except ValueError as e:
+        logger.warning("Invalid simulation request: %s", e)
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        results, settings = current_app.extensions['simulator'].simulate(
+            file_paths, combine=combine, params=params, demand_stats_path=demand_stats_path,
+            **settings
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error("Error in simulation: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+    simulation_id = uuid.uuid4().hex
+    results_path = simulation_results_path(simulation_id)
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    results.write_parquet(results_path)
+    _prune_simulation_results(keep=results_path)
+
+    return jsonify({
+        "message": f"Simulated {len(results)} SKUs",
+        "simulation_id": simulation_id,
+        "parameters": params,
+        "summary": summarize_simulation(results, settings),
+        "result_id": simulation_id,
+        "results_url": f"/api/results/{simulation_id}",
+        "total_rows": len(results)
+    })
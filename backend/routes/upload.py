@@ -1,12 +1,11 @@
 import os
 import logging
 from flask import Blueprint, request, jsonify, current_app
-import polars as pl
 from werkzeug.utils import secure_filename
-import json
 
 # Import utilities
-from utils.data_processor import process_csv
+from utils.data_processor import process_csv_files
+from utils.serving import heavy_request
 
 # Configure logger
 logger = logging.getLogger('inventory_optimizer_upload')
@@ -19,19 +18,29 @@ def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'csv'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def convert_to_json_serializable(df_dict):
-    """Convert Polars Series objects to Python native types for JSON serialization"""
-    result = {}
-    for key, series in df_dict.items():
-        if hasattr(series, 'to_list'):  # Check if it's a Series-like object
-            result[key] = series.to_list()
-        else:
-            result[key] = series
-    return result
+def build_file_info(entry, name, ingest_stats=None):
+    """Describe an uploaded file from its catalog entry, as returned by the upload endpoints"""
+    return {
+        "id": entry['id'],
+        "name": name,
+        "original_path": entry['original_path'],
+        "parquet_path": entry['parquet_path'],
+        "columns": entry['columns'],
+        "row_count": entry['row_count'],
+        "preview": entry['preview'],
+        "ingest_stats": ingest_stats if ingest_stats is not None else entry['ingest_stats']
+    }
 
 @upload_bp.route('/api/upload', methods=['POST'])
+@heavy_request
 def upload_files():
-    """Handle file uploads, convert CSVs to Parquet, and return file info"""
+    """
+    Handle file uploads, convert CSVs to Parquet, and return file info.
+
+    Files are converted concurrently. Each file that fails is listed under
+    'errors' while the others are still uploaded; the request only fails
+    when no file could be uploaded.
+    """
     logger.info("File upload endpoint called")
     
     if 'files' not in request.files:
@@ -39,55 +48,65 @@ def upload_files():
         return jsonify({"error": "No files part in the request"}), 400
     
     files = request.files.getlist('files')
-    logger.info(f"Number of files received: {len(files)}")
+    logger.info("Number of files received: %s", len(files))
     
     if not files or files[0].filename == '':
         logger.warning("No files selected")
         return jsonify({"error": "No files selected"}), 400
     
-    uploaded_files = []
-    
+    # Saving reads the request body, which can only happen in order
+    saved = []
+    errors = []
     for file in files:
-        logger.info(f"Processing file: {file.filename}")
-        if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            logger.debug(f"Saving file to: {file_path}")
-            file.save(file_path)
-            
-            # Process CSV to Parquet for efficient handling
-            logger.info(f"Converting CSV to Parquet: {file_path}")
-            try:
-                parquet_path = process_csv(file_path)
-                logger.info(f"Parquet file created: {parquet_path}")
-                
-                # Read sample of the data for frontend preview
-                logger.debug("Reading sample data from parquet")
-                df = pl.read_parquet(parquet_path).slice(0, 10)
-                logger.debug(f"Preview data columns: {df.columns}")
-                logger.debug(f"Preview data shape: {df.shape}")
-                
-                # Convert to JSON serializable format
-                preview_data = convert_to_json_serializable(df.to_dict())
-                
-                file_info = {
-                    "name": filename,
-                    "original_path": file_path,
-                    "parquet_path": parquet_path,
-                    "columns": df.columns,
-                    "preview": preview_data
-                }
-                logger.debug(f"File info prepared: {filename}, columns: {df.columns}")
-                uploaded_files.append(file_info)
-            except Exception as e:
-                logger.error(f"Error processing CSV file {filename}: {str(e)}", exc_info=True)
-                return jsonify({"error": f"Error processing file {filename}: {str(e)}"}), 500
-        else:
-            logger.warning(f"Invalid file format: {file.filename}")
-            return jsonify({"error": f"Invalid file format: {file.filename}"}), 400
-    
-    logger.info(f"Successfully uploaded {len(uploaded_files)} files")
-    return jsonify({
+        logger.info("Receiving file: %s", file.filename)
+        if not (file and allowed_file(file.filename)):
+            logger.warning("Invalid file format: %s", file.filename)
+            errors.append({"name": file.filename, "error": f"Invalid file format: {file.filename}"})
+            continue
+        filename = secure_filename(file.filename)
+        if any(name == filename for name, _ in saved):
+            logger.warning("Duplicate file name: %s", filename)
+            errors.append({"name": file.filename, "error": f"Duplicate file name: {filename}"})
+            continue
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        logger.debug("Saving file to: %s", file_path)
+        file.save(file_path)
+        saved.append((filename, file_path))
+
+    # Schema, stats and the preview are recorded once, on the worker that
+    # converted the file; the preview decodes only the first row group
+    catalog = current_app.extensions['catalog']
+    names = {file_path: filename for filename, file_path in saved}
+
+    def register(csv_path, parquet_path, ingest_stats):
+        return catalog.register(parquet_path, name=names[csv_path], original_path=csv_path,
+                                ingest_stats=ingest_stats)
+
+    # Convert CSVs to Parquet for efficient handling, several files at once
+    outcomes = process_csv_files([file_path for _, file_path in saved],
+                                 max_workers=current_app.config['UPLOAD_WORKERS'],
+                                 on_converted=register)
+
+    uploaded_files = []
+    failed = 0
+    for (filename, file_path), outcome in zip(saved, outcomes):
+        if outcome['error'] is not None:
+            failed += 1
+            errors.append({"name": filename, "error": f"Error processing file {filename}: {outcome['error']}"})
+            continue
+        entry = outcome['result']
+        logger.info("Parquet file created: %s", outcome['parquet_path'])
+        uploaded_files.append(build_file_info(entry, filename, outcome['ingest_stats']))
+        logger.debug("File info prepared: %s, columns: %s", filename, entry['columns'])
+
+    logger.info("Successfully uploaded %s files, %s failed", len(uploaded_files), len(errors))
+    response = {
         "message": f"Successfully uploaded {len(uploaded_files)} files",
-        "files": uploaded_files
-    }) 
\ No newline at end of file
+        "files": uploaded_files,
+        "errors": errors
+    }
+    if not uploaded_files:
+        # Nothing usable: a server error if any conversion broke, otherwise a bad request
+        response['error'] = errors[0]['error'] if len(errors) == 1 else f"None of the {len(errors)} files could be uploaded"
+        return jsonify(response), 500 if failed else 400
+    return jsonify(response)
@@ -0,0 +1,324 @@
+import os
+import json
+import sqlite3
+import logging
+from contextlib import closing, contextmanager
+from datetime import datetime
+import polars as pl
+import pyarrow.parquet as pq
+
+from services.result_cache import file_content_hash
+from utils.instrumentation import span
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_catalog')
+
+# Rows kept as the preview of a dataset
+PREVIEW_ROWS = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    parquet_path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    original_path TEXT,
+    content_hash TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    row_groups INTEGER NOT NULL,
+    schema_json TEXT NOT NULL,
+    column_stats_json TEXT NOT NULL,
+    preview_json TEXT NOT NULL,
+    ingest_stats_json TEXT,
+    created_at TEXT NOT NULL
+)
+"""
+
+# Content hashes of uploaded source files, so a re-upload of the same bytes reuses its
+# Parquet file. parquet_hash is the content hash of that file when it was converted.
+_SOURCES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    content_hash TEXT PRIMARY KEY,
+    parquet_path TEXT NOT NULL,
+    parquet_hash TEXT,
+    created_at TEXT NOT NULL
+)
+"""
+
+# Columns returned when listing datasets; the stats and preview are only loaded per dataset
+_SUMMARY_COLUMNS = ['id', 'name', 'parquet_path', 'original_path', 'content_hash', 'size_bytes',
+                    'row_count', 'row_groups', 'schema_json', 'created_at']
+
+
+def _column_stats(parquet_path, metadata):
+    """
+    Per-column min, max and null count.
+
+    Taken from the row group statistics in the Parquet footer. Writers that
+    leave out min/max (the Polars writer does) get them from one aggregation
+    over the file instead, which only happens when a dataset is registered.
+    """
+    stats = {}
+    missing_min_max = set()
+    for i in range(metadata.num_columns):
+        name = metadata.schema.column(i).name
+        column = {"min": None, "max": None, "null_count": 0}
+        for rg in range(metadata.num_row_groups):
+            chunk_stats = metadata.row_group(rg).column(i).statistics
+            if chunk_stats is None:
+                missing_min_max.add(name)
+                column['null_count'] = None
+                continue
+            if column['null_count'] is not None:
+                column['null_count'] += chunk_stats.null_count
+            if not chunk_stats.has_min_max:
+                missing_min_max.add(name)
+                continue
+            if column['min'] is None or chunk_stats.min < column['min']:
+                column['min'] = chunk_stats.min
+            if column['max'] is None or chunk_stats.max > column['max']:
+                column['max'] = chunk_stats.max
+        stats[name] = column
+
+    if missing_min_max and metadata.num_rows:
+        names = [name for name in stats if name in missing_min_max]
+        row = pl.scan_parquet(parquet_path).select(
+            [pl.col(name).min().alias(f"{name}__min") for name in names] +
+            [pl.col(name).max().alias(f"{name}__max") for name in names] +
+            [pl.col(name).null_count().alias(f"{name}__nulls") for name in names]
+        ).collect().row(0, named=True)
+        for name in names:
+            stats[name].update(min=row[f"{name}__min"], max=row[f"{name}__max"],
+                               null_count=row[f"{name}__nulls"])
+    return stats
+
+
+def _read_preview(parquet_path, metadata):
+    """First PREVIEW_ROWS rows, decoded from the first row group only"""
+    if metadata.num_row_groups == 0:
+        return {name: [] for name in metadata.schema.names}
+    batches = pq.ParquetFile(parquet_path).iter_batches(batch_size=PREVIEW_ROWS, row_groups=[0])
+    preview = pl.from_arrow(next(batches))
+    return {col: preview[col].to_list() for col in preview.columns}
+
+
+class DatasetCatalog:
+    """
+    SQLite catalog of uploaded datasets.
+
+    Each converted upload is registered once, at ingest time, with its
+    schema, row count, content hash, per-column statistics and a preview.
+    Listing, previewing and validating datasets afterwards reads only the
+    catalog, never the Parquet files. Entries are keyed by Parquet path and
+    re-registered if the file on disk changes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute(_SOURCES_SCHEMA)
+            # Catalogs created before parquet_hash was recorded gain the column
+            if 'parquet_hash' not in [row['name'] for row in conn.execute("PRAGMA table_info(sources)")]:
+                conn.execute("ALTER TABLE sources ADD COLUMN parquet_hash TEXT")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per call is safe across threads and worker processes.
+        # The inner block commits (or rolls back) the transaction; closing() then
+        # releases the connection, which sqlite3's own context manager never does.
+        with closing(sqlite3.connect(self.db_path, timeout=30)) as conn:
+            conn.row_factory = sqlite3.Row
+            with conn:
+                yield conn
+
+    def register(self, parquet_path, name=None, original_path=None, ingest_stats=None):
+        """
+        Record a Parquet dataset in the catalog, replacing any previous entry for the path.
+
+        Args:
+            parquet_path (str): Converted Parquet file
+            name (str, optional): Display name, defaults to the file name
+            original_path (str, optional): The uploaded source file
+            ingest_stats (dict, optional): Statistics from the CSV conversion
+
+        Returns:
+            dict: The catalog entry, see get
+        """
+        with span('catalog_register') as stage:
+            stat = os.stat(parquet_path)
+            metadata = pq.read_metadata(parquet_path)
+            schema = {col: str(dtype) for col, dtype in pl.read_parquet_schema(parquet_path).items()}
+            record = {
+                "parquet_path": os.path.abspath(parquet_path),
+                "name": name or os.path.basename(parquet_path),
+                "original_path": original_path,
+                "content_hash": file_content_hash(parquet_path),
+                "size_bytes": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "row_count": metadata.num_rows,
+                "row_groups": metadata.num_row_groups,
+                "schema_json": json.dumps(schema),
+                "column_stats_json": json.dumps(_column_stats(parquet_path, metadata), default=str),
+                "preview_json": json.dumps(_read_preview(parquet_path, metadata), default=str),
+                "ingest_stats_json": json.dumps(ingest_stats) if ingest_stats is not None else None,
+                "created_at": datetime.now().isoformat()
+            }
+            stage.rows = metadata.num_rows
+
+        columns = ', '.join(record)
+        placeholders = ', '.join(f":{key}" for key in record)
+        updates = ', '.join(f"{key} = excluded.{key}" for key in record if key != 'parquet_path')
+        with self._connect() as conn:
+            conn.execute(f"INSERT INTO datasets ({columns}) VALUES ({placeholders}) "
+                         f"ON CONFLICT(parquet_path) DO UPDATE SET {updates}", record)
+        logger.info("Registered %s in the catalog (%s rows, %s columns)",
+                    parquet_path, metadata.num_rows, len(schema))
+        return self.get_by_path(parquet_path)
+
+    def _entry(self, row, detail=True):
+        entry = {key: row[key] for key in _SUMMARY_COLUMNS if key != 'schema_json'}
+        entry['schema'] = json.loads(row['schema_json'])
+        entry['columns'] = list(entry['schema'])
+        if detail:
+            entry['column_stats'] = json.loads(row['column_stats_json'])
+            entry['preview'] = json.loads(row['preview_json'])
+            entry['ingest_stats'] = json.loads(row['ingest_stats_json']) if row['ingest_stats_json'] else None
+        return entry
+
+    def _is_current(self, row):
+        """Whether the file still matches its entry; costs one stat call"""
+        try:
+            stat = os.stat(row['parquet_path'])
+        except OSError:
+            return False
+        return stat.st_size == row['size_bytes'] and stat.st_mtime_ns == row['mtime_ns']
+
+    def get(self, dataset_id):
+        """
+        Look up a dataset by catalog id.
+
+        Returns:
+            dict: Entry with schema, columns, row count, content hash, column
+                stats and preview, or None if unknown or the file is gone
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM datasets WHERE id = ?", (dataset_id,)).fetchone()
+        return self._resolve(row)
+
+    def get_by_path(self, parquet_path):
+        """Look up a dataset by its Parquet path, see get"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM datasets WHERE parquet_path = ?",
+                               (os.path.abspath(parquet_path),)).fetchone()
+        return self._resolve(row)
+
+    def _resolve(self, row):
+        if row is None:
+            return None
+        if self._is_current(row):
+            return self._entry(row)
+        if not os.path.exists(row['parquet_path']):
+            self.remove(row['id'])
+            return None
+        logger.info("Catalog entry for %s is stale, re-registering", row['parquet_path'])
+        ingest_stats = json.loads(row['ingest_stats_json']) if row['ingest_stats_json'] else None
+        return self.register(row['parquet_path'], row['name'], row['original_path'], ingest_stats)
+
+    def list(self):
+        """
+        List every registered dataset, newest first.
+
+        Returns:
+            list: Entries without column stats and previews
+        """
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {', '.join(_SUMMARY_COLUMNS)} FROM datasets ORDER BY id DESC").fetchall()
+        return [self._entry(row, detail=False) for row in rows]
+
+    def remove(self, dataset_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM datasets WHERE id = ?", (dataset_id,))
+
+    def record_source(self, content_hash, parquet_path, parquet_hash):
+        """
+        Remember that an uploaded file with this content hash was converted to parquet_path.
+
+        Args:
+            content_hash (str): Content hash of the uploaded source file
+            parquet_path (str): Parquet file it was converted to
+            parquet_hash (str): Content hash of that Parquet file, as catalogued
+        """
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO sources (content_hash, parquet_path, parquet_hash, created_at) "
+                         "VALUES (?, ?, ?, ?)",
+                         (content_hash, os.path.abspath(parquet_path), parquet_hash, datetime.now().isoformat()))
+
+    def find_by_source_hash(self, content_hash):
+        """
+        Look up the dataset converted from an upload with this content hash.
+
+        The Parquet file must still hold what was converted: if it is gone
+        or its content hash changed (say another upload was written to the
+        same path), the source is forgotten and None is returned.
+
+        Returns:
+            dict: Catalog entry, see get, or None if no such upload was
+                converted or its Parquet file no longer holds the conversion
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT parquet_path, parquet_hash FROM sources WHERE content_hash = ?",
+                               (content_hash,)).fetchone()
+        if row is None:
+            return None
+        entry = self.get_by_path(row['parquet_path'])
+        if entry is not None and entry['content_hash'] != row['parquet_hash']:
+            logger.info("%s changed since upload %s was converted to it, not reusing it",
+                        row['parquet_path'], content_hash)
+            entry = None
+        if entry is None:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM sources WHERE content_hash = ?", (content_hash,))
+        return entry
+
+    def validate(self, parquet_paths, required_columns):
+        """
+        Check datasets for required columns using only the catalog.
+
+        Args:
+            parquet_paths (list): Parquet files, as passed to the optimizer
+            required_columns (list): Columns the consumer needs
+
+        Returns:
+            dict: Per-file columns and missing columns, plus the columns
+                missing from all files together; files not in the catalog
+                are listed under 'unknown_files'
+        """
+        files = []
+        unknown = []
+        available = set()
+        for path in parquet_paths:
+            entry = self.get_by_path(path)
+            if entry is None:
+                unknown.append(path)
+                continue
+            available.update(entry['columns'])
+            files.append({
+                "id": entry['id'],
+                "parquet_path": path,
+                "row_count": entry['row_count'],
+                "missing_columns": [col for col in required_columns if col not in entry['columns']]
+            })
+        return {
+            "files": files,
+            "unknown_files": unknown,
+            "missing_columns": [col for col in required_columns if col not in available]
+        }
+
+
+def init_catalog(app):
+    """Open the dataset catalog for the app and register it as an extension"""
+    catalog = DatasetCatalog(app.config['CATALOG_PATH'])
+    app.extensions['catalog'] = catalog
+    return catalog
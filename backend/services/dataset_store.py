@@ -0,0 +1,461 @@
+import os
+import re
+import glob
+import json
+import time
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+import polars as pl
+
+from services.optimization_service import REQUIRED_COLUMNS, apply_demand_stats, build_optimization_plan
+from services.result_cache import MODEL_VERSION, file_content_hash
+from utils.data_processor import standardize_column_name, build_null_fill_exprs
+from utils.instrumentation import span
+from utils.locking import directory_lock
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_datasets')
+
+# Column types of the stored inventory; deltas are cast to these on upsert
+STORE_SCHEMA = {
+    'product_id': pl.Utf8,
+    'name': pl.Utf8,
+    'current_stock': pl.Int64,
+    'unit_cost': pl.Float64,
+    'lead_time_days': pl.Int64,
+    'daily_demand': pl.Float64,
+    'demand_std_dev': pl.Float64
+}
+
+# Columns that feed the model; a row is recomputed when any of them changes
+HASHED_COLUMNS = [col for col in STORE_SCHEMA if col != 'product_id']
+
+# Optional delta column marking rows to remove from the dataset
+DELETE_COLUMN = 'deleted'
+
+# Inventory rows are spread over this many shard files by product_id hash
+SHARD_COUNT = 64
+
+# Result sets (one per parameter set) kept per dataset; the least recently used are removed
+MAX_RESULT_SETS = 8
+
+_DATASET_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def dataset_path(datasets_folder, name):
+    """
+    Return the directory of a named dataset.
+
+    Raises:
+        ValueError: If the name contains characters other than letters, digits, '-' or '_'
+    """
+    if not _DATASET_NAME_PATTERN.match(name or ''):
+        raise ValueError(f"Invalid dataset name '{name}'")
+    return os.path.join(datasets_folder, name)
+
+
+def dataset_results_path(datasets_folder, result_id):
+    """
+    Find the directory of a dataset result set by its id.
+
+    Returns:
+        str: Directory holding the result shards, or None if the id is unknown
+    """
+    for path in glob.glob(os.path.join(datasets_folder, '*', 'results', result_id)):
+        if os.path.exists(_manifest_path(path)):
+            return path
+    return None
+
+
+def _shard_name(shard):
+    return f"part-{shard:03d}.parquet"
+
+
+def _inventory_path(dataset_dir, shard):
+    return os.path.join(dataset_dir, 'inventory', _shard_name(shard))
+
+
+def _manifest_path(directory):
+    return os.path.join(directory, 'manifest.json')
+
+
+def _read_manifest(directory, default=None):
+    try:
+        with open(_manifest_path(directory)) as f:
+            return json.load(f)
+    except OSError:
+        return default
+
+
+def _write_manifest(directory, manifest):
+    tmp_path = f"{_manifest_path(directory)}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, _manifest_path(directory))
+
+
+def _write_shard(df, path):
+    """Write a shard beside the old one, then swap it in"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    df.write_parquet(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _with_keys(df, shard_count):
+    """Add the row_hash of the model inputs and the shard of every row"""
+    return df.with_columns([
+        pl.struct(HASHED_COLUMNS).hash().alias('row_hash'),
+        (pl.col('product_id').hash() % shard_count).cast(pl.Int32).alias('shard')
+    ])
+
+
+def _new_manifest():
+    return {
+        "version": 0,
+        "shard_count": SHARD_COUNT,
+        # Row hashes and shard assignment come from Polars' hash functions,
+        # which are only stable within a Polars version
+        "hash_version": pl.__version__,
+        "shards": {},
+        "rows_upserted": 0
+    }
+
+
+def _load_manifest(dataset_dir):
+    """Read a dataset manifest, re-sharding the dataset first if it was hashed by another Polars version"""
+    manifest = _read_manifest(dataset_dir)
+    if manifest is None or manifest['hash_version'] == pl.__version__:
+        return manifest
+
+    logger.warning("Dataset %s was hashed with Polars %s, re-sharding for %s",
+                   dataset_dir, manifest['hash_version'], pl.__version__)
+    paths = [_inventory_path(dataset_dir, int(shard)) for shard in manifest['shards']]
+    inventory = pl.concat([pl.read_parquet(path).select(list(STORE_SCHEMA)) for path in paths]) if paths else None
+
+    shutil.rmtree(os.path.join(dataset_dir, 'inventory'), ignore_errors=True)
+    shutil.rmtree(os.path.join(dataset_dir, 'results'), ignore_errors=True)
+    rebuilt = dict(_new_manifest(), version=manifest['version'] + 1, rows_upserted=manifest['rows_upserted'])
+    if inventory is not None:
+        keyed = _with_keys(inventory, rebuilt['shard_count'])
+        for shard, part in keyed.partition_by('shard', as_dict=True).items():
+            _write_shard(part.drop('shard'), _inventory_path(dataset_dir, shard))
+            rebuilt['shards'][str(shard)] = {"version": rebuilt['version'], "rows": len(part)}
+    _write_manifest(dataset_dir, rebuilt)
+    return rebuilt
+
+
+def _scan_delta(source_path):
+    """
+    Lazily scan a CSV or Parquet delta file into the store schema.
+
+    Returns:
+        tuple: (pl.LazyFrame with STORE_SCHEMA columns plus a boolean
+            DELETE_COLUMN, list of required columns the file lacks)
+    """
+    if source_path.lower().endswith('.parquet'):
+        lf = pl.scan_parquet(source_path)
+        lf = lf.rename({col: standardize_column_name(col) for col in lf.columns})
+    else:
+        lf = pl.scan_csv(source_path, with_column_names=lambda cols: [standardize_column_name(c) for c in cols])
+
+    schema = lf.schema
+    has_deletes = DELETE_COLUMN in schema
+    # Rows that are only being deleted need nothing but a product_id
+    missing = [col for col in REQUIRED_COLUMNS if col not in schema]
+    if missing and not (has_deletes and 'product_id' in schema):
+        raise ValueError(f"Delta file is missing required columns: {missing}")
+
+    columns = []
+    for col, dtype in STORE_SCHEMA.items():
+        if col in schema:
+            columns.append(pl.col(col).cast(dtype, strict=False))
+        else:
+            columns.append(pl.lit(None, dtype=dtype).alias(col))
+
+    deleted = pl.lit(False)
+    if has_deletes:
+        deleted = pl.col(DELETE_COLUMN)
+        if schema[DELETE_COLUMN] == pl.Utf8:
+            deleted = deleted.str.strip().str.to_lowercase().is_in(['1', 'true', 'yes', 'y'])
+        else:
+            deleted = deleted.cast(pl.Boolean, strict=False)
+    columns.append(deleted.fill_null(False).alias(DELETE_COLUMN))
+
+    # Same null rules as a regular upload; a missing standard deviation
+    # stays null so the model falls back to its estimate
+    fill_schema = {col: dtype for col, dtype in STORE_SCHEMA.items() if col in schema}
+    lf = (lf.select(columns)
+          .filter(pl.col('product_id').is_not_null() & (pl.col('product_id') != ''))
+          .with_columns(build_null_fill_exprs(fill_schema)))
+    return lf, missing
+
+
+def upsert_delta(source_path, dataset_dir):
+    """
+    Apply a file of changed inventory rows to a dataset.
+
+    Rows are matched on product_id: new products are inserted, known ones
+    replaced and rows with a true 'deleted' column removed. Later rows win
+    when a product appears more than once. Only the shards holding affected
+    products are rewritten, and a shard whose rows come out identical is not
+    touched at all, so its optimization results stay reusable.
+
+    Args:
+        source_path (str): CSV or Parquet file with inventory rows
+        dataset_dir (str): Directory of the dataset, created if needed
+
+    Returns:
+        dict: Upsert summary (rows read, inserted, updated, unchanged, deleted,
+            shards rewritten)
+
+    Raises:
+        ValueError: If the file lacks required columns
+    """
+    logger.info("Upserting %s into dataset %s", source_path, dataset_dir)
+    start_time = time.perf_counter()
+    os.makedirs(dataset_dir, exist_ok=True)
+
+    with span('dataset_upsert') as stage:
+        lf, missing = _scan_delta(source_path)
+        delta = lf.unique(subset='product_id', keep='last', maintain_order=True).collect(streaming=True)
+        if missing and not delta[DELETE_COLUMN].all():
+            raise ValueError(f"Delta file is missing required columns: {missing}")
+        stage.rows = len(delta)
+
+        # Serialized across server workers, whose upserts would otherwise overwrite each other's shards
+        with directory_lock(dataset_dir):
+            manifest = _load_manifest(dataset_dir) or _new_manifest()
+            delta = _with_keys(delta, manifest['shard_count'])
+            version = manifest['version'] + 1
+            counts = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+            shards_rewritten = 0
+
+            for shard, part in delta.partition_by('shard', as_dict=True).items():
+                path = _inventory_path(dataset_dir, shard)
+                entry = manifest['shards'].get(str(shard))
+                existing = pl.read_parquet(path) if entry else None
+
+                upserts = part.filter(~pl.col(DELETE_COLUMN)).drop([DELETE_COLUMN, 'shard'])
+                deletes = part.filter(pl.col(DELETE_COLUMN)).select('product_id')
+                if existing is None:
+                    inserted, updated, unchanged, deleted = len(upserts), 0, 0, 0
+                else:
+                    previous = existing.select(['product_id', pl.col('row_hash').alias('previous_hash')])
+                    matched = upserts.select(['product_id', 'row_hash']).join(previous, on='product_id', how='left')
+                    inserted = matched['previous_hash'].null_count()
+                    unchanged = int((matched['previous_hash'] == matched['row_hash']).sum() or 0)
+                    updated = len(matched) - inserted - unchanged
+                    deleted = len(deletes.join(previous, on='product_id', how='semi'))
+
+                counts['inserted'] += inserted
+                counts['updated'] += updated
+                counts['unchanged'] += unchanged
+                counts['deleted'] += deleted
+                if inserted + updated + deleted == 0:
+                    continue
+
+                shard_rows = upserts
+                if existing is not None:
+                    shard_rows = pl.concat([existing.join(part.select('product_id'), on='product_id', how='anti'),
+                                            upserts])
+                shards_rewritten += 1
+                if len(shard_rows):
+                    _write_shard(shard_rows, path)
+                    manifest['shards'][str(shard)] = {"version": version, "rows": len(shard_rows)}
+                else:
+                    _remove_file(path)
+                    manifest['shards'].pop(str(shard), None)
+
+            if shards_rewritten:
+                manifest['version'] = version
+            manifest['rows_upserted'] += len(delta)
+            _write_manifest(dataset_dir, manifest)
+
+    summary = dict(counts, rows_read=len(delta), shards_rewritten=shards_rewritten,
+                   total_rows=sum(entry['rows'] for entry in manifest['shards'].values()),
+                   version=manifest['version'], seconds=round(time.perf_counter() - start_time, 4))
+    logger.info("Dataset upsert complete: %s", summary)
+    return summary
+
+
+def _result_set_id(dataset_dir, params, demand_stats_path):
+    """Id of the result set for a dataset, parameter set and demand statistics file"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        "model_version": MODEL_VERSION,
+        "dataset": os.path.basename(os.path.abspath(dataset_dir)),
+        "params": params,
+        "demand_stats": file_content_hash(demand_stats_path) if demand_stats_path else None
+    }, sort_keys=True).encode())
+    return digest.hexdigest()[:32]
+
+
+def _shard_stats(results):
+    """Per-shard sums from which the dataset summary is built without reading every shard"""
+    return {
+        "rows": len(results),
+        "cost_savings": float(results['cost_savings'].sum() or 0),
+        "stock_reduction_sum": float(results['stock_reduction_pct'].sum() or 0),
+        "stock_reduction_count": len(results) - results['stock_reduction_pct'].null_count()
+    }
+
+
+def _prune_result_sets(dataset_dir, keep):
+    """Remove the least recently used result sets beyond MAX_RESULT_SETS"""
+    result_dirs = [path for path in glob.glob(os.path.join(dataset_dir, 'results', '*')) if path != keep]
+    result_dirs.sort(key=lambda path: os.path.getmtime(_manifest_path(path))
+                     if os.path.exists(_manifest_path(path)) else 0)
+    for path in result_dirs[:max(0, len(result_dirs) - (MAX_RESULT_SETS - 1))]:
+        logger.info("Removing result set %s", path)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def optimize_dataset(dataset_dir, params, demand_stats_path=None):
+    """
+    Bring a dataset's optimization results up to date, recomputing only what changed.
+
+    Results are kept per parameter set as one Parquet file per inventory
+    shard, alongside the row hashes they were computed from. Shards that
+    have not been rewritten since the last run are reused without being
+    read. In a rewritten shard only rows whose inputs changed, or that are
+    new, go through the model; the rest are copied from the previous
+    results and the shard's result file is replaced.
+
+    Args:
+        dataset_dir (str): Directory of the dataset
+        params (dict): Resolved optimization parameters
+        demand_stats_path (str, optional): Per-SKU demand statistics from sales history
+
+    Returns:
+        dict: result_id, results_dir, summary statistics and the numbers of
+            rows recomputed and reused
+
+    Raises:
+        ValueError: If the dataset does not exist or has no rows
+    """
+    start_time = time.perf_counter()
+    if not os.path.isdir(dataset_dir):
+        raise ValueError(f"Unknown dataset: {os.path.basename(dataset_dir)}")
+    with directory_lock(dataset_dir):
+        manifest = _load_manifest(dataset_dir)
+        if manifest is None:
+            raise ValueError(f"Unknown dataset: {os.path.basename(dataset_dir)}")
+        if not manifest['shards']:
+            raise ValueError(f"Dataset {os.path.basename(dataset_dir)} has no rows")
+
+        result_id = _result_set_id(dataset_dir, params, demand_stats_path)
+        results_dir = os.path.join(dataset_dir, 'results', result_id)
+        state = _read_manifest(results_dir, default={"shards": {}})
+        logger.info("Optimizing dataset %s at version %s (result set %s)",
+                    dataset_dir, manifest['version'], result_id)
+
+        rows_recomputed = rows_reused = shards_rewritten = 0
+        with span('dataset_optimize') as stage:
+            for shard_key, entry in manifest['shards'].items():
+                computed = state['shards'].get(shard_key)
+                if computed is not None and computed['version'] == entry['version']:
+                    rows_reused += entry['rows']
+                    continue
+
+                shard = int(shard_key)
+                results_path = os.path.join(results_dir, _shard_name(shard))
+                inputs_path = os.path.join(results_dir, 'inputs', _shard_name(shard))
+                inventory = pl.read_parquet(_inventory_path(dataset_dir, shard))
+
+                changed = inventory
+                reused = None
+                if computed is not None:
+                    previous_inputs = pl.read_parquet(inputs_path)
+                    unchanged_ids = (inventory.select(['product_id', 'row_hash'])
+                                     .join(previous_inputs, on=['product_id', 'row_hash'], how='semi')
+                                     .select('product_id'))
+                    changed = inventory.join(unchanged_ids, on='product_id', how='anti')
+                    reused = pl.read_parquet(results_path).join(unchanged_ids, on='product_id', how='semi')
+
+                lf = changed.drop('row_hash').lazy()
+                if demand_stats_path:
+                    lf = apply_demand_stats(lf, demand_stats_path)
+                recomputed = build_optimization_plan(lf, params).collect()
+                shard_results = pl.concat([reused, recomputed]) if reused is not None else recomputed
+
+                _write_shard(shard_results, results_path)
+                _write_shard(inventory.select(['product_id', 'row_hash']), inputs_path)
+                state['shards'][shard_key] = dict(_shard_stats(shard_results), version=entry['version'])
+                rows_recomputed += len(recomputed)
+                rows_reused += len(shard_results) - len(recomputed)
+                shards_rewritten += 1
+
+            # Shards whose every row was deleted since the last run
+            for shard_key in set(state['shards']) - set(manifest['shards']):
+                _remove_file(os.path.join(results_dir, _shard_name(int(shard_key))))
+                _remove_file(os.path.join(results_dir, 'inputs', _shard_name(int(shard_key))))
+                del state['shards'][shard_key]
+                shards_rewritten += 1
+            stage.rows = rows_recomputed
+
+        state.update(params=params, demand_stats_path=demand_stats_path, dataset_version=manifest['version'])
+        os.makedirs(results_dir, exist_ok=True)
+        _write_manifest(results_dir, state)
+        _prune_result_sets(dataset_dir, keep=results_dir)
+
+    shard_stats = state['shards'].values()
+    total_rows = sum(stats['rows'] for stats in shard_stats)
+    reduction_count = sum(stats['stock_reduction_count'] for stats in shard_stats)
+    elapsed = time.perf_counter() - start_time
+    logger.info("Dataset optimization finished in %.3fs: %s rows recomputed, %s reused, %s shards rewritten",
+                elapsed, rows_recomputed, rows_reused, shards_rewritten)
+    return {
+        "result_id": result_id,
+        "results_dir": results_dir,
+        "dataset_version": manifest['version'],
+        "total_rows": total_rows,
+        "rows_recomputed": rows_recomputed,
+        "rows_reused": rows_reused,
+        "shards_rewritten": shards_rewritten,
+        "seconds": round(elapsed, 4),
+        "summary": {
+            "totalSavings": sum(stats['cost_savings'] for stats in shard_stats),
+            "averageStockReduction": (sum(stats['stock_reduction_sum'] for stats in shard_stats) / reduction_count
+                                      if reduction_count else None),
+            "optimizationDate": datetime.now().isoformat()
+        }
+    }
+
+
+def describe_dataset(dataset_dir):
+    """
+    Summarize a dataset.
+
+    Returns:
+        dict: Version, row and shard counts and the stored result sets, or
+            None if the dataset does not exist
+    """
+    manifest = _read_manifest(dataset_dir)
+    if manifest is None:
+        return None
+    result_sets = []
+    for path in sorted(glob.glob(os.path.join(dataset_dir, 'results', '*'))):
+        state = _read_manifest(path)
+        if state is not None:
+            result_sets.append({
+                "result_id": os.path.basename(path),
+                "parameters": state.get('params'),
+                "dataset_version": state.get('dataset_version'),
+                "up_to_date": state.get('dataset_version') == manifest['version']
+            })
+    return {
+        "version": manifest['version'],
+        "total_rows": sum(entry['rows'] for entry in manifest['shards'].values()),
+        "shards": len(manifest['shards']),
+        "rows_upserted": manifest['rows_upserted'],
+        "result_sets": result_sets
+    }
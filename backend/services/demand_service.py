@@ -0,0 +1,331 @@
+import os
+import re
+import json
+import glob
+import shutil
+import logging
+import polars as pl
+
+from utils.data_processor import standardize_column_name
+from utils.locking import directory_lock
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_demand')
+
+# Columns expected in transactional sales history
+HISTORY_COLUMNS = ['date', 'product_id', 'qty']
+
+# Per-SKU sufficient statistics kept between ingests
+STATE_SCHEMA = {
+    'product_id': pl.Utf8,
+    'demand_sum': pl.Float64,
+    'demand_sum_sq': pl.Float64,
+    'first_date': pl.Date
+}
+
+_HISTORY_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def history_path(demand_folder, name):
+    """
+    Return the directory of a named sales history.
+
+    Raises:
+        ValueError: If the name contains characters other than letters, digits, '-' or '_'
+    """
+    if not _HISTORY_NAME_PATTERN.match(name or ''):
+        raise ValueError(f"Invalid demand history name '{name}'")
+    return os.path.join(demand_folder, name)
+
+
+def _partition_dir(history_dir, day_iso):
+    return os.path.join(history_dir, 'daily', f"date={day_iso}")
+
+
+def _partition_file(manifest, day_iso):
+    """Name of the file holding a day's totals; histories written before versioning use part-0"""
+    return manifest.get('files', {}).get(day_iso, 'part-0.parquet')
+
+
+def _state_path(history_dir, manifest):
+    return os.path.join(history_dir, manifest.get('state', 'state.parquet'))
+
+
+def stats_path(history_dir):
+    """Path of the per-SKU demand statistics derived from a history"""
+    return os.path.join(history_dir, 'demand_stats.parquet')
+
+
+def _manifest_path(history_dir):
+    return os.path.join(history_dir, 'manifest.json')
+
+
+def _read_manifest(history_dir):
+    try:
+        with open(_manifest_path(history_dir)) as f:
+            return json.load(f)
+    except OSError:
+        return {"dates": [], "last_date": None, "rows_ingested": 0}
+
+
+def _remove_stale_files(history_dir, manifest):
+    """
+    Delete day partitions and state files the manifest no longer refers to.
+
+    These are files of replaced versions and leftovers of an ingest that
+    stopped before its manifest was written.
+    """
+    for partition_dir in glob.glob(os.path.join(history_dir, 'daily', 'date=*')):
+        day_iso = os.path.basename(partition_dir)[len('date='):]
+        if day_iso not in manifest['dates']:
+            shutil.rmtree(partition_dir, ignore_errors=True)
+            continue
+        current = _partition_file(manifest, day_iso)
+        for name in os.listdir(partition_dir):
+            if name != current:
+                os.remove(os.path.join(partition_dir, name))
+    current_state = _state_path(history_dir, manifest)
+    for path in glob.glob(os.path.join(history_dir, 'state*.parquet')):
+        if path != current_state:
+            os.remove(path)
+
+
+def _write_manifest(history_dir, manifest):
+    tmp_path = f"{_manifest_path(history_dir)}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, _manifest_path(history_dir))
+
+
+def _scan_source(source_path):
+    """Lazily scan a CSV or Parquet sales file as (date, product_id, qty)"""
+    if source_path.lower().endswith('.parquet'):
+        lf = pl.scan_parquet(source_path)
+        lf = lf.rename({col: standardize_column_name(col) for col in lf.columns})
+    else:
+        lf = pl.scan_csv(source_path, try_parse_dates=True,
+                         with_column_names=lambda cols: [standardize_column_name(c) for c in cols])
+
+    missing = [col for col in HISTORY_COLUMNS if col not in lf.columns]
+    if missing:
+        raise ValueError(f"Sales history is missing required columns: {missing}")
+
+    date_type = lf.schema['date']
+    date_expr = pl.col('date')
+    if date_type == pl.Utf8:
+        date_expr = date_expr.str.strptime(pl.Date, '%Y-%m-%d')
+    elif date_type != pl.Date:
+        date_expr = date_expr.cast(pl.Date)
+
+    return lf.select([
+        date_expr.alias('date'),
+        pl.col('product_id').cast(pl.Utf8),
+        pl.col('qty').cast(pl.Float64).fill_null(0.0)
+    ]).filter(pl.col('date').is_not_null())
+
+
+def _contributions(daily):
+    """Per-SKU sums, sums of squares and first dates of a frame of daily totals"""
+    return daily.group_by('product_id').agg([
+        pl.col('qty').sum().alias('demand_sum'),
+        (pl.col('qty') ** 2).sum().alias('demand_sum_sq'),
+        pl.col('date').min().alias('first_date')
+    ])
+
+
+def ingest_sales_history(source_path, history_dir):
+    """
+    Add a file of sales transactions to a demand history.
+
+    Transactions are aggregated to daily totals per SKU with a streaming
+    group-by and stored as one Parquet partition per day. Per-SKU sufficient
+    statistics are then updated from the touched days only, so ingesting a
+    new day never rescans earlier partitions. Days that already exist are
+    merged with the new transactions.
+
+    Every ingest is a new version of the history. The touched days and the
+    state are written to new files named after it, beside the current ones,
+    and the manifest records which file of each is current. Writing the
+    manifest therefore commits the ingest as a whole; files it replaced are
+    removed afterwards. An ingest that stops midway leaves the history as it
+    was, so retrying the file does not count its transactions twice.
+
+    Args:
+        source_path (str): CSV or Parquet file with date, product_id and qty columns
+        history_dir (str): Directory of the demand history
+
+    Returns:
+        dict: Ingestion summary (rows read, days added and updated, SKUs)
+    """
+    logger.info("Ingesting sales history from %s into %s", source_path, history_dir)
+    os.makedirs(history_dir, exist_ok=True)
+
+    source = _scan_source(source_path)
+    rows_read = source.select(pl.count()).collect().item()
+    daily = (source.group_by(['product_id', 'date'])
+             .agg(pl.col('qty').sum())
+             .collect(streaming=True))
+    logger.info("Aggregated %s transactions to %s daily SKU totals", rows_read, len(daily))
+
+    # Serialized across server workers, whose state updates would otherwise overwrite each other
+    with directory_lock(history_dir):
+        manifest = _read_manifest(history_dir)
+        # Leftovers of an interrupted ingest would otherwise share the new version's file names
+        _remove_stale_files(history_dir, manifest)
+        known_dates = set(manifest['dates'])
+        version = manifest.get('version', 0) + 1
+        files = dict(manifest.get('files', {}))
+
+        previous_parts = []
+        updated_parts = []
+        added_dates, updated_dates = [], []
+        for day, new_part in daily.partition_by('date', as_dict=True, include_key=True).items():
+            day_iso = day.isoformat()
+            part_dir = _partition_dir(history_dir, day_iso)
+            if day_iso in known_dates:
+                old_part = pl.read_parquet(os.path.join(part_dir, _partition_file(manifest, day_iso)))
+                previous_parts.append(old_part)
+                new_part = (pl.concat([old_part, new_part])
+                            .group_by(['product_id', 'date'])
+                            .agg(pl.col('qty').sum()))
+                updated_dates.append(day_iso)
+            else:
+                added_dates.append(day_iso)
+            updated_parts.append(new_part)
+
+            # Written beside the current file, which stays in use until the manifest changes
+            os.makedirs(part_dir, exist_ok=True)
+            files[day_iso] = f"part-{version}.parquet"
+            new_part.write_parquet(os.path.join(part_dir, files[day_iso]))
+
+        previous_state_path = _state_path(history_dir, manifest)
+        if updated_parts:
+            manifest.update(version=version, files=files, state=f"state-{version}.parquet")
+            _update_state(previous_state_path, _state_path(history_dir, manifest), previous_parts, updated_parts)
+
+        manifest['dates'] = sorted(known_dates.union(added_dates))
+        manifest['last_date'] = manifest['dates'][-1] if manifest['dates'] else None
+        manifest['rows_ingested'] += rows_read
+        # The commit point: readers and later ingests switch to the new files
+        _write_manifest(history_dir, manifest)
+        _remove_stale_files(history_dir, manifest)
+        sku_count = write_demand_stats(history_dir, manifest)
+
+    summary = {
+        "rows_read": rows_read,
+        "days_added": len(added_dates),
+        "days_updated": len(updated_dates),
+        "total_days": len(manifest['dates']),
+        "skus": sku_count,
+        "first_date": manifest['dates'][0] if manifest['dates'] else None,
+        "last_date": manifest['last_date']
+    }
+    logger.info("Sales history ingest complete: %s", summary)
+    return summary
+
+
+def _update_state(previous_state_path, state_path, previous_parts, updated_parts):
+    """
+    Apply the difference between old and new daily totals of the touched days to the SKU state.
+
+    The state at ``previous_state_path`` is left as it is; the updated
+    state is written to ``state_path``.
+    """
+    delta = _contributions(pl.concat(updated_parts))
+    if previous_parts:
+        removed = _contributions(pl.concat(previous_parts)).select([
+            'product_id',
+            (-pl.col('demand_sum')).alias('demand_sum'),
+            (-pl.col('demand_sum_sq')).alias('demand_sum_sq'),
+            'first_date'
+        ])
+        delta = pl.concat([delta, removed])
+
+    frames = [delta]
+    if os.path.exists(previous_state_path):
+        frames.append(pl.read_parquet(previous_state_path))
+
+    state = (pl.concat([frame.select(list(STATE_SCHEMA)).cast(STATE_SCHEMA) for frame in frames])
+             .group_by('product_id')
+             .agg([
+                 pl.col('demand_sum').sum(),
+                 pl.col('demand_sum_sq').sum(),
+                 pl.col('first_date').min()
+             ]))
+    state.write_parquet(state_path)
+
+
+def rebuild_state(history_dir):
+    """
+    Recompute the per-SKU state from every daily partition.
+
+    Runs as a lazy, streaming group-by over all partitions, so it works on
+    histories larger than memory. Only needed for recovery or verification;
+    normal ingests update the state incrementally.
+    """
+    logger.info("Rebuilding demand state from all partitions in %s", history_dir)
+    with directory_lock(history_dir):
+        manifest = _read_manifest(history_dir)
+        if not manifest['dates']:
+            raise ValueError(f"Demand history {history_dir} has no data")
+        partitions = [os.path.join(_partition_dir(history_dir, day_iso), _partition_file(manifest, day_iso))
+                      for day_iso in manifest['dates']]
+        state = _contributions(pl.concat([pl.scan_parquet(partition) for partition in partitions]))
+        state_path = _state_path(history_dir, manifest)
+        tmp_path = f"{state_path}.tmp"
+        state.collect(streaming=True).write_parquet(tmp_path)
+        os.replace(tmp_path, state_path)
+        return write_demand_stats(history_dir, manifest)
+
+
+def write_demand_stats(history_dir, manifest):
+    """
+    Derive mean daily demand and its standard deviation for every SKU.
+
+    Days without sales count as zero demand. Each SKU is measured from its
+    first sale to the last day in the history.
+
+    Returns:
+        int: Number of SKUs with statistics
+    """
+    if not os.path.exists(_state_path(history_dir, manifest)) or manifest['last_date'] is None:
+        return 0
+
+    last_date = pl.lit(manifest['last_date']).str.strptime(pl.Date, '%Y-%m-%d')
+    days = ((last_date - pl.col('first_date')).dt.days() + 1).cast(pl.Float64)
+    mean = pl.col('demand_sum') / days
+    variance = (pl.col('demand_sum_sq') - days * mean ** 2) / (days - 1)
+
+    stats = pl.scan_parquet(_state_path(history_dir, manifest)).select([
+        'product_id',
+        mean.alias('daily_demand'),
+        pl.when(days > 1).then(variance.clip_min(0).sqrt()).otherwise(0.0).alias('demand_std_dev'),
+        days.cast(pl.Int32).alias('observed_days')
+    ]).collect()
+
+    tmp_path = f"{stats_path(history_dir)}.tmp"
+    stats.write_parquet(tmp_path)
+    os.replace(tmp_path, stats_path(history_dir))
+    return len(stats)
+
+
+def describe_history(history_dir):
+    """
+    Summarize a demand history.
+
+    Returns:
+        dict: Date range, day and SKU counts, or None if the history does not exist
+    """
+    if not os.path.exists(_manifest_path(history_dir)):
+        return None
+    manifest = _read_manifest(history_dir)
+    skus = 0
+    if os.path.exists(stats_path(history_dir)):
+        skus = pl.scan_parquet(stats_path(history_dir)).select(pl.count()).collect().item()
+    return {
+        "total_days": len(manifest['dates']),
+        "first_date": manifest['dates'][0] if manifest['dates'] else None,
+        "last_date": manifest['last_date'],
+        "rows_ingested": manifest['rows_ingested'],
+        "skus": skus,
+        "stats_path": stats_path(history_dir)
+    }
@@ -0,0 +1,123 @@
+import os
+import uuid
+import shutil
+import logging
+import polars as pl
+import pyarrow as pa
+
+from utils.instrumentation import span
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_download_service')
+
+# Formats a result CSV can be downloaded in: file suffix of the variant and its mimetype.
+# The plain CSV is served as written by format_output and compressed variants are
+# derived from it; TYPED_FORMATS are written from the typed results Parquet instead.
+DOWNLOAD_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'csv.zst': ('.csv.zst', 'application/zstd'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file')
+}
+
+# Variants written from the results Parquet stored with the CSV, keeping its column types
+TYPED_FORMATS = ('parquet', 'arrow')
+
+# Bytes copied at a time when compressing a CSV
+_COPY_BLOCK_SIZE = 1024 * 1024
+
+# Directory under the output folder holding derived variants
+VARIANTS_DIR = 'variants'
+
+
+def variant_path(output_folder, filename, output_format):
+    """Where the variant of an output CSV in a given format is kept"""
+    if output_format == 'csv':
+        return os.path.join(output_folder, filename)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(output_folder, VARIANTS_DIR, stem + DOWNLOAD_FORMATS[output_format][0])
+
+
+def _write_variant(source_path, path, output_format):
+    """Write one variant from its source file, streaming so memory stays bounded"""
+    if output_format in ('csv.gz', 'csv.zst'):
+        codec = 'gzip' if output_format == 'csv.gz' else 'zstd'
+        with open(source_path, 'rb') as source, pa.CompressedOutputStream(path, codec) as target:
+            shutil.copyfileobj(source, target, _COPY_BLOCK_SIZE)
+        return
+    lf = pl.scan_parquet(source_path)
+    if output_format == 'parquet':
+        lf.sink_parquet(path, compression='zstd')
+    else:
+        lf.sink_ipc(path, compression='zstd')
+
+
+def ensure_variant(output_folder, filename, output_format, results_path=None):
+    """
+    Return the path of an output CSV in the requested format, producing it on first use.
+
+    Compressed CSVs are derived from the CSV. Parquet and Arrow variants are
+    written from the results Parquet stored alongside it, so they keep the
+    result's column names and types without re-parsing text. Variants are
+    written once and reused until their source is rewritten. Each is
+    written to a temporary file and moved into place, so concurrent
+    requests never see a partial file.
+
+    Args:
+        output_folder (str): Folder holding the output CSVs
+        filename (str): Output CSV name, already checked to be inside the folder
+        output_format (str): One of DOWNLOAD_FORMATS
+        results_path (str, optional): Results Parquet the CSV was formatted
+            from; required for TYPED_FORMATS
+
+    Returns:
+        str: Path to the file to send, or None if the CSV (or, for
+            TYPED_FORMATS, its results Parquet) does not exist
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if output_format not in DOWNLOAD_FORMATS:
+        raise ValueError(f"Unknown format '{output_format}', expected one of {list(DOWNLOAD_FORMATS)}")
+    csv_path = os.path.join(output_folder, filename)
+    if not os.path.isfile(csv_path):
+        return None
+    path = variant_path(output_folder, filename, output_format)
+    if path == csv_path:
+        return path
+    if output_format in TYPED_FORMATS:
+        if results_path is None or not os.path.isfile(results_path):
+            return None
+        source_path = results_path
+    else:
+        source_path = csv_path
+
+    try:
+        if os.stat(path).st_mtime_ns >= os.stat(source_path).st_mtime_ns:
+            return path
+    except OSError:
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with span('download_variant', bytes_read=os.path.getsize(source_path)):
+            _write_variant(source_path, tmp_path, output_format)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info("Wrote %s variant of %s (%s bytes)", output_format, filename, os.path.getsize(path))
+    return path
+
+
+def remove_variants(output_folder, filename):
+    """Delete every derived variant of an output CSV"""
+    for output_format in DOWNLOAD_FORMATS:
+        if output_format == 'csv':
+            continue
+        try:
+            os.remove(variant_path(output_folder, filename, output_format))
+        except OSError:
+            pass
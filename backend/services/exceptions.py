@@ -0,0 +1,3 @@
+class JobCancelledError(Exception):
+    """Raised inside a running job when a cancellation has been requested"""
+    pass
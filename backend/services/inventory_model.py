@@ -0,0 +1,153 @@
+import numpy as np
+import polars as pl
+
+# Share of daily demand taken as its standard deviation when none is measured
+FALLBACK_STD_DEV_RATIO = 0.2
+
+DAYS_PER_YEAR = 365
+
+# Range of the Int32 columns the whole-unit quantities are stored in
+_INT32_MIN, _INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+
+class PolarsOps:
+    """Model operations on Polars expressions, used by the optimization query"""
+
+    @staticmethod
+    def sqrt(values):
+        return values.sqrt()
+
+    @staticmethod
+    def round(values, decimals):
+        return values.round(decimals)
+
+    @staticmethod
+    def to_units(values):
+        # A zero unit cost makes EOQ infinite; non-strict casts turn such values into nulls
+        return values.round(0).cast(pl.Int32, strict=False)
+
+    @staticmethod
+    def clip_negative(values):
+        return values.clip_min(0)
+
+    @staticmethod
+    def zero_undefined(ratio, numerator):
+        # Nulls propagate as nulls, so only 0/0 produces NaN
+        return ratio.fill_nan(0)
+
+    @staticmethod
+    def coalesce(measured, fallback):
+        # Whole-number columns are read as integers; coalesce needs matching types
+        return pl.coalesce([measured.cast(pl.Float64), fallback])
+
+
+class NumpyOps:
+    """
+    Model operations on float64 arrays, used by the scenario sweep.
+
+    NaN stands in for null. Every operation returns exactly what the
+    Polars operation returns, NaN where Polars returns null.
+    """
+
+    @staticmethod
+    def sqrt(values):
+        return np.sqrt(values)
+
+    @staticmethod
+    def round(values, decimals):
+        # Half away from zero, like Polars' round. The fraction left by
+        # trunc is exact, so halves are found without a rounding error.
+        scale = 10.0 ** decimals
+        scaled = values * scale
+        rounded = np.trunc(scaled)
+        rounded += np.where(np.abs(scaled - rounded) >= 0.5, np.sign(scaled), 0)
+        return rounded / scale
+
+    @staticmethod
+    def to_units(values):
+        # Values the non-strict Int32 cast would null, infinite or out of range, become NaN
+        rounded = NumpyOps.round(values, 0)
+        return np.where(np.isfinite(rounded) & (rounded >= _INT32_MIN) & (rounded <= _INT32_MAX),
+                        rounded, np.nan)
+
+    @staticmethod
+    def clip_negative(values):
+        return np.maximum(values, 0)
+
+    @staticmethod
+    def zero_undefined(ratio, numerator):
+        # NaN from a missing numerator is a null and stays one
+        return np.where(np.isnan(ratio) & ~np.isnan(numerator), 0, ratio)
+
+    @staticmethod
+    def coalesce(measured, fallback):
+        return np.where(np.isnan(measured), fallback, measured)
+
+
+def demand_std_dev(ops, daily_demand, measured=None):
+    """
+    Standard deviation of daily demand used for safety stock.
+
+    It is measured from sales history when available and otherwise
+    approximated as FALLBACK_STD_DEV_RATIO of daily demand.
+
+    Args:
+        ops: PolarsOps or NumpyOps
+        daily_demand: Daily demand
+        measured (optional): Measured standard deviation, null where unknown
+
+    Returns:
+        Standard deviation of daily demand
+    """
+    estimate = daily_demand * FALLBACK_STD_DEV_RATIO
+    if measured is None:
+        return estimate
+    return ops.coalesce(measured, estimate)
+
+
+def inventory_model(ops, daily_demand, unit_cost, lead_time_days, current_stock, std_dev,
+                    ordering_cost, holding_cost_pct, safety_factor):
+    """
+    The EOQ and safety-stock model, written once for Polars and NumPy.
+
+    Inputs are Polars expressions or NumPy arrays, matching ``ops``.
+    Parameters are numbers, or for NumPy arrays that broadcast against the
+    inputs, so the scenario sweep evaluates many parameter sets at once.
+
+    Args:
+        ops: PolarsOps or NumpyOps
+        daily_demand, unit_cost, lead_time_days, current_stock: Model inputs
+        std_dev: Standard deviation of daily demand, see demand_std_dev
+        ordering_cost (float): Fixed cost to place an order
+        holding_cost_pct (float): Annual holding cost as a fraction of unit cost
+        safety_factor (float): Service level Z value
+
+    Returns:
+        dict: economic_order_qty, optimal_stock, reorder_point, cost_savings
+            and stock_reduction_pct
+    """
+    annual_holding_cost = unit_cost * holding_cost_pct
+
+    # Economic Order Quantity: sqrt(2 * annual demand * ordering cost / holding cost)
+    eoq = ops.sqrt((2 * daily_demand * DAYS_PER_YEAR * ordering_cost) / annual_holding_cost)
+
+    # Safety stock = Z * σ * √L
+    safety_stock = safety_factor * std_dev * ops.sqrt(lead_time_days)
+
+    optimal_stock = ops.to_units(eoq + safety_stock)
+    reorder_point = ops.to_units(daily_demand * lead_time_days + safety_stock)
+
+    # Only report positive savings and reductions (cases where we reduce inventory)
+    excess_stock = current_stock - optimal_stock
+    cost_savings = ops.clip_negative(excess_stock * annual_holding_cost)
+    # 0/0 reductions (no stock, nothing needed) count as no reduction
+    stock_reduction_pct = ops.zero_undefined(ops.clip_negative(100 * excess_stock / current_stock),
+                                             excess_stock)
+
+    return {
+        "economic_order_qty": ops.to_units(eoq),
+        "optimal_stock": optimal_stock,
+        "reorder_point": reorder_point,
+        "cost_savings": ops.round(cost_savings, 2),
+        "stock_reduction_pct": ops.round(stock_reduction_pct, 2)
+    }
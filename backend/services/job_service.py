@@ -0,0 +1,348 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import logging
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from services.exceptions import JobCancelledError
+from utils.serving import init_pool_process, pool_environment, threads_per_worker
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_jobs')
+
+# Progress reported for each stage of a job, in the order they run
+JOB_STAGES = {
+    'queued': 0.0,
+    'combining': 0.1,
+    'computing': 0.4,
+    'finalizing': 0.7,
+    'writing': 0.85,
+    'completed': 1.0
+}
+
+FINISHED_STATES = {'completed', 'failed', 'cancelled'}
+
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Formatted CSVs written by jobs, see job_output_filename
+_OUTPUT_FILE_PATTERN = re.compile(r'^optimization_results_([0-9a-f]{32})\.csv$')
+
+def _write_json(path, payload):
+    """Atomically replace a JSON file so readers never see a partial write"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, default=str)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def _update_status(job_dir, **fields):
+    status_path = os.path.join(job_dir, 'status.json')
+    status = _read_json(status_path)
+    status.update(fields)
+    _write_json(status_path, status)
+    return status
+
+def job_output_filename(job_id):
+    """Name of the formatted CSV a job writes to the output folder"""
+    return f"optimization_results_{job_id}.csv"
+
+def _run_job(job_dir, file_paths, output_folder, combine='concat', params=None,
+             demand_stats_path=None):
+    """
+    Execute an optimization job inside a pool worker process.
+
+    Progress and results are written to the job directory so any web worker
+    can serve status and result requests for the job.
+
+    Args:
+        job_dir (str): Directory holding the job's status and result files
+        file_paths (list): Parquet files to optimize
+        output_folder (str): Folder where the formatted CSV output is written
+        combine (str): How multiple files are combined, 'concat' or 'join'
+        params (dict, optional): Optimization model parameters
+        demand_stats_path (str, optional): Demand statistics from sales history
+    """
+    # Imported here so the web process does not pay for them until a job runs
+    from services.optimization_service import optimize_inventory, summarize_results
+    from utils.data_processor import format_output
+
+    cancel_flag = os.path.join(job_dir, 'cancel')
+    job_id = os.path.basename(job_dir)
+
+    def report_progress(stage):
+        if os.path.exists(cancel_flag):
+            raise JobCancelledError(f"Job {job_id} was cancelled")
+        _update_status(job_dir, status='running', stage=stage, progress=JOB_STAGES[stage])
+
+    try:
+        report_progress('combining')
+        _update_status(job_dir, started_at=datetime.now().isoformat())
+
+        results = optimize_inventory(file_paths, progress_callback=report_progress,
+                                     combine=combine, params=params,
+                                     demand_stats_path=demand_stats_path)
+
+        report_progress('writing')
+        output_filename = job_output_filename(job_id)
+        format_output(results, os.path.join(output_folder, output_filename))
+        results.write_parquet(os.path.join(job_dir, 'results.parquet'))
+
+        summary = summarize_results(results)
+        _write_json(os.path.join(job_dir, 'result.json'), {
+            "summary": summary,
+            "output_file": output_filename,
+            "rows": len(results)
+        })
+        _update_status(job_dir, status='completed', stage='completed', progress=1.0,
+                       finished_at=datetime.now().isoformat())
+        logger.info("Job %s completed with %s rows", job_id, len(results))
+    except JobCancelledError:
+        logger.info("Job %s cancelled", job_id)
+        _update_status(job_dir, status='cancelled', finished_at=datetime.now().isoformat())
+    except Exception as e:
+        logger.error("Job %s failed: %s", job_id, e, exc_info=True)
+        _update_status(job_dir, status='failed', error=str(e),
+                       finished_at=datetime.now().isoformat())
+
+class JobManager:
+    """
+    Runs optimization jobs in a bounded process pool.
+
+    Job state lives on disk under ``jobs_folder/<job_id>`` so that status,
+    result and cancel requests work from any web worker, not only the one that
+    submitted the job.
+    """
+
+    def __init__(self, jobs_folder, output_folder, max_workers=2, threads=None, result_cache=None):
+        self.jobs_folder = jobs_folder
+        self.output_folder = output_folder
+        self.result_cache = result_cache
+        self.max_workers = max_workers
+        self.threads = threads
+        self._executor = None
+        self._futures = {}
+        os.makedirs(jobs_folder, exist_ok=True)
+
+    def _get_executor(self):
+        # Created lazily so importing the app does not spawn worker processes.
+        # Polars' thread pool is not fork-safe, so workers are spawned.
+        if self._executor is None:
+            logger.info("Starting job pool with %s workers of %s threads", self.max_workers, self.threads)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_pool_process,
+                initargs=(self.threads,)
+            )
+        return self._executor
+
+    def _job_dir(self, job_id):
+        if not _JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        job_dir = os.path.join(self.jobs_folder, job_id)
+        return job_dir if os.path.isdir(job_dir) else None
+
+    def submit(self, file_paths, combine='concat', params=None, demand_stats_path=None,
+               cache_key=None):
+        """
+        Queue an optimization job.
+
+        Args:
+            file_paths (list): Parquet files to optimize
+            combine (str): How multiple files are combined, 'concat' or 'join'
+            params (dict, optional): Optimization model parameters
+            demand_stats_path (str, optional): Demand statistics from sales history
+            cache_key (str, optional): Result cache key the results are stored under
+
+        Returns:
+            dict: Initial job status
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.jobs_folder, job_id)
+        os.makedirs(job_dir)
+
+        status = {
+            "job_id": job_id,
+            "status": "queued",
+            "stage": "queued",
+            "progress": 0.0,
+            "files": file_paths,
+            "combine": combine,
+            "parameters": params,
+            "demand_stats_path": demand_stats_path,
+            "cache_key": cache_key,
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None
+        }
+        _write_json(os.path.join(job_dir, 'status.json'), status)
+
+        executor = self._get_executor()
+        try:
+            with pool_environment(self.threads):
+                future = executor.submit(_run_job, job_dir, file_paths, self.output_folder,
+                                         combine, params, demand_stats_path)
+        except Exception as e:
+            # A worker died and took the pool with it; start a fresh one for the next job
+            if isinstance(e, BrokenProcessPool):
+                self._executor = None
+            _update_status(job_dir, status='failed', error=str(e),
+                           finished_at=datetime.now().isoformat())
+            raise
+        self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._job_done(job_id, job_dir, executor, f))
+        logger.info("Submitted job %s for %s files", job_id, len(file_paths))
+        return status
+
+    def _job_done(self, job_id, job_dir, executor, future):
+        """
+        Forget a finished job's future and record failures the job could not.
+
+        A worker that dies (or a job that raises before reaching its own error
+        handling) leaves the status unfinished, so it is marked failed here. A
+        dead worker breaks the whole pool, which is then replaced on the next
+        submit.
+        """
+        self._futures.pop(job_id, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            self._cache_result(job_id, job_dir)
+            return
+
+        if isinstance(error, BrokenProcessPool) and self._executor is executor:
+            logger.error("Job pool broke while running job %s; it will be restarted", job_id)
+            self._executor = None
+        try:
+            status = _read_json(os.path.join(job_dir, 'status.json'))
+            if status['status'] not in FINISHED_STATES:
+                logger.error("Job %s failed: %s", job_id, error)
+                _update_status(job_dir, status='failed', error=str(error) or type(error).__name__,
+                               finished_at=datetime.now().isoformat())
+        except (OSError, ValueError) as e:
+            logger.error("Could not record the failure of job %s: %s", job_id, e)
+
+    def _cache_result(self, job_id, job_dir):
+        """
+        Store a completed job's results in the result cache.
+
+        The job's CSV is linked (or copied) to the cache's output name, so a
+        later synchronous or asynchronous request with the same inputs is a
+        cache hit, and evicting the entry leaves the job's own files alone.
+        """
+        if self.result_cache is None:
+            return
+        try:
+            status = _read_json(os.path.join(job_dir, 'status.json'))
+            cache_key = status.get('cache_key')
+            if status['status'] != 'completed' or not cache_key:
+                return
+
+            # Imported here so the web process does not pay for Polars until a job completes
+            import polars as pl
+
+            result = _read_json(os.path.join(job_dir, 'result.json'))
+            job_csv = os.path.join(self.output_folder, result['output_file'])
+            cache_csv = os.path.join(self.output_folder, self.result_cache.output_filename(cache_key))
+            tmp_path = f"{cache_csv}.{os.getpid()}.tmp"
+            try:
+                os.link(job_csv, tmp_path)
+            except OSError:
+                shutil.copyfile(job_csv, tmp_path)
+            os.replace(tmp_path, cache_csv)
+
+            results = pl.read_parquet(os.path.join(job_dir, 'results.parquet'))
+            self.result_cache.put(cache_key, results, result['summary'])
+            logger.info("Stored results of job %s in the result cache", job_id)
+        except Exception as e:
+            # Caching is an optimization; the job's own results are unaffected
+            logger.error("Could not cache the results of job %s: %s", job_id, e)
+
+    def get_status(self, job_id):
+        """Return the status dict for a job, or None if the job is unknown"""
+        job_dir = self._job_dir(job_id)
+        if job_dir is None:
+            return None
+        return _read_json(os.path.join(job_dir, 'status.json'))
+
+    def get_result(self, job_id):
+        """
+        Return the stored result of a completed job.
+
+        Returns:
+            dict: Result payload, or None if the job is unknown or not completed
+        """
+        status = self.get_status(job_id)
+        if status is None or status['status'] != 'completed':
+            return None
+        job_dir = self._job_dir(job_id)
+        result = _read_json(os.path.join(job_dir, 'result.json'))
+        result['results_path'] = os.path.join(job_dir, 'results.parquet')
+        return result
+
+    def output_results_path(self, output_file):
+        """
+        Find the results Parquet of the job that wrote a formatted CSV.
+
+        Returns:
+            str: Path to the results Parquet, or None if no job wrote the CSV
+        """
+        match = _OUTPUT_FILE_PATTERN.match(output_file or '')
+        job_dir = self._job_dir(match.group(1)) if match else None
+        if job_dir is None:
+            return None
+        path = os.path.join(job_dir, 'results.parquet')
+        return path if os.path.exists(path) else None
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job.
+
+        Queued jobs are removed from the pool immediately; running jobs stop at
+        the next stage boundary.
+
+        Returns:
+            dict: Updated job status, or None if the job is unknown
+        """
+        status = self.get_status(job_id)
+        if status is None or status['status'] in FINISHED_STATES:
+            return status
+
+        job_dir = self._job_dir(job_id)
+        open(os.path.join(job_dir, 'cancel'), 'w').close()
+
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            logger.info("Cancelled queued job %s", job_id)
+            return _update_status(job_dir, status='cancelled',
+                                  finished_at=datetime.now().isoformat())
+
+        logger.info("Cancellation requested for job %s", job_id)
+        return status
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+def init_job_manager(app):
+    """Create the job manager for the app and register it as an extension"""
+    manager = JobManager(
+        app.config['JOBS_FOLDER'],
+        app.config['OUTPUT_FOLDER'],
+        max_workers=app.config['JOB_WORKERS'],
+        threads=threads_per_worker(app.config['JOB_WORKERS'], app.config['THREAD_BUDGET']),
+        result_cache=app.extensions.get('result_cache')
+    )
+    app.extensions['job_manager'] = manager
+    return manager
@@ -1,164 +1,277 @@
 import polars as pl
-import numpy as np
 import logging
+from functools import lru_cache
 from datetime import datetime
-from utils.data_processor import combine_dataframes
+from utils.dataset_loader import scan_dataset
+from services.exceptions import JobCancelledError
+from services.inventory_model import PolarsOps, inventory_model, demand_std_dev
+from utils.instrumentation import span, file_sizes
 
 # Configure logging
 logger = logging.getLogger('inventory_optimizer_optimization')
 
-def optimize_inventory(file_paths):
+# Columns the optimization model reads from the input data
+REQUIRED_COLUMNS = ['product_id', 'name', 'current_stock', 'unit_cost', 'lead_time_days', 'daily_demand']
+
+# Columns the model uses when present, such as a measured demand standard deviation
+OPTIONAL_COLUMNS = ['demand_std_dev']
+
+# Columns returned by the optimization, in output order
+OUTPUT_COLUMNS = [
+    'product_id', 'name', 'current_stock', 'optimal_stock',
+    'reorder_point', 'economic_order_qty', 'cost_savings', 'stock_reduction_pct'
+]
+
+# Model parameters used when a request does not override them
+DEFAULT_PARAMETERS = {
+    'ordering_cost': 25.0,      # Fixed cost to place an order
+    'holding_cost_pct': 0.25,   # Annual holding cost as percentage of item value
+    'safety_factor': 1.96       # Z value, 1.96 gives a ~95% service level
+}
+
+def resolve_parameters(overrides=None):
+    """
+    Merge request parameters with the defaults and validate them.
+
+    Args:
+        overrides (dict, optional): Parameter values supplied by the caller
+
+    Returns:
+        dict: Complete set of model parameters as floats
+
+    Raises:
+        ValueError: If an unknown or non-positive parameter is supplied
+    """
+    params = dict(DEFAULT_PARAMETERS)
+    for name, value in (overrides or {}).items():
+        if name not in DEFAULT_PARAMETERS:
+            raise ValueError(f"Unknown optimization parameter '{name}'")
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Optimization parameter '{name}' must be a number")
+        if value <= 0:
+            raise ValueError(f"Optimization parameter '{name}' must be positive")
+        params[name] = value
+    return params
+
+@lru_cache(maxsize=64)
+def build_optimization_exprs(ordering_cost, holding_cost_pct, safety_factor, measured_std_dev=False):
+    """
+    Build the expression graph for the whole optimization model.
+
+    Every output column is expressed directly in terms of the input columns,
+    so the model runs as a single projection with no intermediate frames.
+    The formulas are shared with the scenario sweep, see inventory_model.
+    Expression graphs are cached per parameter set and reused across requests.
+
+    Args:
+        ordering_cost (float): Fixed cost to place an order
+        holding_cost_pct (float): Annual holding cost as a fraction of unit cost
+        safety_factor (float): Service level Z value
+        measured_std_dev (bool): Input has a demand_std_dev column, e.g. from
+            sales history; rows where it is null fall back to the estimate
+
+    Returns:
+        tuple: Expressions producing OUTPUT_COLUMNS
+    """
+    demand = pl.col('daily_demand')
+    measured = pl.col('demand_std_dev') if measured_std_dev else None
+    outputs = inventory_model(PolarsOps, demand, pl.col('unit_cost'), pl.col('lead_time_days'),
+                              pl.col('current_stock'), demand_std_dev(PolarsOps, demand, measured),
+                              ordering_cost, holding_cost_pct, safety_factor)
+
+    return (
+        pl.col('product_id'),
+        pl.col('name'),
+        pl.col('current_stock'),
+        *(outputs[name].alias(name) for name in OUTPUT_COLUMNS[3:])
+    )
+
+def build_optimization_plan(lf, params=None, partition_by=None):
+    """
+    Attach the optimization model to a LazyFrame of inventory data.
+
+    Args:
+        lf (pl.LazyFrame): Input data containing REQUIRED_COLUMNS
+        params (dict, optional): Model parameters, see DEFAULT_PARAMETERS
+        partition_by (str, optional): Partition key column, such as
+            location_id, carried through as the first output column
+
+    Returns:
+        pl.LazyFrame: Lazy optimization results with OUTPUT_COLUMNS
+    """
+    params = resolve_parameters(params)
+    exprs = build_optimization_exprs(params['ordering_cost'], params['holding_cost_pct'],
+                                     params['safety_factor'], 'demand_std_dev' in lf.columns)
+    if partition_by:
+        exprs = (pl.col(partition_by),) + exprs
+    return lf.select(exprs)
+
+def apply_demand_stats(lf, demand_stats_path, partition_by=None):
+    """
+    Replace estimated demand with statistics measured from sales history.
+
+    SKUs with history take their daily_demand and demand_std_dev from the
+    statistics file; SKUs without history keep the values from the upload.
+
+    Args:
+        lf (pl.LazyFrame): Inventory data
+        demand_stats_path (str): Parquet file produced by the demand service
+        partition_by (str, optional): Partition key; when the statistics
+            file and the inventory both have this column, demand is matched
+            per partition and SKU
+
+    Returns:
+        pl.LazyFrame: Inventory data with history-based demand columns
+    """
+    stats = pl.scan_parquet(demand_stats_path)
+    keys = ['product_id']
+    if partition_by and partition_by in stats.columns and partition_by in lf.columns:
+        keys.append(partition_by)
+    stats = stats.select([pl.col(key).cast(pl.Utf8) for key in keys] + [
+        pl.col('daily_demand').alias('history_daily_demand'),
+        pl.col('demand_std_dev').alias('history_demand_std_dev')
+    ])
+    for col in ['daily_demand', 'demand_std_dev']:
+        if col not in lf.columns:
+            lf = lf.with_columns(pl.lit(None, dtype=pl.Float64).alias(col))
+    return (lf.with_columns([pl.col(key).cast(pl.Utf8) for key in keys])
+            .join(stats, on=keys, how='left')
+            .with_columns([
+                pl.coalesce([pl.col('history_daily_demand'),
+                             pl.col('daily_demand').cast(pl.Float64)]).alias('daily_demand'),
+                pl.coalesce([pl.col('history_demand_std_dev'),
+                             pl.col('demand_std_dev').cast(pl.Float64)]).alias('demand_std_dev')
+            ])
+            .drop(['history_daily_demand', 'history_demand_std_dev']))
+
+def _dummy_inventory():
+    """Sample inventory used for demonstration when uploads lack the required columns"""
+    return pl.DataFrame({
+        'product_id': ['A001', 'A002', 'A003', 'B001', 'B002'],
+        'name': ['Product A', 'Product B', 'Product C', 'Product D', 'Product E'],
+        'current_stock': [150, 300, 75, 120, 200],
+        'unit_cost': [20.50, 15.75, 35.20, 12.30, 8.45],
+        'lead_time_days': [5, 7, 3, 10, 4],
+        'daily_demand': [12, 25, 8, 15, 30]
+    }).lazy()
+
+def load_inventory(file_paths, combine='concat', demand_stats_path=None, partition_by=None):
+    """
+    Lazily load the model inputs from the uploaded files.
+
+    Args:
+        file_paths (list): List of paths to parquet files containing inventory data
+        combine (str): How multiple files are combined, 'concat' or 'join' on product_id
+        demand_stats_path (str, optional): Per-SKU demand statistics from sales history
+        partition_by (str, optional): Partition key column to load as well
+
+    Returns:
+        pl.LazyFrame: REQUIRED_COLUMNS plus any OPTIONAL_COLUMNS present, or the
+            sample inventory if the uploads lack required columns
+
+    Raises:
+        ValueError: If a partition key is given and the files lack it or
+            required columns; partitioned runs never use the sample inventory
+    """
+    # Scan all files lazily, reading only the columns the model needs
+    logger.info("Scanning input files (mode: %s)", combine)
+    columns = REQUIRED_COLUMNS + OPTIONAL_COLUMNS + ([partition_by] if partition_by else [])
+    lf = scan_dataset(file_paths, how=combine, columns=columns)
+    if demand_stats_path:
+        logger.info("Using demand statistics from %s", demand_stats_path)
+        lf = apply_demand_stats(lf, demand_stats_path, partition_by)
+
+    # Column check only needs the file schemas, not the data
+    has_required_columns = all(col in lf.columns for col in REQUIRED_COLUMNS)
+    logger.info("Has all required columns: %s", has_required_columns)
+    if partition_by:
+        missing = [col for col in REQUIRED_COLUMNS + [partition_by] if col not in lf.columns]
+        if missing:
+            raise ValueError(f"Input files are missing columns needed for a partitioned run: {missing}")
+
+    if not has_required_columns:
+        logger.warning("Using dummy data for demonstration as required columns are missing")
+        if logger.isEnabledFor(logging.DEBUG):
+            # Resolving the schema of a lazy frame is not free, so only do it when it is logged
+            logger.debug("Expected columns: %s, Got columns: %s", REQUIRED_COLUMNS, lf.columns)
+        return _dummy_inventory()
+    return lf
+
+def optimize_inventory(file_paths, progress_callback=None, combine='concat', params=None,
+                       demand_stats_path=None, partition_by=None):
     """
     Apply inventory optimization algorithms to the data.
-    
+
+    The scan, the model and the output projection form one lazy query that is
+    collected once with the streaming engine.
+
     Args:
         file_paths (list): List of paths to parquet files containing inventory data
-        
+        progress_callback (callable, optional): Called with the name of each
+            pipeline stage as it starts ('combining', 'computing', 'finalizing')
+        combine (str): How multiple files are combined, 'concat' or 'join' on product_id
+        params (dict, optional): Overrides for ordering_cost, holding_cost_pct
+            and safety_factor
+        demand_stats_path (str, optional): Per-SKU demand statistics from sales
+            history, used instead of the uploaded daily_demand
+        partition_by (str, optional): Partition key column, such as
+            location_id; results keep it so they can be rolled up per partition
+
     Returns:
         pl.DataFrame: Optimization results
     """
-    logger.info(f"Starting inventory optimization with {len(file_paths)} files")
+    logger.info("Starting inventory optimization with %s files", len(file_paths))
     try:
-        # Combine data from all files (in a real app, would handle joins/merges properly)
-        logger.info("Combining dataframes from multiple files")
-        df = combine_dataframes(file_paths)
-        logger.info(f"Combined dataframe shape: {df.shape}")
-        
-        # This is a simplified version of an inventory optimization algorithm
-        # In a real application, you would implement a more sophisticated model
-        
-        # Check if required columns exist, else use dummy data
-        required_columns = ['product_id', 'name', 'current_stock', 'unit_cost', 'lead_time_days', 'daily_demand']
-        
-        has_required_columns = all(col in df.columns for col in required_columns)
-        logger.info(f"Has all required columns: {has_required_columns}")
-        
-        if not has_required_columns:
-            # Create dummy data for demonstration
-            logger.warning("Using dummy data for demonstration as required columns are missing")
-            logger.debug(f"Expected columns: {required_columns}, Got columns: {df.columns}")
-            logger.info("Creating dummy dataframe")
-            df = pl.DataFrame({
-                'product_id': ['A001', 'A002', 'A003', 'B001', 'B002'],
-                'name': ['Product A', 'Product B', 'Product C', 'Product D', 'Product E'],
-                'current_stock': [150, 300, 75, 120, 200],
-                'unit_cost': [20.50, 15.75, 35.20, 12.30, 8.45],
-                'lead_time_days': [5, 7, 3, 10, 4],
-                'daily_demand': [12, 25, 8, 15, 30]
-            })
-            logger.debug(f"Created dummy dataframe with shape: {df.shape}")
-        
-        # Calculate optimal stock levels using EOQ (Economic Order Quantity) formula
-        # For simplicity, we'll use fixed values for ordering cost and holding cost
-        ordering_cost = 25  # Fixed cost to place an order
-        holding_cost_pct = 0.25  # Annual holding cost as percentage of item value
-        
-        logger.info("Calculating EOQ parameters")
-        logger.debug(f"Ordering cost: {ordering_cost}, Holding cost percentage: {holding_cost_pct}")
-        
-        # Calculate safety stock (simplified)
-        # Safety stock = Z * σ * √L
-        # Z = safety factor (using 1.96 for ~95% service level)
-        # σ = standard deviation of daily demand
-        # L = lead time in days
-        
-        # For simplicity, we'll use a fixed percentage of lead time demand
-        safety_factor = 1.96
-        logger.debug(f"Safety factor: {safety_factor}")
-        
-        # Add a small random variation to daily demand for demonstration
-        np.random.seed(42)  # For reproducibility
-        logger.debug("Set random seed to 42 for reproducibility")
-        
-        # Calculate EOQ and related metrics
-        # Create expressions for calculations
-        logger.info("Creating expressions for EOQ calculations")
-        eoq_expr = ((2 * pl.col('daily_demand') * 365 * ordering_cost) / 
-                  (pl.col('unit_cost') * holding_cost_pct)).sqrt().alias('economic_order_qty')
-        std_dev_expr = (pl.col('daily_demand') * 0.2).alias('demand_std_dev')
-        days_supply_expr = (pl.col('current_stock') / pl.col('daily_demand')).alias('days_of_supply')
-        
-        # Apply expressions to create new columns
-        logger.info("Calculating EOQ, demand standard deviation, and days of supply")
-        results = df.with_columns([
-            eoq_expr,
-            std_dev_expr,
-            days_supply_expr
-        ])
-        logger.debug(f"Added EOQ calculations. Result columns: {results.columns}")
-        
-        # Calculate safety stock and reorder point
-        logger.info("Calculating safety stock and optimal stock levels")
-        safety_stock_expr = (safety_factor * pl.col('demand_std_dev') * 
-                            (pl.col('lead_time_days')).sqrt()).alias('safety_stock')
-        optimal_stock_expr = (pl.col('economic_order_qty') + 
-                             (safety_factor * pl.col('demand_std_dev') * 
-                              (pl.col('lead_time_days')).sqrt())).round(0).alias('optimal_stock')
-        
-        results = results.with_columns([
-            safety_stock_expr,
-            optimal_stock_expr
-        ])
-        logger.debug("Added safety stock and optimal stock calculations")
-        
-        # Calculate reorder point and other metrics
-        logger.info("Calculating reorder points, cost savings, and stock reduction percentages")
-        reorder_point_expr = (pl.col('daily_demand') * pl.col('lead_time_days') + 
-                             pl.col('safety_stock')).round(0).alias('reorder_point')
-        cost_savings_expr = ((pl.col('current_stock') - pl.col('optimal_stock')) * 
-                            pl.col('unit_cost') * holding_cost_pct).alias('cost_savings')
-        stock_reduction_expr = (100 * (pl.col('current_stock') - pl.col('optimal_stock')) / 
-                               pl.col('current_stock')).alias('stock_reduction_pct')
-        
-        results = results.with_columns([
-            reorder_point_expr,
-            cost_savings_expr,
-            stock_reduction_expr
-        ])
-        logger.debug("Added reorder point, cost savings and stock reduction calculations")
-        
-        # Only keep positive cost savings (cases where we reduce inventory)
-        logger.info("Filtering to ensure positive cost savings")
-        results = results.with_columns(
-            pl.when(pl.col('cost_savings') < 0).then(0).otherwise(pl.col('cost_savings')).alias('cost_savings')
-        )
-        
-        # Only keep positive stock reduction (cases where we reduce inventory)
-        logger.info("Filtering to ensure positive stock reduction")
-        results = results.with_columns(
-            pl.when(pl.col('stock_reduction_pct') < 0).then(0).otherwise(pl.col('stock_reduction_pct')).alias('stock_reduction_pct')
-        )
-        
-        # Round numeric columns for better readability
-        logger.info("Rounding numeric values to appropriate precision")
-        for col in ['optimal_stock', 'reorder_point', 'economic_order_qty', 'safety_stock']:
-            logger.debug(f"Rounding column {col} to integers")
-            results = results.with_columns(pl.col(col).round(0).cast(pl.Int32))
-            
-        for col in ['cost_savings', 'stock_reduction_pct']:
-            logger.debug(f"Rounding column {col} to 2 decimal places")
-            results = results.with_columns(pl.col(col).round(2))
-        
-        # Select and reorder columns for output
-        output_columns = [
-            'product_id', 'name', 'current_stock', 'optimal_stock', 
-            'reorder_point', 'economic_order_qty', 'cost_savings', 'stock_reduction_pct'
-        ]
-        
-        logger.info(f"Selecting output columns: {output_columns}")
-        final_results = results.select(output_columns)
-        
+        if progress_callback:
+            progress_callback('combining')
+
+        lf = load_inventory(file_paths, combine, demand_stats_path, partition_by)
+
+        if progress_callback:
+            progress_callback('computing')
+
+        plan = build_optimization_plan(lf, params, partition_by)
+        logger.info("Executing optimization plan")
+        # Scanning, combining and the model run fused, so they are timed as one stage
+        with span('optimize', bytes_read=file_sizes(file_paths)) as stage:
+            final_results = plan.collect(streaming=True)
+            stage.rows = len(final_results)
+
+        if progress_callback:
+            progress_callback('finalizing')
+
         # Log some summary statistics
         try:
             total_savings = final_results["cost_savings"].sum()
             avg_reduction = final_results["stock_reduction_pct"].mean()
-            logger.info(f"Optimization complete. Total cost savings: {total_savings:.2f}, Average stock reduction: {avg_reduction:.2f}%")
-            logger.info(f"Final output shape: {final_results.shape}")
+            logger.info("Optimization complete. Total cost savings: %.2f, Average stock reduction: %.2f%%",
+                        total_savings, avg_reduction)
+            logger.info("Final output shape: %s", final_results.shape)
         except Exception as e:
-            logger.warning(f"Could not calculate summary statistics: {str(e)}")
-        
+            logger.warning("Could not calculate summary statistics: %s", e)
+
         return final_results
-    
+
+    except (JobCancelledError, ValueError):
+        raise
     except Exception as e:
-        logger.error(f"Error in optimization process: {str(e)}", exc_info=True)
-        raise Exception(f"Error in optimization process: {str(e)}") 
\ No newline at end of file
+        logger.error("Error in optimization process: %s", e, exc_info=True)
+        raise Exception(f"Error in optimization process: {str(e)}")
+
+def summarize_results(results):
+    """
+    Build the summary statistics reported alongside optimization results.
+
+    Args:
+        results (pl.DataFrame): Dataframe returned by optimize_inventory
+
+    Returns:
+        dict: JSON serializable summary statistics
+    """
+    return {
+        "totalSavings": float(results["cost_savings"].sum()),
+        "averageStockReduction": float(results["stock_reduction_pct"].mean()),
+        "optimizationDate": datetime.now().isoformat()
+    }
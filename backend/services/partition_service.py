@@ -0,0 +1,484 @@
+import os
+import re
+import json
+import glob
+import time
+import shutil
+import hashlib
+import logging
+import multiprocessing
+from datetime import datetime
+from urllib.parse import quote, unquote
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import polars as pl
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from services.optimization_service import REQUIRED_COLUMNS, OPTIONAL_COLUMNS, build_optimization_plan, apply_demand_stats
+from services.result_cache import MODEL_VERSION, file_content_hash
+from utils.dataset_loader import scan_dataset
+from utils.instrumentation import span
+from utils.locking import directory_lock
+from utils.serving import init_pool_process, pool_environment, threads_per_worker
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_partitions')
+
+_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Partition keys are column names as produced by standardize_column_name
+PARTITION_KEY_PATTERN = re.compile(r'^[a-z0-9_]{1,64}$')
+
+# Result sets (one per parameter set) kept per partitioned dataset
+MAX_RESULT_SETS = 8
+
+ROLLUP_LEVELS = ('partition', 'product')
+
+def partitioned_dataset_path(partitions_folder, name):
+    """
+    Return the directory of a named partitioned dataset.
+
+    Raises:
+        ValueError: If the name contains characters other than letters, digits, '-' or '_'
+    """
+    if not _NAME_PATTERN.match(name or ''):
+        raise ValueError(f"Invalid dataset name '{name}'")
+    return os.path.join(partitions_folder, name)
+
+
+def partition_results_path(partitions_folder, result_id):
+    """
+    Find the directory of a partitioned result set by its id.
+
+    Returns:
+        str: Directory holding one result file per partition, or None if the id is unknown
+    """
+    for path in glob.glob(os.path.join(partitions_folder, '*', 'results', result_id)):
+        if os.path.exists(_manifest_path(path)):
+            return path
+    return None
+
+
+def _manifest_path(directory):
+    return os.path.join(directory, 'manifest.json')
+
+
+def _read_manifest(directory, default=None):
+    try:
+        with open(_manifest_path(directory)) as f:
+            return json.load(f)
+    except OSError:
+        return default
+
+
+def _write_manifest(directory, manifest):
+    tmp_path = f"{_manifest_path(directory)}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, _manifest_path(directory))
+
+
+def _partition_dirs(dataset_dir, key):
+    """
+    Map each partition value to its Hive-style directory, e.g. data/location_id=WH-1.
+
+    Names are read back from disk rather than rebuilt, so they always match
+    the escaping Arrow used when writing them.
+    """
+    data_dir = os.path.join(dataset_dir, 'data')
+    prefix = f"{key}="
+    if not os.path.isdir(data_dir):
+        return {}
+    return {unquote(name[len(prefix):]): os.path.join(data_dir, name)
+            for name in os.listdir(data_dir) if name.startswith(prefix)}
+
+
+def _partition_files(partition_dir, version):
+    """Data files of a partition written at the version the manifest records for it"""
+    return sorted(glob.glob(os.path.join(partition_dir, f"v{version}-*.parquet")))
+
+
+def _remove_stale_files(dataset_dir, manifest):
+    """
+    Delete partition files the manifest no longer refers to.
+
+    These are files of replaced versions and leftovers of an ingest that
+    stopped before its manifest was written.
+    """
+    for value, partition_dir in _partition_dirs(dataset_dir, manifest['key']).items():
+        entry = manifest['partitions'].get(value)
+        if entry is None:
+            shutil.rmtree(partition_dir, ignore_errors=True)
+            continue
+        current = f"v{entry['version']}-"
+        for name in os.listdir(partition_dir):
+            if not name.startswith(current):
+                os.remove(os.path.join(partition_dir, name))
+
+
+def _result_file(results_dir, value):
+    return os.path.join(results_dir, f"part-{quote(value, safe='')}.parquet")
+
+
+def ingest_partitioned(source_paths, dataset_dir, key):
+    """
+    Add inventory files to a partitioned dataset, replacing the partitions they contain.
+
+    Rows are written in Hive layout, one directory per key value
+    (``data/location_id=WH-1/``), by streaming each file through Arrow's
+    dataset writer, so memory stays bounded by a record batch. A partition
+    present in the new files is replaced as a whole: a warehouse's fresh
+    export supersedes its previous one, other warehouses are untouched.
+
+    New files are written to a staging directory first and then moved into
+    their partition directories, named after the new dataset version.
+    Readers only take the files of the version the manifest records for a
+    partition, so the manifest write is what swaps a partition to its new
+    data. Files of the replaced versions are removed after that. An ingest
+    that stops midway leaves the dataset as it was.
+
+    Args:
+        source_paths (list): Converted Parquet files with a column named key
+        dataset_dir (str): Directory of the dataset, created on first ingest
+        key (str): Partition key column, fixed when the dataset is created
+
+    Returns:
+        dict: Partitions replaced with their row counts, and the dataset version
+
+    Raises:
+        ValueError: If the key is invalid, differs from the dataset's key, or
+            is missing from a file
+    """
+    if not PARTITION_KEY_PATTERN.match(key or ''):
+        raise ValueError(f"Invalid partition key '{key}'")
+
+    with directory_lock(dataset_dir):
+        manifest = _read_manifest(dataset_dir, default={"key": key, "version": 0, "partitions": {}})
+        if manifest['key'] != key:
+            raise ValueError(f"Dataset is partitioned by '{manifest['key']}', not '{key}'")
+        for path in source_paths:
+            if key not in pl.read_parquet_schema(path):
+                raise ValueError(f"Partition key '{key}' missing from {os.path.basename(path)}")
+        # Leftovers of an interrupted ingest would otherwise share the new version's file names
+        _remove_stale_files(dataset_dir, manifest)
+
+        with span('partition_ingest') as stage:
+            counts = (scan_dataset(source_paths, columns=[key])
+                      .select(pl.col(key).cast(pl.Utf8))
+                      .group_by(key).agg(pl.count().alias('rows'))
+                      .collect())
+            if counts[key].null_count():
+                raise ValueError(f"Partition key '{key}' has empty values")
+            replaced = dict(zip(counts[key].to_list(), counts['rows'].to_list()))
+
+            version = manifest['version'] + 1
+            staging_dir = os.path.join(dataset_dir, f"staging-{version}")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            partitioning = ds.partitioning(pa.schema([(key, pa.string())]), flavor='hive')
+            try:
+                for i, path in enumerate(source_paths):
+                    source = ds.dataset(path)
+                    # Values are written as text so directory names are the same whatever the source type
+                    columns = {name: ds.field(name) for name in source.schema.names}
+                    columns[key] = ds.field(key).cast(pa.string())
+                    ds.write_dataset(source.scanner(columns=columns), os.path.join(staging_dir, 'data'),
+                                     format='parquet', partitioning=partitioning,
+                                     basename_template=f"v{version}-{i}-{{i}}.parquet",
+                                     existing_data_behavior='overwrite_or_ignore')
+
+                for staged_dir in _partition_dirs(staging_dir, key).values():
+                    partition_dir = os.path.join(dataset_dir, 'data', os.path.basename(staged_dir))
+                    os.makedirs(partition_dir, exist_ok=True)
+                    for name in os.listdir(staged_dir):
+                        os.replace(os.path.join(staged_dir, name), os.path.join(partition_dir, name))
+            finally:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+            stage.rows = int(counts['rows'].sum() or 0)
+
+        manifest['version'] = version
+        for value, rows in replaced.items():
+            manifest['partitions'][value] = {"rows": rows, "version": version}
+        _write_manifest(dataset_dir, manifest)
+        _remove_stale_files(dataset_dir, manifest)
+
+    logger.info("Ingested %s partitions into %s at version %s", len(replaced), dataset_dir, version)
+    return {"key": key, "version": version, "partitions_replaced": replaced}
+
+
+def _optimize_partition(files, key, value, output_path, params, demand_stats_path):
+    """
+    Optimize one partition; runs inside a pool worker process.
+
+    Only this partition's files are read, so memory is bounded by the
+    largest partition rather than the whole dataset.
+
+    Returns:
+        dict: Row count and the sums the dataset rollup is built from
+    """
+    start_time = time.perf_counter()
+    lf = scan_dataset(files, columns=REQUIRED_COLUMNS + OPTIONAL_COLUMNS)
+    missing = [col for col in REQUIRED_COLUMNS if col not in lf.columns]
+    if missing:
+        raise ValueError(f"Partition {key}={value} is missing required columns: {missing}")
+    # The key lives in the directory name, not in the files
+    lf = lf.with_columns(pl.lit(value).alias(key))
+    if demand_stats_path:
+        lf = apply_demand_stats(lf, demand_stats_path, key)
+    results = build_optimization_plan(lf, params, key).collect(streaming=True)
+
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    results.write_parquet(tmp_path)
+    os.replace(tmp_path, output_path)
+    return {
+        "rows": len(results),
+        "current_stock": float(results['current_stock'].sum() or 0),
+        "optimal_stock": float(results['optimal_stock'].sum() or 0),
+        "cost_savings": float(results['cost_savings'].sum() or 0),
+        "stock_reduction_sum": float(results['stock_reduction_pct'].sum() or 0),
+        "stock_reduction_count": len(results) - results['stock_reduction_pct'].null_count(),
+        "seconds": round(time.perf_counter() - start_time, 4)
+    }
+
+
+def _result_set_id(dataset_dir, params, demand_stats_path):
+    """Id of the result set for a dataset, parameter set and demand statistics file"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        "model_version": MODEL_VERSION,
+        "partitioned_dataset": os.path.basename(os.path.abspath(dataset_dir)),
+        "params": params,
+        "demand_stats": file_content_hash(demand_stats_path) if demand_stats_path else None
+    }, sort_keys=True).encode())
+    return digest.hexdigest()[:32]
+
+
+def _prune_result_sets(dataset_dir, keep):
+    """Remove the least recently used result sets beyond MAX_RESULT_SETS"""
+    result_dirs = [path for path in glob.glob(os.path.join(dataset_dir, 'results', '*')) if path != keep]
+    result_dirs.sort(key=lambda path: os.path.getmtime(_manifest_path(path))
+                     if os.path.exists(_manifest_path(path)) else 0)
+    for path in result_dirs[:max(0, len(result_dirs) - (MAX_RESULT_SETS - 1))]:
+        logger.info("Removing result set %s", path)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def summarize_partitions(state):
+    """Dataset-wide summary and per-partition rollup from a result set's stored sums"""
+    partitions = state['partitions']
+    total_rows = sum(stats['rows'] for stats in partitions.values())
+    reduction_count = sum(stats['stock_reduction_count'] for stats in partitions.values())
+    return {
+        "total_rows": total_rows,
+        "summary": {
+            "totalSavings": sum(stats['cost_savings'] for stats in partitions.values()),
+            "averageStockReduction": (sum(stats['stock_reduction_sum'] for stats in partitions.values())
+                                      / reduction_count if reduction_count else None),
+            "optimizationDate": datetime.now().isoformat()
+        },
+        "partitions": [
+            {
+                "partition": value,
+                "skus": stats['rows'],
+                "current_stock": stats['current_stock'],
+                "optimal_stock": stats['optimal_stock'],
+                "cost_savings": round(stats['cost_savings'], 2),
+                "average_stock_reduction": (round(stats['stock_reduction_sum'] / stats['stock_reduction_count'], 2)
+                                            if stats['stock_reduction_count'] else None)
+            }
+            for value, stats in sorted(partitions.items())
+        ]
+    }
+
+
+class PartitionOptimizer:
+    """
+    Optimizes the partitions of a dataset independently over a process pool.
+
+    Results are kept per parameter set as one Parquet file per partition,
+    with the sums needed for the rollup in the result set's manifest.
+    Partitions not re-ingested since their last run are reused, and a single
+    partition can be re-run on request without touching the others.
+    """
+
+    def __init__(self, max_workers=1, threads=None):
+        self.max_workers = max_workers
+        self.threads = threads
+        self._executor = None
+
+    def _get_executor(self):
+        # Created lazily so importing the app does not spawn worker processes.
+        # Polars' thread pool is not fork-safe, so workers are spawned.
+        if self._executor is None:
+            logger.info("Starting partition pool with %s workers of %s threads", self.max_workers, self.threads)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_pool_process,
+                initargs=(self.threads,)
+            )
+        return self._executor
+
+    def optimize(self, dataset_dir, params, demand_stats_path=None, partitions=None):
+        """
+        Bring a partitioned dataset's results up to date for a parameter set.
+
+        Args:
+            dataset_dir (str): Directory of the partitioned dataset
+            params (dict): Resolved optimization parameters
+            demand_stats_path (str, optional): Demand statistics; a file with
+                the partition key column is matched per partition and SKU
+            partitions (list, optional): Re-run exactly these partitions,
+                even if up to date, and leave the others as they are
+
+        Returns:
+            dict: result_id, results_dir, partitions recomputed and reused,
+                summary and per-partition rollup
+
+        Raises:
+            ValueError: If the dataset or a requested partition does not exist
+        """
+        start_time = time.perf_counter()
+        if not os.path.isdir(dataset_dir):
+            raise ValueError(f"Unknown dataset: {os.path.basename(dataset_dir)}")
+        with directory_lock(dataset_dir):
+            manifest = _read_manifest(dataset_dir)
+            if manifest is None:
+                raise ValueError(f"Unknown dataset: {os.path.basename(dataset_dir)}")
+            key = manifest['key']
+            unknown = [value for value in partitions or [] if value not in manifest['partitions']]
+            if unknown:
+                raise ValueError(f"Unknown partitions: {unknown}")
+
+            result_id = _result_set_id(dataset_dir, params, demand_stats_path)
+            results_dir = os.path.join(dataset_dir, 'results', result_id)
+            os.makedirs(results_dir, exist_ok=True)
+            state = _read_manifest(results_dir, default={"partitions": {}})
+
+            if partitions:
+                todo = list(partitions)
+            else:
+                todo = [value for value, entry in manifest['partitions'].items()
+                        if state['partitions'].get(value, {}).get('version') != entry['version']]
+            tasks = []
+            partition_dirs = _partition_dirs(dataset_dir, key)
+            for value in todo:
+                files = _partition_files(partition_dirs[value], manifest['partitions'][value]['version'])
+                tasks.append((value, (files, key, value, _result_file(results_dir, value), params, demand_stats_path)))
+            logger.info("Optimizing %s of %s partitions of %s (result set %s)",
+                        len(tasks), len(manifest['partitions']), dataset_dir, result_id)
+
+            with span('partition_optimize') as stage:
+                if self.max_workers > 1 and len(tasks) > 1:
+                    try:
+                        with pool_environment(self.threads):
+                            futures = [(value, self._get_executor().submit(_optimize_partition, *args))
+                                       for value, args in tasks]
+                        computed = {value: future.result() for value, future in futures}
+                    except BrokenProcessPool:
+                        # A worker died and took the pool with it; start a fresh one next time
+                        self._executor = None
+                        raise
+                else:
+                    computed = {value: _optimize_partition(*args) for value, args in tasks}
+                stage.rows = sum(stats['rows'] for stats in computed.values())
+
+            for value, stats in computed.items():
+                state['partitions'][value] = dict(stats, version=manifest['partitions'][value]['version'])
+            state.update(key=key, params=params, demand_stats_path=demand_stats_path,
+                         dataset_version=manifest['version'])
+            _write_manifest(results_dir, state)
+            _prune_result_sets(dataset_dir, keep=results_dir)
+
+        elapsed = time.perf_counter() - start_time
+        logger.info("Partitioned optimization finished in %.3fs: %s partitions recomputed",
+                    elapsed, len(computed))
+        return dict(summarize_partitions(state), result_id=result_id, results_dir=results_dir, key=key,
+                    partitions_recomputed=sorted(computed),
+                    partitions_reused=len(state['partitions']) - len(computed),
+                    seconds=round(elapsed, 4))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def rollup_results(results_dir, by='partition', limit=100):
+    """
+    Roll a partitioned result set up across partitions.
+
+    Args:
+        results_dir (str): Result set directory from PartitionOptimizer.optimize
+        by (str): 'partition' for one row per warehouse, computed from the
+            stored sums, or 'product' to total each SKU across warehouses
+        limit (int): Products returned when by='product', largest savings first
+
+    Returns:
+        dict: Rollup rows, plus the total product count when by='product'
+
+    Raises:
+        ValueError: If the level is unknown or the result set does not exist
+    """
+    if by not in ROLLUP_LEVELS:
+        raise ValueError(f"Unknown rollup level '{by}', expected one of {list(ROLLUP_LEVELS)}")
+    state = _read_manifest(results_dir)
+    if state is None:
+        raise ValueError("Unknown result set")
+    if by == 'partition':
+        return {"key": state['key'], "partitions": summarize_partitions(state)['partitions']}
+
+    with span('partition_rollup') as stage:
+        products = (pl.scan_parquet(os.path.join(results_dir, '*.parquet'))
+                    .group_by(['product_id'])
+                    .agg([
+                        pl.col('name').first(),
+                        pl.col(state['key']).n_unique().alias('partitions'),
+                        pl.col('current_stock').sum(),
+                        pl.col('optimal_stock').sum(),
+                        pl.col('reorder_point').sum(),
+                        pl.col('cost_savings').sum().round(2)
+                    ])
+                    .collect(streaming=True))
+        stage.rows = len(products)
+    top = products.sort('cost_savings', descending=True, nulls_last=True).head(limit)
+    return {"key": state['key'], "total_products": len(products), "products": top.to_dicts()}
+
+
+def describe_partitioned(dataset_dir):
+    """
+    Summarize a partitioned dataset.
+
+    Returns:
+        dict: Key, version, per-partition row counts and the stored result
+            sets, or None if the dataset does not exist
+    """
+    manifest = _read_manifest(dataset_dir)
+    if manifest is None:
+        return None
+    result_sets = []
+    for path in sorted(glob.glob(os.path.join(dataset_dir, 'results', '*'))):
+        state = _read_manifest(path)
+        if state is not None:
+            stale = [value for value, entry in manifest['partitions'].items()
+                     if state['partitions'].get(value, {}).get('version') != entry['version']]
+            result_sets.append({
+                "result_id": os.path.basename(path),
+                "parameters": state.get('params'),
+                "stale_partitions": stale
+            })
+    return {
+        "key": manifest['key'],
+        "version": manifest['version'],
+        "total_rows": sum(entry['rows'] for entry in manifest['partitions'].values()),
+        "partitions": {value: entry['rows'] for value, entry in sorted(manifest['partitions'].items())},
+        "result_sets": result_sets
+    }
+
+
+def init_partition_optimizer(app):
+    """Create the partitioned optimizer for the app and register it as an extension"""
+    optimizer = PartitionOptimizer(max_workers=app.config['PARTITION_WORKERS'],
+                                   threads=threads_per_worker(app.config['PARTITION_WORKERS'], app.config['THREAD_BUDGET']))
+    app.extensions['partition_optimizer'] = optimizer
+    return optimizer
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from services.download_service import remove_variants
+from utils.instrumentation import span
+from utils.locking import directory_lock
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_result_cache')
+
+# Bump when the optimization model changes so stale results are not served
+MODEL_VERSION = 2
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Content hashes keyed by (path, size, mtime) so unchanged files are hashed once
+_file_hash_memo = {}
+_file_hash_lock = threading.Lock()
+
+
+def file_content_hash(path):
+    """
+    Return the SHA-256 of a file's contents.
+
+    Hashes are memoized on (path, size, mtime) so repeated requests for the
+    same unchanged file do not re-read it.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hash_lock:
+        cached = _file_hash_memo.get(memo_key)
+    if cached is not None:
+        return cached
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+
+    with _file_hash_lock:
+        _file_hash_memo[memo_key] = content_hash
+    return content_hash
+
+
+class ResultCache:
+    """
+    Content-addressed store of optimization results.
+
+    Entries are keyed by a hash of the input file contents plus the
+    optimization settings. Each entry is a directory under ``cache_folder``
+    holding ``entry.json`` and ``results.parquet``; the formatted CSV lives in
+    the output folder under a name derived from the key, so a repeat request
+    returns the same download instead of writing a new file.
+
+    Entry sizes and access times are recorded in ``entry.json``, and eviction
+    works from those files under a lock on the cache folder, so the size cap
+    and age limit hold for the cache as a whole rather than per server worker.
+    The in-memory index only saves a disk read on lookups.
+    """
+
+    def __init__(self, cache_folder, output_folder, max_bytes, max_age_seconds):
+        self.cache_folder = cache_folder
+        self.output_folder = output_folder
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(cache_folder, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the in-memory index from the entries already on disk"""
+        self._index = OrderedDict((entry['key'], entry) for entry in self._disk_entries())
+        logger.info("Result cache loaded with %s entries", len(self._index))
+
+    def _disk_entries(self):
+        """Entries stored by every worker process, least recently used first"""
+        entries = []
+        for key in os.listdir(self.cache_folder):
+            entry = self._read_entry(key)
+            if entry is not None:
+                entries.append(entry)
+        return sorted(entries, key=lambda e: e['last_access'])
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_folder, key)
+
+    def _read_entry(self, key):
+        try:
+            with open(os.path.join(self._entry_dir(key), 'entry.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def make_key(self, file_paths, combine, params, demand_stats_path=None, partition_by=None):
+        """
+        Compute the cache key for an optimization request.
+
+        Args:
+            file_paths (list): Input Parquet files, in request order
+            combine (str): How the files are combined
+            params (dict): Resolved optimization parameters
+            demand_stats_path (str, optional): Demand statistics used instead of uploaded demand
+            partition_by (str, optional): Partition key carried into the results
+
+        Returns:
+            str: Hex digest identifying the request
+        """
+        with span('content_hash'):
+            digest = hashlib.sha256()
+            request = {
+                "model_version": MODEL_VERSION,
+                "combine": combine,
+                "params": params,
+                "files": [file_content_hash(path) for path in file_paths],
+                "demand_stats": file_content_hash(demand_stats_path) if demand_stats_path else None
+            }
+            # Only present when set, so unpartitioned keys stay as they were
+            if partition_by:
+                request["partition_by"] = partition_by
+            digest.update(json.dumps(request, sort_keys=True).encode())
+            return digest.hexdigest()
+
+    def output_filename(self, key):
+        """Name of the formatted CSV written for a cache key"""
+        return f"optimization_results_{key[:16]}.csv"
+
+    def results_path(self, key):
+        """Path where the results Parquet for a cache key is stored"""
+        return os.path.join(self._entry_dir(key), 'results.parquet')
+
+    def output_results_path(self, output_file):
+        """
+        Find the results Parquet a formatted CSV of this cache was written from.
+
+        Entries are looked up on disk, so CSVs stored by other worker
+        processes are found too.
+
+        Returns:
+            str: Path to the results Parquet, or None if no entry wrote the CSV
+        """
+        for key in os.listdir(self.cache_folder):
+            if self.output_filename(key) == output_file:
+                path = self.results_path(key)
+                if os.path.exists(path):
+                    return path
+        return None
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        Returns:
+            dict: Cache entry with the summary and output file, or None on a miss
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                # Another worker process may have stored it since we loaded the index
+                entry = self._read_entry(key)
+
+            if entry is not None and self._is_valid(entry):
+                entry['last_access'] = time.time()
+                # Recorded on disk so eviction in other workers sees the access
+                self._write_entry(entry)
+                self._index[key] = entry
+                self._index.move_to_end(key)
+                self.hits += 1
+                return dict(entry)
+
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def _is_valid(self, entry):
+        if time.time() - entry['created_at'] > self.max_age_seconds:
+            return False
+        return (os.path.exists(self.results_path(entry['key'])) and
+                os.path.exists(os.path.join(self.output_folder, entry['output_file'])))
+
+    def put(self, key, results, summary):
+        """
+        Store optimization results under a cache key.
+
+        The formatted CSV must already be written to ``output_filename(key)``.
+
+        Args:
+            key (str): Cache key from make_key
+            results (pl.DataFrame): Optimization results
+            summary (dict): Summary statistics returned to clients
+
+        Returns:
+            dict: The stored cache entry
+        """
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        # Concurrent requests for the same key write the same content; each
+        # moves its own temporary file into place so readers never see a partial one
+        tmp_path = f"{self.results_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with span('parquet_write', rows=len(results)):
+            results.write_parquet(tmp_path)
+        os.replace(tmp_path, self.results_path(key))
+
+        output_file = self.output_filename(key)
+        size = (os.path.getsize(self.results_path(key)) +
+                os.path.getsize(os.path.join(self.output_folder, output_file)))
+        now = time.time()
+        entry = {
+            "key": key,
+            "summary": summary,
+            "output_file": output_file,
+            "rows": len(results),
+            "size_bytes": size,
+            "created_at": now,
+            "last_access": now
+        }
+        self._write_entry(entry)
+
+        with self._lock:
+            self._index[key] = entry
+            self._index.move_to_end(key)
+            self._evict(keep=key)
+        return dict(entry)
+
+    def _write_entry(self, entry):
+        """Atomically replace an entry's entry.json, skipping entries already evicted"""
+        entry_dir = self._entry_dir(entry['key'])
+        tmp_path = os.path.join(entry_dir, f"entry.json.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f, default=str)
+            os.replace(tmp_path, os.path.join(entry_dir, 'entry.json'))
+        except OSError as e:
+            logger.debug("Could not record cache entry %s: %s", entry['key'], e)
+
+    def _evict(self, keep=None):
+        """
+        Drop expired entries, then least recently used ones until under the size cap.
+
+        Totals come from the entries on disk, so entries stored by other
+        worker processes count towards the cap. The in-memory index is
+        rebuilt from what remains.
+
+        Args:
+            keep (str, optional): Key of the entry just stored, never evicted for size
+        """
+        with directory_lock(self.cache_folder):
+            now = time.time()
+            entries = []
+            for entry in self._disk_entries():
+                if now - entry['created_at'] > self.max_age_seconds:
+                    self._remove(entry['key'])
+                else:
+                    entries.append(entry)
+
+            total = sum(e['size_bytes'] for e in entries)
+            for entry in list(entries):
+                if total <= self.max_bytes:
+                    break
+                if entry['key'] == keep:
+                    continue
+                total -= entry['size_bytes']
+                entries.remove(entry)
+                self._remove(entry['key'])
+
+            self._index = OrderedDict((e['key'], e) for e in entries)
+
+    def _remove(self, key):
+        entry = self._index.pop(key, None) or self._read_entry(key)
+        logger.debug("Evicting cache entry %s", key)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        if entry is not None:
+            try:
+                os.remove(os.path.join(self.output_folder, entry['output_file']))
+            except OSError:
+                pass
+            remove_variants(self.output_folder, entry['output_file'])
+
+    def stats(self):
+        """Hit/miss counters of this worker and current size of the whole cache"""
+        entries = self._disk_entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "entries": len(entries),
+                "size_bytes": sum(e['size_bytes'] for e in entries),
+                "max_bytes": self.max_bytes,
+                "max_age_seconds": self.max_age_seconds
+            }
+
+
+def init_result_cache(app):
+    """Create the result cache for the app and register it as an extension"""
+    cache = ResultCache(
+        app.config['CACHE_FOLDER'],
+        app.config['OUTPUT_FOLDER'],
+        max_bytes=app.config['RESULT_CACHE_MAX_BYTES'],
+        max_age_seconds=app.config['RESULT_CACHE_MAX_AGE']
+    )
+    app.extensions['result_cache'] = cache
+    return cache
@@ -0,0 +1,446 @@
+import io
+import os
+import glob
+import json
+import base64
+import logging
+import threading
+from collections import OrderedDict
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.instrumentation import span
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_results')
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
+
+# Rows per record batch when streaming a result set
+STREAM_BATCH_SIZE = 64 * 1024
+
+# Upper bounds that keep query responses small whatever the size of the result set
+MAX_TOP_N = 1000
+MAX_GROUPS = 1000
+MAX_HISTOGRAM_BINS = 200
+
+# Aggregations available to rollups, applied as column:aggregation
+AGGREGATIONS = {
+    'sum': lambda col: col.sum(),
+    'mean': lambda col: col.mean(),
+    'median': lambda col: col.median(),
+    'min': lambda col: col.min(),
+    'max': lambda col: col.max(),
+    'count': lambda col: col.count()
+}
+
+# Rollup metrics used when none are requested, for columns the result set has
+DEFAULT_ROLLUP_METRICS = ['cost_savings:sum', 'stock_reduction_pct:mean']
+
+FILTER_OPERATORS = {
+    'eq': lambda col, value: col == value,
+    'ne': lambda col, value: col != value,
+    'gt': lambda col, value: col > value,
+    'gte': lambda col, value: col >= value,
+    'lt': lambda col, value: col < value,
+    'lte': lambda col, value: col <= value,
+    'contains': lambda col, value: col.str.contains(value, literal=True)
+}
+
+def encode_cursor(offset):
+    """Encode a row offset as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode()
+
+def decode_cursor(cursor):
+    """
+    Decode a pagination cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        offset = json.loads(base64.urlsafe_b64decode(cursor.encode()))['offset']
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+def parse_filter(spec, schema):
+    """
+    Parse a ``column:operator:value`` filter into a Polars expression.
+
+    Args:
+        spec (str): Filter specification, e.g. 'stock_reduction_pct:gt:10'
+        schema (dict): Column name to data type of the result set
+
+    Returns:
+        pl.Expr: Boolean filter expression
+
+    Raises:
+        ValueError: If the column, operator or value is invalid
+    """
+    parts = spec.split(':', 2)
+    if len(parts) != 3:
+        raise ValueError(f"Invalid filter '{spec}', expected column:operator:value")
+    column, operator, raw_value = parts
+    if column not in schema:
+        raise ValueError(f"Unknown column '{column}' in filter")
+    if operator not in FILTER_OPERATORS:
+        raise ValueError(f"Unknown filter operator '{operator}', expected one of {list(FILTER_OPERATORS)}")
+
+    dtype = schema[column]
+    if operator == 'contains' or dtype == pl.Utf8:
+        value = raw_value
+    else:
+        try:
+            value = float(raw_value) if dtype in [pl.Float32, pl.Float64] else int(raw_value)
+        except ValueError:
+            raise ValueError(f"Filter value '{raw_value}' is not valid for numeric column '{column}'")
+    return FILTER_OPERATORS[operator](pl.col(column), value)
+
+def _parquet_files(results_path):
+    """Parquet files of a result set, which is a single file or a directory of shards"""
+    if os.path.isdir(results_path):
+        return sorted(glob.glob(os.path.join(results_path, '*.parquet')))
+    return [results_path]
+
+def build_results_query(results_path, filters=None, sort=None, descending=False):
+    """
+    Build a lazy query over a stored result set.
+
+    Args:
+        results_path (str): Parquet file holding optimization results, or a
+            directory of Parquet shards
+        filters (list, optional): Filter specifications, see parse_filter
+        sort (str, optional): Column to sort by
+        descending (bool): Sort in descending order
+
+    Returns:
+        pl.LazyFrame: Filtered and sorted results
+    """
+    if os.path.isdir(results_path):
+        lf = pl.scan_parquet(os.path.join(results_path, '*.parquet'))
+    else:
+        lf = pl.scan_parquet(results_path)
+    schema = lf.schema
+    for spec in filters or []:
+        lf = lf.filter(parse_filter(spec, schema))
+    if sort:
+        if sort not in schema:
+            raise ValueError(f"Unknown sort column '{sort}'")
+        lf = lf.sort(sort, descending=descending, nulls_last=True)
+    return lf
+
+def read_page(lf, offset, limit):
+    """
+    Materialize one page of a results query.
+
+    Args:
+        lf (pl.LazyFrame): Query from build_results_query
+        offset (int): Index of the first row to return
+        limit (int): Maximum number of rows to return
+
+    Returns:
+        dict: Page of rows in columnar form with pagination metadata
+    """
+    with span('results_read') as stage:
+        total_rows = lf.select(pl.count()).collect().item()
+        page = lf.slice(offset, limit).collect()
+        stage.rows = len(page)
+    next_offset = offset + len(page)
+    has_more = next_offset < total_rows
+    return {
+        "total_rows": total_rows,
+        "offset": offset,
+        "limit": limit,
+        "columns": page.columns,
+        "data": {col: page[col].to_list() for col in page.columns},
+        "next_offset": next_offset if has_more else None,
+        "next_cursor": encode_cursor(next_offset) if has_more else None
+    }
+
+def iter_record_batches(results_path, filters=None, sort=None, descending=False):
+    """
+    Yield the result set as Arrow record batches.
+
+    Unfiltered, unsorted requests stream row groups straight from the
+    Parquet file so memory stays bounded by the batch size. Filtered or
+    sorted requests run the query first and then slice it into batches.
+    """
+    if not filters and not sort:
+        for path in _parquet_files(results_path):
+            yield from pq.ParquetFile(path).iter_batches(batch_size=STREAM_BATCH_SIZE)
+        return
+
+    df = build_results_query(results_path, filters, sort, descending).collect()
+    for batch_start in range(0, len(df), STREAM_BATCH_SIZE):
+        yield from df.slice(batch_start, STREAM_BATCH_SIZE).to_arrow().to_batches()
+
+def stream_arrow_ipc(results_path, filters=None, sort=None, descending=False):
+    """Yield the result set encoded as an Arrow IPC stream, one batch at a time"""
+    buffer = io.BytesIO()
+    writer = None
+    for batch in iter_record_batches(results_path, filters, sort, descending):
+        if writer is None:
+            writer = pa.ipc.new_stream(buffer, batch.schema)
+        writer.write_batch(batch)
+        yield _drain(buffer)
+    if writer is None:
+        writer = pa.ipc.new_stream(buffer, pq.read_schema(_parquet_files(results_path)[0]))
+    writer.close()
+    yield _drain(buffer)
+
+def _drain(buffer):
+    """Return the bytes written to a buffer so far and reset it"""
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return data
+
+def stream_ndjson(results_path, filters=None, sort=None, descending=False):
+    """Yield the result set as newline-delimited JSON, one batch at a time"""
+    for batch in iter_record_batches(results_path, filters, sort, descending):
+        yield pl.from_arrow(pa.Table.from_batches([batch])).write_ndjson()
+
+def _numeric_column(schema, column):
+    """Check that a column exists and is numeric"""
+    if column not in schema:
+        raise ValueError(f"Unknown column '{column}'")
+    if schema[column] not in pl.NUMERIC_DTYPES:
+        raise ValueError(f"Column '{column}' is not numeric")
+
+def top_results(lf, by='cost_savings', n=10, descending=True, columns=None):
+    """
+    Return the n rows with the largest (or smallest) values of a column.
+
+    Runs as a top-k selection, so only n rows are kept in memory at any
+    point. Rows where the column is null are skipped.
+
+    Args:
+        lf (pl.LazyFrame): Query from build_results_query
+        by (str): Numeric column to rank by
+        n (int): Rows to return, at most MAX_TOP_N
+        descending (bool): Largest values first; smallest first otherwise
+        columns (list, optional): Columns to return (default: all)
+
+    Returns:
+        dict: Ranked rows in columnar form
+
+    Raises:
+        ValueError: If a column is unknown or n is out of range
+    """
+    schema = lf.schema
+    _numeric_column(schema, by)
+    if not 1 <= n <= MAX_TOP_N:
+        raise ValueError(f"n must be between 1 and {MAX_TOP_N}")
+    columns = columns or list(schema)
+    unknown = [col for col in columns if col not in schema]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+
+    lf = lf.filter(pl.col(by).is_not_null())
+    lf = lf.top_k(n, by=by) if descending else lf.bottom_k(n, by=by)
+    with span('results_top') as stage:
+        df = lf.sort(by, descending=descending).select(columns).collect()
+        stage.rows = len(df)
+    return {
+        "by": by,
+        "order": 'desc' if descending else 'asc',
+        "columns": df.columns,
+        "data": {col: df[col].to_list() for col in df.columns}
+    }
+
+def parse_metric(spec, schema):
+    """
+    Parse a ``column:aggregation`` metric into a named Polars expression.
+
+    Raises:
+        ValueError: If the column or aggregation is invalid
+    """
+    parts = spec.split(':')
+    if len(parts) != 2:
+        raise ValueError(f"Invalid metric '{spec}', expected column:aggregation")
+    column, aggregation = parts
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{aggregation}', expected one of {list(AGGREGATIONS)}")
+    if aggregation == 'count':
+        if column not in schema:
+            raise ValueError(f"Unknown column '{column}'")
+    else:
+        _numeric_column(schema, column)
+    return AGGREGATIONS[aggregation](pl.col(column)).alias(f"{column}_{aggregation}")
+
+def aggregate_results(lf, group_by=None, metrics=None, limit=100):
+    """
+    Aggregate a result set, optionally per group.
+
+    Without group_by the whole (filtered) result set is reduced to one row
+    of totals. Groups are ordered by the first metric, largest first.
+
+    Args:
+        lf (pl.LazyFrame): Query from build_results_query
+        group_by (list, optional): Columns to group by
+        metrics (list, optional): column:aggregation specifications
+            (default: those of DEFAULT_ROLLUP_METRICS the result set has)
+        limit (int): Groups returned, at most MAX_GROUPS
+
+    Returns:
+        dict: One row per group in columnar form, plus the number of groups
+
+    Raises:
+        ValueError: If a column, aggregation or the limit is invalid
+    """
+    schema = lf.schema
+    group_by = group_by or []
+    unknown = [col for col in group_by if col not in schema]
+    if unknown:
+        raise ValueError(f"Unknown group_by columns: {unknown}")
+    if not 1 <= limit <= MAX_GROUPS:
+        raise ValueError(f"limit must be between 1 and {MAX_GROUPS}")
+    if metrics is None:
+        metrics = [spec for spec in DEFAULT_ROLLUP_METRICS if spec.split(':')[0] in schema]
+    exprs = [pl.count().alias('rows')] + [parse_metric(spec, schema) for spec in metrics]
+    order_by = exprs[1].meta.output_name() if len(exprs) > 1 else 'rows'
+
+    with span('results_aggregate') as stage:
+        if group_by:
+            df = lf.group_by(group_by).agg(exprs).collect()
+            total_groups = len(df)
+            df = df.sort(order_by, descending=True, nulls_last=True).head(limit)
+        else:
+            df = lf.select(exprs).collect()
+            total_groups = 1
+        stage.rows = len(df)
+    return {
+        "group_by": group_by,
+        "total_groups": total_groups,
+        "columns": df.columns,
+        "data": {col: df[col].to_list() for col in df.columns}
+    }
+
+def histogram_results(lf, column, bins=20):
+    """
+    Count the values of a numeric column in equal-width bins.
+
+    The column's range is found first and every value is then assigned a
+    bin in one aggregation, so only the bin counts are materialized. NaN
+    and infinite values are skipped and counted apart. When every value is
+    the same, there is a single bin from that value to itself.
+
+    Args:
+        lf (pl.LazyFrame): Query from build_results_query
+        column (str): Numeric column
+        bins (int): Number of bins, at most MAX_HISTOGRAM_BINS
+
+    Returns:
+        dict: Bin edges (one more than the bins), counts per bin, and the
+            nulls and non-finite values skipped
+
+    Raises:
+        ValueError: If the column is unknown or not numeric, or bins is out of range
+    """
+    _numeric_column(lf.schema, column)
+    if not 1 <= bins <= MAX_HISTOGRAM_BINS:
+        raise ValueError(f"bins must be between 1 and {MAX_HISTOGRAM_BINS}")
+
+    value = pl.col(column).cast(pl.Float64)
+    finite = value.is_finite()
+    with span('results_histogram') as stage:
+        bounds = lf.select(value.filter(finite).min().alias('low'), value.filter(finite).max().alias('high'),
+                           finite.sum().alias('values'), value.is_not_null().sum().alias('non_null'),
+                           pl.count().alias('rows')).collect().row(0, named=True)
+        stage.rows = bounds['rows']
+        low, high, values = bounds['low'], bounds['high'], bounds['values'] or 0
+        if not values:
+            edges, counts = [], [0] * bins
+        elif low == high:
+            bins, edges, counts = 1, [low, high], [values]
+        else:
+            width = (high - low) / bins
+            # The maximum lands on the last bin's closed upper edge
+            bin_index = ((value - low) / width).floor().cast(pl.Int64).clip(0, bins - 1)
+            per_bin = (lf.filter(finite).group_by(bin_index.alias('bin'))
+                       .agg(pl.count().alias('count')).collect())
+            counts = [0] * bins
+            for index, count in per_bin.iter_rows():
+                counts[index] = count
+            edges = [low + (high - low) * i / bins for i in range(bins + 1)]
+    return {
+        "column": column,
+        "bins": bins,
+        "edges": edges,
+        "counts": counts,
+        "nulls": bounds['rows'] - bounds['non_null'],
+        "non_finite": bounds['non_null'] - values
+    }
+
+def results_signature(results_path):
+    """Size and modification time of every file of a result set, to tell when it was rewritten"""
+    signature = []
+    for path in _parquet_files(results_path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append((os.path.basename(path), stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+class ResultQueryMemo:
+    """
+    Memoize query responses per result set.
+
+    Entries are keyed on the query and on the signature of the result set's
+    files, so a rewritten result set (such as a dataset re-optimized in
+    place) is queried afresh. The least recently used entries are dropped
+    beyond max_entries; responses are small, so the memo stays small too.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, results_path, query, compute):
+        """
+        Return the memoized response for a query, computing it on first use.
+
+        Args:
+            results_path (str): Result set the query runs on
+            query (tuple): Hashable description of the query and its arguments
+            compute (callable): Builds the response when it is not memoized
+
+        Returns:
+            dict: Query response
+        """
+        key = (results_path, results_signature(results_path), query)
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return response
+            self.misses += 1
+
+        response = compute()
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return response
+
+    def stats(self):
+        """Hit and miss counters and the number of memoized responses"""
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+def init_result_query_memo(app):
+    """Create the results query memo for the app and register it as an extension"""
+    memo = ResultQueryMemo(app.config['RESULTS_QUERY_MEMO_ENTRIES'])
+    app.extensions['result_query_memo'] = memo
+    return memo
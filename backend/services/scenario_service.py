@@ -0,0 +1,177 @@
+import time
+import logging
+import itertools
+import numpy as np
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from services.optimization_service import DEFAULT_PARAMETERS, resolve_parameters, load_inventory
+from services.inventory_model import NumpyOps, inventory_model, demand_std_dev
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_scenarios')
+
+# Upper bound on scenarios evaluated in one sweep
+MAX_SCENARIOS = 1000
+
+# SKU x scenario cells evaluated per chunk; each float64 temporary is 8 bytes per cell
+CHUNK_CELLS = 250_000
+
+
+def expand_grid(grid):
+    """
+    Expand a parameter grid into the list of scenarios it describes.
+
+    Args:
+        grid (dict): Parameter name to a list of values; parameters that are
+            omitted keep their default value
+
+    Returns:
+        list: One resolved parameter dict per combination
+
+    Raises:
+        ValueError: If the grid is not a dict, is empty, names an unknown
+            parameter or is too large
+    """
+    if not isinstance(grid, dict):
+        raise ValueError("Parameter grid must be an object mapping parameter names to lists of values")
+    if not grid:
+        raise ValueError("Parameter grid is empty")
+    for name, values in grid.items():
+        if name not in DEFAULT_PARAMETERS:
+            raise ValueError(f"Unknown optimization parameter '{name}'")
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"Grid values for '{name}' must be a non-empty list")
+
+    names = list(grid)
+    size = int(np.prod([len(grid[name]) for name in names]))
+    if size > MAX_SCENARIOS:
+        raise ValueError(f"Parameter grid has {size} scenarios, the maximum is {MAX_SCENARIOS}")
+    return [resolve_parameters(dict(zip(names, values)))
+            for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _load_arrays(lf, with_ids):
+    """Collect the model inputs as contiguous float64 arrays"""
+    columns = ['current_stock', 'unit_cost', 'lead_time_days', 'daily_demand']
+    has_std_dev = 'demand_std_dev' in lf.columns
+    exprs = [pl.col(col).cast(pl.Float64) for col in columns]
+    if has_std_dev:
+        exprs.append(pl.col('demand_std_dev').cast(pl.Float64))
+    if with_ids:
+        exprs.append(pl.col('product_id').cast(pl.Utf8))
+    df = lf.select(exprs).collect(streaming=True)
+
+    arrays = {col: df[col].to_numpy(zero_copy_only=False).astype(np.float64) for col in columns}
+    measured = df['demand_std_dev'].to_numpy(zero_copy_only=False).astype(np.float64) if has_std_dev else None
+    arrays['demand_std_dev'] = demand_std_dev(NumpyOps, arrays['daily_demand'], measured)
+    arrays['product_id'] = df['product_id'] if with_ids else None
+    return arrays
+
+
+def _evaluate_chunk(arrays, start, stop, ordering_cost, holding_cost_pct, safety_factor):
+    """
+    Evaluate the optimization model for SKUs [start, stop) under every scenario.
+
+    Inputs are shaped (skus, 1) and parameters (1, scenarios) so NumPy
+    broadcasting produces (skus, scenarios) matrices in one pass of the
+    model shared with the optimization query, see inventory_model.
+    """
+    rows = slice(start, stop)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return inventory_model(NumpyOps, arrays['daily_demand'][rows, None], arrays['unit_cost'][rows, None],
+                               arrays['lead_time_days'][rows, None], arrays['current_stock'][rows, None],
+                               arrays['demand_std_dev'][rows, None],
+                               ordering_cost, holding_cost_pct, safety_factor)
+
+
+def run_scenario_sweep(file_paths, scenarios, combine='concat', demand_stats_path=None, detail_path=None):
+    """
+    Evaluate every SKU under every scenario in one vectorized pass.
+
+    SKUs are processed in chunks sized so that each (skus x scenarios) matrix
+    holds at most CHUNK_CELLS values, which bounds memory regardless of the
+    number of SKUs.
+
+    Args:
+        file_paths (list): Parquet files with inventory data
+        scenarios (list): Resolved parameter dicts, see expand_grid
+        combine (str): How multiple files are combined, 'concat' or 'join'
+        demand_stats_path (str, optional): Demand statistics from sales history
+        detail_path (str, optional): Write per-SKU, per-scenario results to this
+            Parquet file
+
+    Returns:
+        list: One summary dict per scenario, in input order
+    """
+    start_time = time.perf_counter()
+    arrays = _load_arrays(load_inventory(file_paths, combine, demand_stats_path), detail_path is not None)
+    sku_count = len(arrays['daily_demand'])
+    scenario_count = len(scenarios)
+    logger.info("Running scenario sweep: %s SKUs x %s scenarios", sku_count, scenario_count)
+
+    ordering_cost = np.array([s['ordering_cost'] for s in scenarios])[None, :]
+    holding_cost_pct = np.array([s['holding_cost_pct'] for s in scenarios])[None, :]
+    safety_factor = np.array([s['safety_factor'] for s in scenarios])[None, :]
+
+    total_savings = np.zeros(scenario_count)
+    reduction_sum = np.zeros(scenario_count)
+    reduction_count = np.zeros(scenario_count)
+    total_optimal_stock = np.zeros(scenario_count)
+    skus_with_savings = np.zeros(scenario_count, dtype=np.int64)
+
+    writer = None
+    chunk_size = max(1, CHUNK_CELLS // scenario_count)
+    try:
+        for start in range(0, sku_count, chunk_size):
+            stop = min(start + chunk_size, sku_count)
+            chunk = _evaluate_chunk(arrays, start, stop, ordering_cost, holding_cost_pct, safety_factor)
+
+            # NaN (missing inputs) is skipped, as Polars skips nulls in sum and mean
+            total_savings += np.nansum(chunk['cost_savings'], axis=0)
+            finite = np.isfinite(chunk['stock_reduction_pct'])
+            reduction_sum += np.where(finite, chunk['stock_reduction_pct'], 0).sum(axis=0)
+            reduction_count += finite.sum(axis=0)
+            total_optimal_stock += np.nansum(chunk['optimal_stock'], axis=0)
+            skus_with_savings += (chunk['cost_savings'] > 0).sum(axis=0)
+
+            if detail_path is not None:
+                table = _detail_table(arrays['product_id'][start:stop], chunk, scenario_count)
+                if writer is None:
+                    writer = pq.ParquetWriter(detail_path, table.schema)
+                writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    elapsed = time.perf_counter() - start_time
+    logger.info("Scenario sweep finished in %.3fs (%.0f SKU-scenarios/sec)",
+                elapsed, sku_count * scenario_count / elapsed if elapsed > 0 else 0)
+
+    summaries = []
+    for i, scenario in enumerate(scenarios):
+        summaries.append({
+            "scenario_id": i,
+            "parameters": scenario,
+            "totalSavings": round(float(total_savings[i]), 2),
+            "averageStockReduction": round(float(reduction_sum[i] / reduction_count[i]), 2) if reduction_count[i] else None,
+            "totalOptimalStock": int(total_optimal_stock[i]),
+            "skusWithSavings": int(skus_with_savings[i])
+        })
+    return summaries
+
+
+def _detail_table(product_ids, chunk, scenario_count):
+    """Flatten a chunk of (skus x scenarios) matrices into long-format rows"""
+    sku_count = len(product_ids)
+    columns = {
+        "product_id": np.repeat(product_ids.to_numpy(), scenario_count),
+        "scenario_id": np.tile(np.arange(scenario_count, dtype=np.int32), sku_count)
+    }
+    for name in ['optimal_stock', 'reorder_point', 'economic_order_qty']:
+        columns[name] = pa.array(chunk[name].ravel(), from_pandas=True).cast(pa.int32(), safe=False)
+    for name in ['cost_savings', 'stock_reduction_pct']:
+        # NaN stands in for null in the model's arrays
+        columns[name] = pa.array(chunk[name].ravel(), from_pandas=True)
+    return pa.table(columns)
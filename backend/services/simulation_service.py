@@ -0,0 +1,309 @@
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import polars as pl
+
+from services.inventory_model import NumpyOps, demand_std_dev
+from services.optimization_service import build_optimization_plan, load_inventory
+from utils.serving import init_pool_process, pool_environment, threads_per_worker
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_simulation')
+
+# Simulation settings used when a request does not override them
+DEFAULT_SIMULATION = {
+    'days': 365,     # Simulated horizon per trial
+    'trials': 100    # Independent demand paths per SKU
+}
+
+MAX_DAYS = 3650
+MAX_TRIALS = 1000
+
+# SKU x trial cells simulated per chunk; keeps the per-day arrays cache sized
+CHUNK_CELLS = 200_000
+
+# Upper bound on the memory of one chunk, dominated by the in-transit order pipeline
+MAX_CHUNK_BYTES = 256 * 1024 * 1024
+
+# Per-SKU output columns, in output order
+SIMULATION_COLUMNS = [
+    'product_id', 'name', 'reorder_point', 'economic_order_qty', 'fill_rate',
+    'stockout_probability', 'expected_stockout_days', 'expected_lost_units',
+    'average_on_hand', 'orders_per_trial'
+]
+
+
+def resolve_simulation(days=None, trials=None, seed=None):
+    """
+    Validate simulation settings and fill in defaults.
+
+    A seed is drawn from OS entropy when none is given, and returned so the
+    run can be reproduced.
+
+    Returns:
+        dict: days, trials and seed as ints
+
+    Raises:
+        ValueError: If a setting is not a positive integer or exceeds its limit
+    """
+    settings = dict(DEFAULT_SIMULATION)
+    for name, value, limit in [('days', days, MAX_DAYS), ('trials', trials, MAX_TRIALS)]:
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f"Simulation setting '{name}' must be a positive integer")
+        if value > limit:
+            raise ValueError(f"Simulation setting '{name}' must be at most {limit}")
+        settings[name] = value
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy % (2 ** 63)
+    elif isinstance(seed, bool) or not isinstance(seed, int) or seed < 0:
+        raise ValueError("Simulation seed must be a non-negative integer")
+    settings['seed'] = int(seed)
+    return settings
+
+
+def _simulate_chunk(inputs, days, trials, seed_seq):
+    """
+    Simulate a (reorder point, order quantity) policy for a chunk of SKUs.
+
+    Every array is shaped (skus, trials) so each simulated day is a handful of
+    vectorized operations over the whole chunk. Each day, orders due today
+    arrive, demand is drawn from a normal distribution truncated at zero and
+    served from stock (unmet demand is lost), and an order of
+    economic_order_qty is placed when the inventory position (on hand plus on
+    order) is at or below the reorder point. Orders arrive lead_time_days
+    later, at least one day.
+
+    Args:
+        inputs (dict): Per-SKU float64 arrays: daily_demand, demand_std_dev,
+            lead_time_days, current_stock, reorder_point, economic_order_qty
+        days (int): Simulated horizon
+        trials (int): Independent demand paths per SKU
+        seed_seq (np.random.SeedSequence): Seed for this chunk's random stream
+
+    Returns:
+        dict: Per-SKU statistics averaged over trials
+    """
+    rng = np.random.default_rng(seed_seq)
+    sku_count = len(inputs['daily_demand'])
+    skus = np.arange(sku_count)
+
+    mean = inputs['daily_demand'][:, None]
+    std_dev = inputs['demand_std_dev'][:, None]
+    reorder_point = inputs['reorder_point'][:, None]
+    # SKUs with missing inputs never reorder, so a missing quantity can be zero
+    order_qty = np.nan_to_num(inputs['economic_order_qty'])[:, None]
+    lead_time = np.maximum(np.nan_to_num(inputs['lead_time_days']), 1).astype(np.int64)
+
+    # Ring buffer of quantities arriving on each of the next pipeline_days days
+    pipeline_days = int(lead_time.max()) + 1 if sku_count else 1
+    pipeline = np.zeros((pipeline_days, sku_count, trials))
+
+    on_hand = np.repeat(inputs['current_stock'][:, None], trials, axis=1)
+    on_order = np.zeros((sku_count, trials))
+    demand_total = np.zeros((sku_count, trials))
+    lost_total = np.zeros((sku_count, trials))
+    on_hand_total = np.zeros((sku_count, trials))
+    stockout_days = np.zeros((sku_count, trials), dtype=np.int32)
+    orders = np.zeros((sku_count, trials), dtype=np.int32)
+
+    demand = np.empty((sku_count, trials))
+    lost = np.empty((sku_count, trials))
+    quantity = np.empty((sku_count, trials))
+    with np.errstate(invalid='ignore'):
+        for day in range(days):
+            slot = day % pipeline_days
+            arriving = pipeline[slot]
+            on_hand += arriving
+            on_order -= arriving
+            arriving[:] = 0
+
+            rng.standard_normal(out=demand)
+            demand *= std_dev
+            demand += mean
+            np.maximum(demand, 0, out=demand)
+
+            np.subtract(demand, on_hand, out=lost)
+            np.maximum(lost, 0, out=lost)
+            on_hand -= demand
+            on_hand += lost
+            demand_total += demand
+            lost_total += lost
+            stockout_days += lost > 0
+            on_hand_total += on_hand
+
+            reorder = (on_hand + on_order) <= reorder_point
+            np.multiply(reorder, order_qty, out=quantity)
+            pipeline[(day + lead_time) % pipeline_days, skus] += quantity
+            on_order += quantity
+            orders += reorder
+
+        demand_sum = demand_total.sum(axis=1)
+        return {
+            "fill_rate": np.where(demand_sum > 0, 1 - lost_total.sum(axis=1) / demand_sum, 1.0),
+            "stockout_probability": (stockout_days > 0).mean(axis=1),
+            "expected_stockout_days": stockout_days.mean(axis=1),
+            "expected_lost_units": lost_total.mean(axis=1),
+            "average_on_hand": on_hand_total.mean(axis=1) / days,
+            "orders_per_trial": orders.mean(axis=1)
+        }
+
+
+def _chunk_bounds(sku_count, trials, max_lead_time):
+    """Split SKUs into chunks that respect CHUNK_CELLS and MAX_CHUNK_BYTES"""
+    # Pipeline days plus roughly ten working arrays, 8 bytes per cell each
+    bytes_per_sku = 8 * trials * (max_lead_time + 12)
+    chunk_size = max(1, min(CHUNK_CELLS // trials, MAX_CHUNK_BYTES // bytes_per_sku))
+    return [(start, min(start + chunk_size, sku_count)) for start in range(0, sku_count, chunk_size)]
+
+
+def _load_policy(file_paths, combine, params, demand_stats_path):
+    """Collect the model inputs and the optimized policy for every SKU"""
+    lf = load_inventory(file_paths, combine, demand_stats_path)
+    has_std_dev = 'demand_std_dev' in lf.columns
+    inventory = lf.collect(streaming=True)
+    policy = build_optimization_plan(inventory.lazy(), params).collect()
+
+    def as_array(series):
+        return series.cast(pl.Float64).to_numpy(zero_copy_only=False).astype(np.float64)
+
+    demand = as_array(inventory['daily_demand'])
+    measured = as_array(inventory['demand_std_dev']) if has_std_dev else None
+    inputs = {
+        "daily_demand": demand,
+        # The same σ the optimization model sized the safety stock with
+        "demand_std_dev": demand_std_dev(NumpyOps, demand, measured),
+        "lead_time_days": as_array(inventory['lead_time_days']),
+        "current_stock": as_array(inventory['current_stock']),
+        "reorder_point": as_array(policy['reorder_point']),
+        "economic_order_qty": as_array(policy['economic_order_qty'])
+    }
+    return policy, inputs
+
+
+class Simulator:
+    """
+    Runs Monte Carlo policy simulations over a bounded process pool.
+
+    SKUs are split into chunks and each chunk is simulated in a pool worker.
+    Every chunk draws from its own stream spawned from the run's seed, so a
+    run is reproducible from its seed regardless of the number of workers or
+    the order in which chunks finish.
+    """
+
+    def __init__(self, max_workers=1, threads=None):
+        self.max_workers = max_workers
+        self.threads = threads
+        self._executor = None
+
+    def _get_executor(self):
+        # Created lazily so importing the app does not spawn worker processes.
+        # Polars' thread pool is not fork-safe, so workers are spawned.
+        if self._executor is None:
+            logger.info("Starting simulation pool with %s workers of %s threads", self.max_workers, self.threads)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_pool_process,
+                initargs=(self.threads,)
+            )
+        return self._executor
+
+    def simulate(self, file_paths, combine='concat', params=None, demand_stats_path=None,
+                 days=None, trials=None, seed=None):
+        """
+        Simulate the optimized reorder policy for every SKU.
+
+        Args:
+            file_paths (list): Parquet files with inventory data
+            combine (str): How multiple files are combined, 'concat' or 'join'
+            params (dict, optional): Optimization model parameters
+            demand_stats_path (str, optional): Demand statistics from sales history
+            days (int, optional): Simulated horizon, see DEFAULT_SIMULATION
+            trials (int, optional): Demand paths per SKU
+            seed (int, optional): Seed for reproducible runs
+
+        Returns:
+            tuple: (pl.DataFrame with SIMULATION_COLUMNS, settings dict)
+        """
+        settings = resolve_simulation(days, trials, seed)
+        days, trials = settings['days'], settings['trials']
+        start_time = time.perf_counter()
+
+        policy, inputs = _load_policy(file_paths, combine, params, demand_stats_path)
+        sku_count = len(policy)
+        max_lead_time = int(np.nanmax(inputs['lead_time_days'], initial=1))
+        bounds = _chunk_bounds(sku_count, trials, max_lead_time)
+        seeds = np.random.SeedSequence(settings['seed']).spawn(len(bounds))
+        logger.info("Simulating %s SKUs x %s trials x %s days in %s chunks", sku_count, trials, days, len(bounds))
+
+        tasks = [({name: values[start:stop] for name, values in inputs.items()}, days, trials, chunk_seed)
+                 for (start, stop), chunk_seed in zip(bounds, seeds)]
+        if self.max_workers > 1 and len(tasks) > 1:
+            try:
+                with pool_environment(self.threads):
+                    futures = [self._get_executor().submit(_simulate_chunk, *task) for task in tasks]
+                chunks = [future.result() for future in futures]
+            except BrokenProcessPool:
+                # A worker died and took the pool with it; start a fresh one next time
+                self._executor = None
+                raise
+        else:
+            chunks = [_simulate_chunk(*task) for task in tasks]
+
+        stats = {name: np.concatenate([chunk[name] for chunk in chunks]) if chunks else np.empty(0)
+                 for name in SIMULATION_COLUMNS[4:]}
+        results = policy.select(SIMULATION_COLUMNS[:4]).with_columns([
+            pl.Series(name, values).round(4 if name.endswith(('rate', 'probability')) else 2)
+            for name, values in stats.items()
+        ]).fill_nan(None)
+
+        elapsed = time.perf_counter() - start_time
+        logger.info("Simulation finished in %.3fs (%.0f SKU-trial-days/sec)",
+                    elapsed, sku_count * trials * days / elapsed if elapsed > 0 else 0)
+        return results, settings
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def summarize_simulation(results, settings):
+    """
+    Build the summary statistics reported alongside simulation results.
+
+    Args:
+        results (pl.DataFrame): Dataframe returned by Simulator.simulate
+        settings (dict): Resolved simulation settings
+
+    Returns:
+        dict: JSON serializable summary statistics
+    """
+    def as_float(value):
+        return None if value is None else round(float(value), 4)
+
+    return {
+        "skus": len(results),
+        "days": settings['days'],
+        "trials": settings['trials'],
+        "seed": settings['seed'],
+        "averageFillRate": as_float(results['fill_rate'].mean()),
+        "minimumFillRate": as_float(results['fill_rate'].min()),
+        "averageStockoutProbability": as_float(results['stockout_probability'].mean()),
+        "expectedStockoutDays": as_float(results['expected_stockout_days'].sum()),
+        "expectedLostUnits": as_float(results['expected_lost_units'].sum())
+    }
+
+
+def init_simulator(app):
+    """Create the simulator for the app and register it as an extension"""
+    simulator = Simulator(max_workers=app.config['SIMULATION_WORKERS'],
+                          threads=threads_per_worker(app.config['SIMULATION_WORKERS'], app.config['THREAD_BUDGET']))
+    app.extensions['simulator'] = simulator
+    return simulator
@@ -0,0 +1,452 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import contextvars
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.data_processor import process_csv_with_stats, default_conversion_workers, CONVERSION_VERSION
+from utils.instrumentation import span
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_upload_sessions')
+
+# Size of every chunk but the last. Fixed per server so that the same file
+# always yields the same content hash, whichever client sent it.
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Bytes read from the request stream at a time while a chunk is written
+_STREAM_BLOCK_SIZE = 1024 * 1024
+
+# Largest file accepted, and how long a session may sit untouched before it is removed
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024 * 1024
+DEFAULT_SESSION_TTL = 24 * 3600
+
+# Seconds after which a conversion that never finished, say because its web
+# worker was restarted, may be started again by the next finalize call
+DEFAULT_CONVERT_TIMEOUT = 3600
+
+# Seconds between sweeps for expired sessions
+_CLEANUP_INTERVAL = 600
+
+_UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _write_json(path, payload):
+    """Atomically replace a JSON file so readers never see a partial write"""
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def combine_chunk_digests(digests):
+    """
+    Content hash of an upload from the SHA-256 digests of its chunks, in order.
+
+    Each chunk is hashed while it streams to disk, so chunks can arrive in
+    any order, from any web worker, and no pass over the whole file is needed
+    once the last one lands.
+    """
+    combined = hashlib.sha256()
+    for digest in digests:
+        combined.update(bytes.fromhex(digest))
+    return combined.hexdigest()
+
+
+def _source_key(content_hash):
+    """Deduplication key of an upload: its content under the current conversion rules"""
+    return f"{content_hash}-v{CONVERSION_VERSION}"
+
+
+class UploadSessionManager:
+    """
+    Resumable uploads sent as fixed-size chunks.
+
+    A session is created with the file name and size, each chunk is then
+    sent in its own request and streamed to its place in the session's data
+    file, and the file is converted once every chunk is in. Session state
+    lives on disk under ``sessions_folder/<upload_id>`` so chunks and status
+    requests can go to any web worker, and an interrupted upload resumes by
+    sending only the chunks listed as missing.
+
+    The chunk that completes an upload starts the conversion on a background
+    thread straight away. If the content hash matches an earlier upload
+    whose Parquet file is still catalogued, that file is reused instead.
+
+    Chunk and finalize requests are CPU-heavy requests (see
+    utils.serving.heavy_request), and a background conversion holds a slot
+    of the ``admission`` controller while it runs, so conversions count
+    against the worker's limit on heavy work.
+
+    Sessions untouched for ``session_ttl`` seconds are removed, whatever
+    their state. A conversion still unfinished after ``convert_timeout``
+    seconds is taken to be lost and is restarted by the next finalize call.
+    """
+
+    def __init__(self, sessions_folder, upload_folder, catalog, chunk_size=DEFAULT_CHUNK_SIZE,
+                 max_workers=None, max_size=DEFAULT_MAX_SIZE, session_ttl=DEFAULT_SESSION_TTL,
+                 convert_timeout=DEFAULT_CONVERT_TIMEOUT, admission=None):
+        self.sessions_folder = sessions_folder
+        self.upload_folder = upload_folder
+        self.catalog = catalog
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.max_size = max_size
+        self.session_ttl = session_ttl
+        self.convert_timeout = convert_timeout
+        self.admission = admission
+        self._executor = None
+        self._last_cleanup = 0.0
+        os.makedirs(sessions_folder, exist_ok=True)
+
+    def _get_executor(self):
+        # Conversions share Polars' thread pool, see process_csv_files. Sizing
+        # from that pool starts it, so this waits until the first conversion
+        # rather than running in a server master process before it forks.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers or default_conversion_workers(),
+                                                thread_name_prefix='upload-convert')
+        return self._executor
+
+    def _session_dir(self, upload_id):
+        if not _UPLOAD_ID_PATTERN.match(upload_id or ''):
+            return None
+        session_dir = os.path.join(self.sessions_folder, upload_id)
+        return session_dir if os.path.isdir(session_dir) else None
+
+    def _update_status(self, session_dir, **fields):
+        status_path = os.path.join(session_dir, 'status.json')
+        status = _read_json(status_path)
+        status.update(fields)
+        _write_json(status_path, status)
+        return status
+
+    def _chunk_digests(self, session_dir):
+        """Digest of every chunk received so far, by chunk index"""
+        chunks_dir = os.path.join(session_dir, 'chunks')
+        digests = {}
+        for name in os.listdir(chunks_dir):
+            if name.endswith('.sha256'):
+                with open(os.path.join(chunks_dir, name)) as f:
+                    digests[int(name[:-len('.sha256')])] = f.read()
+        return digests
+
+    def _last_activity(self, session_dir):
+        """Latest modification time of a session's status, data or chunk digests"""
+        latest = 0.0
+        for name in ('status.json', 'data.part', 'chunks', 'finalizing'):
+            try:
+                latest = max(latest, os.stat(os.path.join(session_dir, name)).st_mtime)
+            except OSError:
+                pass
+        return latest
+
+    def cleanup_expired(self, force=False):
+        """
+        Remove sessions untouched for longer than session_ttl.
+
+        Runs at most every few minutes unless forced, so it can be called
+        whenever a session is created.
+
+        Returns:
+            int: Number of sessions removed
+        """
+        now = time.time()
+        if not force and now - self._last_cleanup < _CLEANUP_INTERVAL:
+            return 0
+        self._last_cleanup = now
+        removed = 0
+        for upload_id in os.listdir(self.sessions_folder):
+            session_dir = os.path.join(self.sessions_folder, upload_id)
+            if not os.path.isdir(session_dir) or now - self._last_activity(session_dir) < self.session_ttl:
+                continue
+            shutil.rmtree(session_dir, ignore_errors=True)
+            removed += 1
+        if removed:
+            logger.info("Removed %s expired upload sessions", removed)
+        return removed
+
+    def create(self, filename, size):
+        """
+        Start an upload session.
+
+        Args:
+            filename (str): Name of the file, already made safe by the caller
+            size (int): Total size of the file in bytes
+
+        Returns:
+            dict: Session status, including the chunk size and chunk count
+
+        Raises:
+            ValueError: If the size is not a positive integer, is above
+                max_size, or the space for the file cannot be reserved
+        """
+        if isinstance(size, bool) or not isinstance(size, int) or size < 1:
+            raise ValueError("Upload size must be a positive integer")
+        if size > self.max_size:
+            raise ValueError(f"Upload size must be at most {self.max_size} bytes")
+        self.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        session_dir = os.path.join(self.sessions_folder, upload_id)
+        os.makedirs(os.path.join(session_dir, 'chunks'))
+        try:
+            # Chunks are written in place at their offsets, in whatever order they arrive
+            with open(os.path.join(session_dir, 'data.part'), 'wb') as f:
+                f.truncate(size)
+        except OSError as e:
+            shutil.rmtree(session_dir, ignore_errors=True)
+            logger.warning("Could not reserve %s bytes for %s: %s", size, filename, e)
+            raise ValueError(f"Cannot store an upload of {size} bytes: {e.strerror or e}")
+
+        status = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "chunk_count": -(-size // self.chunk_size),
+            "status": "receiving",
+            "content_hash": None,
+            "deduplicated": False,
+            "dataset_id": None,
+            "error": None,
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None
+        }
+        _write_json(os.path.join(session_dir, 'status.json'), status)
+        logger.info("Started upload %s for %s (%s bytes in %s chunks)",
+                    upload_id, filename, size, status['chunk_count'])
+        return status
+
+    def get_status(self, upload_id):
+        """
+        Return the status of a session, with the chunks still missing.
+
+        Returns:
+            dict: Session status, or None if the upload is unknown
+        """
+        session_dir = self._session_dir(upload_id)
+        if session_dir is None:
+            return None
+        status = _read_json(os.path.join(session_dir, 'status.json'))
+        if status['status'] == 'receiving':
+            received = self._chunk_digests(session_dir)
+            status['received_chunks'] = len(received)
+            status['missing_chunks'] = [i for i in range(status['chunk_count']) if i not in received]
+        return status
+
+    def write_chunk(self, upload_id, index, stream, length=None):
+        """
+        Stream one chunk to disk, hashing it as it is written.
+
+        Re-sending a chunk overwrites it, so a chunk whose request failed
+        can simply be retried. The chunk that completes the upload starts
+        its conversion.
+
+        Args:
+            upload_id (str): Session id
+            index (int): Chunk number, from 0
+            stream: File-like object with the chunk's bytes
+            length (int, optional): Declared length of the chunk
+
+        Returns:
+            dict: Session status, or None if the upload is unknown
+
+        Raises:
+            ValueError: If the index is out of range, the session no longer
+                accepts chunks, or the chunk has the wrong length
+        """
+        session_dir = self._session_dir(upload_id)
+        if session_dir is None:
+            return None
+        status = _read_json(os.path.join(session_dir, 'status.json'))
+        if status['status'] != 'receiving':
+            raise ValueError(f"Upload {upload_id} is {status['status']} and accepts no more chunks")
+        if not 0 <= index < status['chunk_count']:
+            raise ValueError(f"Chunk index must be between 0 and {status['chunk_count'] - 1}")
+
+        offset = index * self.chunk_size
+        expected = min(self.chunk_size, status['size'] - offset)
+        if length is not None and length != expected:
+            raise ValueError(f"Chunk {index} must be {expected} bytes, got {length}")
+
+        digest_path = os.path.join(session_dir, 'chunks', f"{index}.sha256")
+        if os.path.exists(digest_path):
+            os.remove(digest_path)
+
+        digest = hashlib.sha256()
+        written = 0
+        with span('upload_chunk') as stage, open(os.path.join(session_dir, 'data.part'), 'r+b') as f:
+            f.seek(offset)
+            while written < expected:
+                block = stream.read(min(_STREAM_BLOCK_SIZE, expected - written))
+                if not block:
+                    break
+                f.write(block)
+                digest.update(block)
+                written += len(block)
+            stage.bytes_read = written
+        if written != expected or stream.read(1):
+            raise ValueError(f"Chunk {index} must be {expected} bytes")
+
+        # The digest file marks the chunk as received, so it is written last
+        tmp_path = f"{digest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(digest.hexdigest())
+        os.replace(tmp_path, digest_path)
+
+        status = self.get_status(upload_id)
+        if not status['missing_chunks']:
+            self.finalize(upload_id)
+            status = self.get_status(upload_id)
+        return status
+
+    def finalize(self, upload_id):
+        """
+        Start converting a fully received upload, unless that has begun already.
+
+        Only one web worker starts the conversion; the others report the
+        status it writes. Conversion runs in the background, so callers poll
+        get_status until the status is completed or failed. A conversion
+        that has not finished within convert_timeout is started again.
+
+        Returns:
+            dict: Session status, or None if the upload is unknown
+
+        Raises:
+            ValueError: If chunks are still missing
+        """
+        status = self.get_status(upload_id)
+        if status is None:
+            return None
+        session_dir = self._session_dir(upload_id)
+        marker = os.path.join(session_dir, 'finalizing')
+        if status['status'] == 'converting':
+            if not self._reclaim_marker(marker):
+                return status
+            logger.warning("Conversion of upload %s did not finish within %ss, restarting it",
+                           upload_id, self.convert_timeout)
+            self._get_executor().submit(contextvars.copy_context().run, self._convert, session_dir)
+            return status
+        if status['status'] != 'receiving':
+            return status
+        if status['missing_chunks']:
+            raise ValueError(f"Upload {upload_id} is missing {len(status['missing_chunks'])} chunks")
+
+        try:
+            # Creating the marker is atomic, so exactly one caller wins
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            return status
+
+        digests = self._chunk_digests(session_dir)
+        content_hash = combine_chunk_digests([digests[i] for i in range(status['chunk_count'])])
+        status = self._update_status(session_dir, status='converting', content_hash=content_hash)
+        self._get_executor().submit(contextvars.copy_context().run, self._convert, session_dir)
+        return status
+
+    def _reclaim_marker(self, marker):
+        """
+        Take over the finalizing marker of a conversion older than convert_timeout.
+
+        Renaming the stale marker away is atomic, so only one caller gets
+        to create the fresh one and restart the conversion.
+        """
+        try:
+            if time.time() - os.stat(marker).st_mtime < self.convert_timeout:
+                return False
+            os.rename(marker, f"{marker}.{uuid.uuid4().hex[:8]}.stale")
+        except OSError:
+            return False
+        for name in os.listdir(os.path.dirname(marker)):
+            if name.endswith('.stale'):
+                os.remove(os.path.join(os.path.dirname(marker), name))
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            return False
+        return True
+
+    def _convert(self, session_dir):
+        """Run _convert_upload, holding an admission slot when admission control is set up"""
+        if self.admission is None:
+            return self._convert_upload(session_dir)
+        with self.admission.hold():
+            return self._convert_upload(session_dir)
+
+    def _convert_upload(self, session_dir):
+        """Reuse or convert a received upload, then record the outcome in its status"""
+        status = _read_json(os.path.join(session_dir, 'status.json'))
+        upload_id, filename = status['upload_id'], status['filename']
+        data_path = os.path.join(session_dir, 'data.part')
+        try:
+            source_key = _source_key(status['content_hash'])
+            entry = self.catalog.find_by_source_hash(source_key)
+            if entry is not None:
+                logger.info("Upload %s duplicates %s, reusing its Parquet file", upload_id, entry['parquet_path'])
+                os.remove(data_path)
+                self._update_status(session_dir, status='completed', deduplicated=True,
+                                    dataset_id=entry['id'], finished_at=datetime.now().isoformat())
+                return
+
+            # The received data stays in the session until the conversion is
+            # recorded, so a conversion cut short can be restarted from it.
+            # The CSV is named after the session, so it never replaces a file
+            # of the same name that another upload or catalog entry uses;
+            # only a copy left by an earlier run of this conversion is removed.
+            csv_path = os.path.join(self.upload_folder, f"{upload_id}_{filename}")
+            if os.path.exists(csv_path):
+                os.remove(csv_path)
+            try:
+                os.link(data_path, csv_path)
+            except OSError:
+                shutil.copyfile(data_path, csv_path)
+            parquet_path, ingest_stats = process_csv_with_stats(csv_path)
+            entry = self.catalog.register(parquet_path, name=filename, original_path=csv_path,
+                                          ingest_stats=ingest_stats)
+            self.catalog.record_source(source_key, parquet_path, entry['content_hash'])
+            self._update_status(session_dir, status='completed', dataset_id=entry['id'],
+                                finished_at=datetime.now().isoformat())
+            os.remove(data_path)
+            logger.info("Upload %s converted to %s", upload_id, parquet_path)
+        except Exception as e:
+            logger.error("Upload %s failed: %s", upload_id, e, exc_info=True)
+            self._update_status(session_dir, status='failed', error=str(e),
+                                finished_at=datetime.now().isoformat())
+            if os.path.exists(data_path):
+                os.remove(data_path)
+        finally:
+            shutil.rmtree(os.path.join(session_dir, 'chunks'), ignore_errors=True)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def init_upload_sessions(app):
+    """Create the resumable upload manager for the app and register it as an extension"""
+    manager = UploadSessionManager(
+        app.config['UPLOAD_SESSIONS_FOLDER'],
+        app.config['UPLOAD_FOLDER'],
+        app.extensions['catalog'],
+        chunk_size=app.config['UPLOAD_CHUNK_SIZE'],
+        max_workers=app.config['UPLOAD_WORKERS'],
+        max_size=app.config['UPLOAD_MAX_SIZE'],
+        session_ttl=app.config['UPLOAD_SESSION_TTL'],
+        convert_timeout=app.config['UPLOAD_CONVERT_TIMEOUT'],
+        admission=app.extensions.get('admission_controller')
+    )
+    app.extensions['upload_sessions'] = manager
+    return manager
@@ -0,0 +1,47 @@
+import polars as pl
+import pytest
+
+from services.optimization_service import build_optimization_plan
+from services.scenario_service import expand_grid, run_scenario_sweep
+
+# Edge cases the two evaluations of the model have disagreed on: zero unit
+# cost, 0/0 and x/0 stock reductions, missing inputs, integer and missing
+# measured standard deviations, Int32 overflow and rounding of halves
+INVENTORY = {
+    'product_id': ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I'],
+    'name': ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i'],
+    'current_stock': [150, 300, 0, 0, 120, None, 80, 10, 5000],
+    'unit_cost': [20.5, 0.0, 12.0, 12.0, 8.45, 3.0, 1.0, 1e-12, 2.0],
+    'lead_time_days': [5, 7, 3, 4, 10, 4, 2, 3, 9],
+    'daily_demand': [12.0, 25.0, 0.0, 5.0, None, 30.0, 0.125, 4e9, 2.5],
+    'demand_std_dev': [3, None, 0, None, 2, None, None, 1, 0],
+}
+
+
+@pytest.mark.parametrize('std_dev', [True, False])
+def test_scenario_sweep_matches_optimization(tmp_path, std_dev):
+    """Every scenario of the sweep gives the optimization query's results"""
+    inventory = pl.DataFrame(INVENTORY)
+    if not std_dev:
+        inventory = inventory.drop('demand_std_dev')
+    input_path = str(tmp_path / 'inventory.parquet')
+    inventory.write_parquet(input_path)
+    detail_path = str(tmp_path / 'detail.parquet')
+
+    scenarios = expand_grid({'ordering_cost': [25, 40.5], 'holding_cost_pct': [0.25, 0.1],
+                             'safety_factor': [1.65, 1.96, 2.33]})
+    run_scenario_sweep([input_path], scenarios, detail_path=detail_path)
+    detail = pl.read_parquet(detail_path)
+
+    columns = ['optimal_stock', 'reorder_point', 'economic_order_qty', 'cost_savings', 'stock_reduction_pct']
+    for scenario_id, params in enumerate(scenarios):
+        expected = build_optimization_plan(inventory.lazy(), params).collect().select(columns)
+        actual = detail.filter(pl.col('scenario_id') == scenario_id).select(columns)
+        for name in columns:
+            assert actual[name].cast(pl.Float64).to_list() == expected[name].cast(pl.Float64).to_list(), \
+                f"{name} differs in scenario {params}"
+
+
+def test_expand_grid_rejects_non_dict():
+    with pytest.raises(ValueError):
+        expand_grid([1.65, 1.96])
@@ -1,139 +1,428 @@
+import io
 import os
+import csv
+import time
+import uuid
 import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime
+from utils.dataset_loader import scan_dataset, INTEGER_TYPES
+from utils.instrumentation import span, file_sizes
 
 # Configure logging
 logger = logging.getLogger('inventory_optimizer_data_processor')
 
-def process_csv(csv_path):
+# How converted uploads are laid out on disk. zstd level 3 compresses about
+# as well as higher levels at a fraction of the write time, and row groups of
+# 256k rows keep whole-column scans fast while giving the reader several
+# groups to decode in parallel on large files.
+STORAGE_PROFILE = {
+    'compression': 'zstd',
+    'compression_level': 3,
+    'row_group_rows': 256 * 1024,
+    'downcast_integers': True
+}
+
+# Signed integer types tried when downcasting, smallest first. Unsigned types
+# are never used so that differences such as stock minus optimal stock stay signed.
+_DOWNCAST_TYPES = [
+    (pa.int8(), -2 ** 7, 2 ** 7 - 1),
+    (pa.int16(), -2 ** 15, 2 ** 15 - 1),
+    (pa.int32(), -2 ** 31, 2 ** 31 - 1)
+]
+
+# Columns whose empty values stay null at ingest: the model tells a missing
+# value apart from zero and falls back to its own estimate
+NULLABLE_COLUMNS = {'demand_std_dev'}
+
+# Bump when the conversion rules change, so a CSV converted under the old
+# rules is converted again instead of being deduplicated to its old Parquet file
+CONVERSION_VERSION = 2
+
+def standardize_column_name(col):
+    """Convert a column name to lowercase and replace spaces with underscores"""
+    return col.lower().replace(' ', '_')
+
+def build_null_fill_exprs(schema):
+    """
+    Build one null-fill expression per column based on its data type.
+    
+    Columns in NULLABLE_COLUMNS are left as they are.
+    
+    Args:
+        schema (dict): Mapping of column name to Polars data type
+        
+    Returns:
+        list: Expressions filling nulls in every column that has a fill rule
+    """
+    exprs = []
+    for col, col_type in schema.items():
+        if col in NULLABLE_COLUMNS:
+            continue
+        if col_type in [pl.Float32, pl.Float64]:
+            exprs.append(pl.col(col).fill_null(0.0))
+        elif col_type in [pl.Int8, pl.Int16, pl.Int32, pl.Int64, pl.UInt8, pl.UInt16, pl.UInt32, pl.UInt64]:
+            exprs.append(pl.col(col).fill_null(0))
+        elif col_type == pl.Boolean:
+            exprs.append(pl.col(col).fill_null(False))
+        elif col_type == pl.Utf8:
+            exprs.append(pl.col(col).fill_null(""))
+        elif col_type == pl.Date:
+            exprs.append(pl.col(col).fill_null(datetime.now().date()))
+        elif col_type == pl.Datetime:
+            exprs.append(pl.col(col).fill_null(datetime.now()))
+    return exprs
+
+def _downcast_schema(parquet_path, schema):
+    """
+    Pick the smallest signed integer type that holds every value of each integer column.
+
+    Args:
+        parquet_path (str): Parquet file to measure
+        schema (pa.Schema): Its Arrow schema
+
+    Returns:
+        tuple: (target pa.Schema, dict of column name to 'old -> new' type for changed columns)
+    """
+    polars_schema = pl.read_parquet_schema(parquet_path)
+    int_columns = [col for col, dtype in polars_schema.items() if dtype in INTEGER_TYPES and dtype != pl.UInt64]
+    if not int_columns:
+        return schema, {}
+    ranges = pl.scan_parquet(parquet_path).select(
+        [pl.col(col).min().alias(f"{col}__min") for col in int_columns] +
+        [pl.col(col).max().alias(f"{col}__max") for col in int_columns]
+    ).collect().row(0, named=True)
+
+    fields = []
+    changes = {}
+    for field in schema:
+        new_type = field.type
+        low, high = ranges.get(f"{field.name}__min"), ranges.get(f"{field.name}__max")
+        if field.name in int_columns and low is not None:
+            for candidate, type_min, type_max in _DOWNCAST_TYPES:
+                if type_min <= low and high <= type_max:
+                    if candidate.bit_width < field.type.bit_width:
+                        new_type = candidate
+                    break
+        if new_type != field.type:
+            changes[field.name] = f"{field.type} -> {new_type}"
+        fields.append(pa.field(field.name, new_type, field.nullable))
+    return pa.schema(fields), changes
+
+def write_compact_parquet(source_path, parquet_path, profile=STORAGE_PROFILE):
+    """
+    Rewrite a Parquet file using a storage profile.
+
+    Integer columns are narrowed to the smallest type holding their values,
+    and the file is written with the profile's codec, level and row-group
+    size, plus min/max statistics. Columns are dictionary encoded where that
+    pays, as pyarrow does by default; it falls back to plain encoding for
+    columns with too many distinct values. The Arrow schema is not stored in
+    the footer: the Parquet types already describe every column, and small
+    files would otherwise grow by it. The source is streamed one row group
+    at a time, so memory stays bounded by the row-group size.
+
+    Args:
+        source_path (str): Parquet file to rewrite
+        parquet_path (str): Output path
+        profile (dict): Storage settings, see STORAGE_PROFILE
+
+    Returns:
+        dict: Sizes before and after, the type changes made and the layout written
+    """
+    source = pq.ParquetFile(source_path)
+    schema = source.schema_arrow
+    changes = {}
+    if profile.get('downcast_integers'):
+        schema, changes = _downcast_schema(source_path, schema)
+
+    row_group_rows = profile['row_group_rows']
+    with pq.ParquetWriter(parquet_path, schema, compression=profile['compression'],
+                          compression_level=profile.get('compression_level'),
+                          write_statistics=True, store_schema=False) as writer:
+        for batch in source.iter_batches(batch_size=row_group_rows):
+            writer.write_table(pa.Table.from_batches([batch]).cast(schema), row_group_size=row_group_rows)
+
+    before, after = os.path.getsize(source_path), os.path.getsize(parquet_path)
+    return {
+        "bytes_before": before,
+        "bytes_after": after,
+        "size_ratio": round(after / before, 3) if before else None,
+        "downcast": changes,
+        "compression": f"{profile['compression']}({profile.get('compression_level')})",
+        "row_groups": pq.read_metadata(parquet_path).num_row_groups
+    }
+
+def measure_scan(parquet_path):
+    """
+    Time a full read of every column of a Parquet file.
+    
+    This reads the whole file and is meant for benchmarks, not for the
+    ingestion path. The row count comes from the footer.
+    """
+    rows = pq.read_metadata(parquet_path).num_rows
+    start_time = time.perf_counter()
+    pl.read_parquet(parquet_path)
+    elapsed = time.perf_counter() - start_time
+    return {
+        "scan_seconds": round(elapsed, 4),
+        "scan_rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None
+    }
+
+def ingest_csv(csv_path, parquet_path, streaming=True, profile=STORAGE_PROFILE):
+    """
+    Convert a CSV file to Parquet in a single fused pass.
+    
+    The CSV is scanned lazily, column names are standardized as part of the
+    scan and all null-fill rules are applied in one projection. In streaming
+    mode the result is sunk straight to Parquet, so memory use stays constant
+    regardless of the file size. With a storage profile, that file is then
+    rewritten compactly (see write_compact_parquet) and the rewrite is
+    reported.
+    
+    Args:
+        csv_path (str): Path to the CSV file
+        parquet_path (str): Path where the Parquet file is written
+        streaming (bool): Use the streaming engine instead of materializing the
+            whole file in memory
+        profile (dict, optional): Storage settings, see STORAGE_PROFILE; None
+            keeps the types and settings of the direct conversion
+        
+    Returns:
+        dict: Ingestion statistics (rows, bytes read, elapsed seconds, rows/sec,
+            and the storage report when a profile is used)
+    """
+    start_time = time.perf_counter()
+    raw_path = f"{parquet_path}.raw" if profile else parquet_path
+    
+    with span('csv_ingest', bytes_read=os.path.getsize(csv_path)) as stage:
+        lf = pl.scan_csv(csv_path, with_column_names=lambda cols: [standardize_column_name(c) for c in cols])
+        lf = lf.with_columns(build_null_fill_exprs(lf.schema))
+        
+        if streaming:
+            try:
+                lf.sink_parquet(raw_path)
+            except Exception as e:
+                # Not every plan is supported by the streaming sink yet; fall back to
+                # streaming collection, which still avoids per-column copies
+                logger.warning("Streaming sink unavailable, collecting in streaming mode: %s", e)
+                lf.collect(streaming=True).write_parquet(raw_path)
+        else:
+            lf.collect().write_parquet(raw_path)
+        
+        storage = None
+        if profile:
+            try:
+                storage = write_compact_parquet(raw_path, parquet_path, profile)
+                storage['layout'] = 'compact'
+                if storage['bytes_after'] >= storage['bytes_before']:
+                    # Footers and statistics outweigh the savings on small files,
+                    # so the direct conversion is kept when the rewrite is no smaller
+                    os.replace(raw_path, parquet_path)
+                    storage.update(layout='original', bytes_after=storage['bytes_before'], size_ratio=1.0,
+                                   downcast={}, compression=None,
+                                   row_groups=pq.read_metadata(parquet_path).num_row_groups)
+            finally:
+                if os.path.exists(raw_path):
+                    os.remove(raw_path)
+        
+        elapsed = time.perf_counter() - start_time
+        # Row count comes from the Parquet footer, not from re-reading the data
+        rows = pl.scan_parquet(parquet_path).select(pl.count()).collect().item()
+        stage.rows = rows
+    stats = {
+        "rows": rows,
+        "bytes_read": os.path.getsize(csv_path),
+        "seconds": round(elapsed, 4),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None
+    }
+    if storage is not None:
+        stats['storage'] = storage
+        logger.info("Stored %s in the %s layout as %s bytes (%s of the default layout), downcast %s",
+                    parquet_path, storage['layout'], storage['bytes_after'], storage['size_ratio'],
+                    storage['downcast'])
+    logger.info("Ingested %s rows from %s in %.3fs (%s rows/sec)", rows, csv_path, elapsed, stats['rows_per_sec'])
+    return stats
+
+def process_csv(csv_path, streaming=True):
     """
     Process a CSV file and convert it to Parquet format for more efficient processing.
     
     Args:
         csv_path (str): Path to the CSV file
+        streaming (bool): Convert with the constant-memory streaming engine
         
     Returns:
         str: Path to the generated Parquet file
     """
-    logger.info(f"Processing CSV file: {csv_path}")
+    return process_csv_with_stats(csv_path, streaming=streaming)[0]
+
+def process_csv_with_stats(csv_path, streaming=True):
+    """
+    Convert a CSV file to Parquet and also return the ingestion statistics.
+    
+    Args:
+        csv_path (str): Path to the CSV file
+        streaming (bool): Convert with the constant-memory streaming engine
+        
+    Returns:
+        tuple: (path to the generated Parquet file, ingestion statistics dict)
+    """
+    logger.info("Processing CSV file: %s", csv_path)
     try:
         # Get filename without extension
         base_name = os.path.splitext(os.path.basename(csv_path))[0]
         
-        # Generate parquet filename with timestamp
+        # Generate parquet filename with timestamp; the random suffix keeps two
+        # uploads of the same name within one second from sharing a file
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        parquet_filename = f"{base_name}_{timestamp}.parquet"
+        parquet_filename = f"{base_name}_{timestamp}_{uuid.uuid4().hex[:8]}.parquet"
         
         # Define parquet path in same directory as CSV
         uploads_dir = os.path.dirname(csv_path)
         parquet_path = os.path.join(uploads_dir, parquet_filename)
-        logger.debug(f"Parquet output path: {parquet_path}")
-        
-        # Read CSV with Polars
-        logger.debug(f"Reading CSV file with Polars")
-        df = pl.read_csv(csv_path)
-        logger.info(f"CSV file read successfully. Shape: {df.shape}, Columns: {df.columns}")
+        logger.debug("Parquet output path: %s", parquet_path)
         
-        # Perform basic cleaning
-        # 1. Convert column names to lowercase and replace spaces with underscores
-        logger.debug("Converting column names to lowercase and replacing spaces with underscores")
-        new_columns = {col: col.lower().replace(' ', '_') for col in df.columns}
-        df = df.rename(new_columns)
-        logger.debug(f"New columns: {df.columns}")
+        stats = ingest_csv(csv_path, parquet_path, streaming=streaming)
+        logger.info("Parquet file created successfully")
         
-        # 2. Handle missing values based on column type
-        logger.debug("Handling missing values based on column type")
-        for col in df.columns:
-            col_type = df[col].dtype
-            logger.debug(f"Processing column {col} with type {col_type}")
-            
-            if pl.Float32 == col_type or pl.Float64 == col_type:
-                logger.debug(f"Filling null values with 0.0 in float column {col}")
-                df = df.with_columns(pl.col(col).fill_null(0.0))
-            elif col_type in [pl.Int8, pl.Int16, pl.Int32, pl.Int64, pl.UInt8, pl.UInt16, pl.UInt32, pl.UInt64]:
-                logger.debug(f"Filling null values with 0 in integer column {col}")
-                df = df.with_columns(pl.col(col).fill_null(0))
-            elif col_type == pl.Boolean:
-                logger.debug(f"Filling null values with False in boolean column {col}")
-                df = df.with_columns(pl.col(col).fill_null(False))
-            elif col_type == pl.Utf8:
-                logger.debug(f"Filling null values with empty string in string column {col}")
-                df = df.with_columns(pl.col(col).fill_null(""))
-            elif col_type == pl.Date:
-                logger.debug(f"Filling null values with current date in date column {col}")
-                df = df.with_columns(pl.col(col).fill_null(datetime.now().date()))
-            elif col_type == pl.Datetime:
-                logger.debug(f"Filling null values with current datetime in datetime column {col}")
-                df = df.with_columns(pl.col(col).fill_null(datetime.now()))
-        
-        # Write to Parquet format
-        logger.info(f"Writing cleaned data to Parquet file: {parquet_path}")
-        df.write_parquet(parquet_path)
-        logger.info(f"Parquet file created successfully")
-        
-        return parquet_path
+        return parquet_path, stats
     
     except Exception as e:
-        logger.error(f"Error processing CSV file: {str(e)}", exc_info=True)
+        logger.error("Error processing CSV file: %s", e, exc_info=True)
         raise Exception(f"Error processing CSV file: {str(e)}")
 
+def default_conversion_workers():
+    """
+    Number of files converted at once when no limit is configured.
+
+    Conversions run on threads that all feed Polars' one global thread pool,
+    so extra workers never add Polars threads; they overlap the parts of a
+    conversion that run outside it (CSV parsing setup, the row-group rewrite,
+    hashing and cataloguing). A quarter of the pool, at least one and at most
+    four, keeps those parts from competing with the pool for cores.
+    """
+    return max(1, min(4, pl.threadpool_size() // 4))
+
+def process_csv_files(csv_paths, max_workers=None, on_converted=None, streaming=True):
+    """
+    Convert several CSV files to Parquet concurrently, one process_csv per file.
+
+    Files are converted on a bounded thread pool. Each task runs in a copy of
+    the caller's context, so log records keep the request ID and stage
+    timings still reach the request's Server-Timing header. A failing file
+    does not stop the others; its error is reported in its own result.
+
+    Args:
+        csv_paths (list): CSV files to convert
+        max_workers (int, optional): Files converted at once, see
+            default_conversion_workers
+        on_converted (callable, optional): Called on the worker thread as
+            on_converted(csv_path, parquet_path, ingest_stats) once a file is
+            converted; its return value is stored under 'result'
+        streaming (bool): Convert with the constant-memory streaming engine
+
+    Returns:
+        list: One dict per input, in input order, with csv_path, parquet_path,
+            ingest_stats, result and error (None when the file succeeded)
+    """
+    def convert(csv_path):
+        outcome = {"csv_path": csv_path, "parquet_path": None, "ingest_stats": None,
+                   "result": None, "error": None}
+        try:
+            parquet_path, ingest_stats = process_csv_with_stats(csv_path, streaming=streaming)
+            outcome.update(parquet_path=parquet_path, ingest_stats=ingest_stats)
+            if on_converted is not None:
+                outcome['result'] = on_converted(csv_path, parquet_path, ingest_stats)
+        except Exception as e:
+            # process_csv_with_stats has already logged the traceback
+            logger.error("Error converting %s: %s", csv_path, e)
+            outcome['error'] = str(e)
+        return outcome
+
+    if not csv_paths:
+        return []
+    workers = min(len(csv_paths), max_workers or default_conversion_workers())
+    if workers == 1:
+        return [convert(path) for path in csv_paths]
+
+    logger.info("Converting %s files with %s workers", len(csv_paths), workers)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='csv-convert') as executor:
+        futures = [executor.submit(contextvars.copy_context().run, convert, path) for path in csv_paths]
+        return [future.result() for future in futures]
+
 def format_output(df, output_path):
     """
     Format the optimization results dataframe and save it as CSV.
     
+    Column names are written in display form (``cost_savings`` becomes
+    ``Cost Savings``) as a header line of their own, so the results are
+    written as they are instead of through a renamed copy of the frame.
+    
+    The CSV is written to a temporary file and moved into place, so a
+    download or a concurrent request for the same output never sees a
+    partially written file.
+    
     Args:
         df (pl.DataFrame): Dataframe containing optimization results
         output_path (str): Path where to save the formatted output CSV
     """
-    logger.info(f"Formatting output dataframe. Shape: {df.shape}")
+    logger.info("Formatting output dataframe. Shape: %s", df.shape)
     try:
-        # Ensure all column names are standardized
-        logger.debug("Standardizing column names")
-        new_columns = {col: col.lower().replace('_', ' ').title() for col in df.columns}
-        df = df.rename(new_columns)
-        logger.debug(f"Standardized columns: {df.columns}")
+        header = io.StringIO()
+        csv.writer(header, lineterminator='\n').writerow(
+            [col.lower().replace('_', ' ').title() for col in df.columns])
+        logger.debug("Output header: %s", header.getvalue().strip())
         
         # Write to CSV
-        logger.info(f"Writing to CSV file: {output_path}")
-        df.write_csv(output_path)
-        logger.info(f"CSV file created successfully")
+        logger.info("Writing to CSV file: %s", output_path)
+        tmp_path = f"{output_path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with span('format_output', rows=len(df)), open(tmp_path, 'wb') as f:
+                f.write(header.getvalue().encode())
+                df.write_csv(f, has_header=False)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logger.info("CSV file created successfully")
         
         return output_path
     
     except Exception as e:
-        logger.error(f"Error formatting output: {str(e)}", exc_info=True)
+        logger.error("Error formatting output: %s", e, exc_info=True)
         raise Exception(f"Error formatting output: {str(e)}")
 
-def combine_dataframes(file_paths):
+def combine_dataframes(file_paths, how='concat', columns=None):
     """
     Combine multiple parquet files into a single dataframe, handling schema differences.
     
     Args:
         file_paths (list): List of parquet file paths to combine
+        how (str): 'concat' to stack the files, 'join' to join them on product_id
+        columns (list, optional): Only read these columns from disk
         
     Returns:
         pl.DataFrame: Combined dataframe
     """
-    logger.info(f"Combining {len(file_paths)} dataframes")
+    logger.info("Combining %s dataframes", len(file_paths))
     if not file_paths:
         logger.error("No file paths provided")
         raise ValueError("No file paths provided")
     
-    # Read each parquet file
-    logger.debug(f"Reading parquet files: {file_paths}")
-    dataframes = []
-    for path in file_paths:
-        logger.debug(f"Reading parquet file: {path}")
-        try:
-            df = pl.read_parquet(path)
-            logger.debug(f"Read parquet file {path}. Shape: {df.shape}, Columns: {df.columns}")
-            dataframes.append(df)
-        except Exception as e:
-            logger.error(f"Error reading parquet file {path}: {str(e)}", exc_info=True)
-            raise Exception(f"Error reading parquet file {path}: {str(e)}")
+    try:
+        with span('combine', bytes_read=file_sizes(file_paths)) as stage:
+            df = scan_dataset(file_paths, how=how, columns=columns).collect()
+            stage.rows = len(df)
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error("Error reading parquet files %s: %s", file_paths, e, exc_info=True)
+        raise Exception(f"Error reading parquet files {file_paths}: {str(e)}")
     
-    # For simplicity in this example, we'll just return the first dataframe
-    # In a real application, you would handle schema differences and perform a proper merge
-    logger.info(f"Returning first dataframe with shape {dataframes[0].shape}")
-    return dataframes[0] 
\ No newline at end of file
+    logger.info("Combined dataframe shape: %s", df.shape)
+    return df
@@ -0,0 +1,134 @@
+import logging
+import polars as pl
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_dataset_loader')
+
+COMBINE_MODES = ('concat', 'join')
+
+INTEGER_TYPES = [pl.Int8, pl.Int16, pl.Int32, pl.Int64, pl.UInt8, pl.UInt16, pl.UInt32, pl.UInt64]
+FLOAT_TYPES = [pl.Float32, pl.Float64]
+
+# Integer types uploads may be narrowed to on disk; they are widened again when scanned
+NARROW_INTEGER_TYPES = [pl.Int8, pl.Int16, pl.Int32]
+
+def _common_type(dtypes):
+    """
+    Pick a single data type that every dtype in the list can be cast to.
+
+    Integers widen to Int64, mixed integers and floats widen to Float64 and
+    anything else falls back to Utf8. Narrow signed integers always widen to
+    Int64, so arithmetic on compactly stored columns cannot overflow.
+    """
+    unique = {pl.Int64 if dtype in NARROW_INTEGER_TYPES else dtype for dtype in dtypes}
+    if len(unique) == 1:
+        return unique.pop()
+    if all(dtype in INTEGER_TYPES for dtype in unique):
+        return pl.Int64
+    if all(dtype in INTEGER_TYPES or dtype in FLOAT_TYPES for dtype in unique):
+        return pl.Float64
+    return pl.Utf8
+
+def unify_schemas(schemas, columns=None):
+    """
+    Build one schema covering the columns of every file.
+
+    Args:
+        schemas (list): One {column: dtype} mapping per file
+        columns (list, optional): Restrict the result to these columns
+
+    Returns:
+        dict: Column name to unified data type, in first-seen column order
+    """
+    seen = {}
+    for schema in schemas:
+        for col, dtype in schema.items():
+            if columns is not None and col not in columns:
+                continue
+            seen.setdefault(col, []).append(dtype)
+    return {col: _common_type(dtypes) for col, dtypes in seen.items()}
+
+def conform_to_schema(lf, schema, target):
+    """Project a scan onto the target schema, casting types and filling missing columns"""
+    exprs = []
+    for col, dtype in target.items():
+        if col not in schema:
+            exprs.append(pl.lit(None).cast(dtype).alias(col))
+        elif schema[col] != dtype:
+            exprs.append(pl.col(col).cast(dtype))
+        else:
+            exprs.append(pl.col(col))
+    return lf.select(exprs)
+
+def scan_dataset(file_paths, how='concat', key='product_id', columns=None, predicate=None):
+    """
+    Lazily scan several Parquet files as one dataset.
+
+    Only the Parquet footers are read here; data is read when the returned
+    LazyFrame is collected, and only for the requested columns and the rows
+    that pass ``predicate``.
+
+    Args:
+        file_paths (list): Parquet files to scan
+        how (str): 'concat' stacks the files row-wise, 'join' left-joins every
+            file onto the first one on ``key`` (for example stock + cost + demand)
+        key (str): Join key used when how='join'
+        columns (list, optional): Columns to read; all columns when omitted
+        predicate (pl.Expr, optional): Row filter pushed down into the scans
+
+    Returns:
+        pl.LazyFrame: Combined dataset
+    """
+    if not file_paths:
+        logger.error("No file paths provided")
+        raise ValueError("No file paths provided")
+    if how not in COMBINE_MODES:
+        raise ValueError(f"Unknown combine mode '{how}', expected one of {COMBINE_MODES}")
+
+    scans = [pl.scan_parquet(path) for path in file_paths]
+    schemas = [scan.schema for scan in scans]
+    logger.debug("Scanning %s parquet files with mode '%s'", len(file_paths), how)
+
+    if how == 'concat':
+        target = unify_schemas(schemas, columns)
+        lf = pl.concat([conform_to_schema(scan, schema, target) for scan, schema in zip(scans, schemas)],
+                       how='vertical')
+    else:
+        lf = _join_scans(scans, schemas, key, columns)
+
+    if predicate is not None:
+        lf = lf.filter(predicate)
+    return lf
+
+def _join_scans(scans, schemas, key, columns):
+    """Left-join every scan onto the first on ``key``, coalescing shared columns"""
+    missing = [i for i, schema in enumerate(schemas) if key not in schema]
+    if missing:
+        raise ValueError(f"Join key '{key}' missing from files at positions {missing}")
+
+    # Keys are cast to a common type so e.g. an Int64 id in one file joins a Utf8 id in another
+    key_type = _common_type([schema[key] for schema in schemas])
+    target = unify_schemas(schemas, columns)
+
+    lf = None
+    current = set()
+    for i, (scan, schema) in enumerate(zip(scans, schemas)):
+        wanted = [col for col in schema if col != key and col in target]
+        projected = scan.select([pl.col(key).cast(key_type)] +
+                                [pl.col(col).cast(target[col]) for col in wanted])
+        if lf is None:
+            lf = projected
+            current.update(wanted)
+            continue
+
+        suffix = f"__file{i}"
+        lf = lf.join(projected, on=key, how='left', suffix=suffix)
+
+        # Columns already present keep their first non-null value across files
+        shared = [col for col in wanted if col in current]
+        if shared:
+            lf = lf.with_columns([
+                pl.coalesce([pl.col(col), pl.col(f"{col}{suffix}")]).alias(col) for col in shared
+            ]).drop([f"{col}{suffix}" for col in shared])
+        current.update(wanted)
+    return lf
@@ -0,0 +1,431 @@
+import os
+import sys
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_instrumentation')
+
+# Latency buckets in seconds, from sub-millisecond lookups to multi-minute optimizations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Memory buckets in bytes, 1 MB to 16 GB
+MEMORY_BUCKETS = tuple(2 ** n * 1024 * 1024 for n in range(0, 15))
+
+# Stages timed during the current request, reported in the Server-Timing header
+_request_stages = contextvars.ContextVar('request_stages', default=None)
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base for metrics keyed by a tuple of label values"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.extend(self._render_sample(labelvalues, value))
+        return lines
+
+    def _render_sample(self, labelvalues, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing total, such as bytes read or rows processed"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, such as in-flight requests"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observations in fixed cumulative buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def _render_sample(self, labelvalues, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            labels = _format_labels(self.labelnames, labelvalues, [('le', _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide collection of metrics rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """Render every metric, plus process memory, in the Prometheus text exposition format"""
+        current, peak = memory_usage()
+        PROCESS_RSS.set(current or 0)
+        PROCESS_PEAK_RSS.set(peak)
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'inventory_optimizer_stage_seconds', 'Time spent in each pipeline stage', ['stage'])
+STAGE_ROWS = REGISTRY.counter(
+    'inventory_optimizer_rows_processed_total', 'Rows processed by each pipeline stage', ['stage'])
+STAGE_BYTES_READ = REGISTRY.counter(
+    'inventory_optimizer_bytes_read_total', 'Bytes read from disk by each pipeline stage', ['stage'])
+STAGE_ERRORS = REGISTRY.counter(
+    'inventory_optimizer_stage_errors_total', 'Pipeline stages that raised an exception', ['stage'])
+HTTP_REQUESTS = REGISTRY.counter(
+    'inventory_optimizer_http_requests_total', 'HTTP requests handled', ['method', 'endpoint', 'status'])
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'inventory_optimizer_http_request_seconds', 'HTTP request latency', ['method', 'endpoint'])
+HTTP_REQUEST_PEAK_RSS = REGISTRY.histogram(
+    'inventory_optimizer_http_request_peak_rss_bytes',
+    'Peak resident memory of the worker while each request ran', ['endpoint'], buckets=MEMORY_BUCKETS)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'inventory_optimizer_http_requests_in_flight', 'HTTP requests currently being handled')
+PROCESS_RSS = REGISTRY.gauge(
+    'inventory_optimizer_process_resident_memory_bytes', 'Resident memory of this process')
+PROCESS_PEAK_RSS = REGISTRY.gauge(
+    'inventory_optimizer_process_peak_resident_memory_bytes', 'Peak resident memory of this process')
+
+
+# Highest kernel high-water mark seen before it was last reset, see PeakRssWindow
+_lifetime_peak_rss = 0
+_peak_rss_lock = threading.Lock()
+_open_peak_windows = []
+
+
+def _memory_status():
+    """Current (VmRSS) and high-water (VmHWM) resident bytes, read together, or None where unavailable"""
+    values = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    name, value = line.split(':', 1)
+                    values[name] = int(value.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    if len(values) != 2:
+        return None
+    return values['VmRSS'], values['VmHWM']
+
+
+def memory_usage():
+    """
+    Current and lifetime peak resident bytes of this process.
+
+    Both come from one read of /proc/self/status, so the peak is never
+    below the current value. Where that file is missing the current value
+    is None and the peak comes from getrusage.
+
+    Returns:
+        tuple: (current bytes or None, peak bytes)
+    """
+    status = _memory_status()
+    if status is not None:
+        return status[0], max(status[1], _lifetime_peak_rss)
+    try:
+        import resource
+    except ImportError:
+        return None, 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return None, peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss_bytes():
+    """Resident set size of this process right now, or None where unavailable"""
+    return memory_usage()[0]
+
+
+def peak_rss_bytes():
+    """High-water resident set size of this process over its lifetime"""
+    return memory_usage()[1]
+
+
+class PeakRssWindow:
+    """
+    Peak resident memory of the process from start() until stop().
+
+    The kernel keeps a single high-water mark per process, which can be
+    reset through /proc/self/clear_refs. Every start resets it, after
+    folding the mark reached so far into the lifetime peak and into every
+    window still open. Windows can therefore overlap, as concurrent
+    requests do, and each still sees the highest RSS reached while it was
+    open. Memory is measured per process, so a window's peak includes
+    whatever other threads allocated at the time.
+    """
+
+    def __init__(self):
+        self.peak = None
+
+    def start(self):
+        """Open the window; returns False where the mark cannot be reset, as outside Linux"""
+        global _lifetime_peak_rss
+        with _peak_rss_lock:
+            status = _memory_status()
+            if status is None:
+                return False
+            _lifetime_peak_rss = max(_lifetime_peak_rss, status[1])
+            for window in _open_peak_windows:
+                window.peak = max(window.peak, status[1])
+            try:
+                with open('/proc/self/clear_refs', 'w') as f:
+                    f.write('5')
+            except OSError:
+                return False
+            self.peak = status[0]
+            _open_peak_windows.append(self)
+        return True
+
+    def stop(self):
+        """Close the window and return its peak in bytes, or None if it never started"""
+        with _peak_rss_lock:
+            if self not in _open_peak_windows:
+                return None
+            _open_peak_windows.remove(self)
+            status = _memory_status()
+            if status is not None:
+                self.peak = max(self.peak, status[1])
+        return self.peak
+
+
+class Span:
+    """Timing of one pipeline stage; rows and bytes_read may be filled in while it runs"""
+
+    def __init__(self, stage, rows=None, bytes_read=None):
+        self.stage = stage
+        self.rows = rows
+        self.bytes_read = bytes_read
+        self.seconds = None
+
+
+@contextmanager
+def span(stage, rows=None, bytes_read=None):
+    """
+    Time a pipeline stage and record it in the stage metrics.
+
+    The yielded Span's rows and bytes_read can be set inside the block once
+    they are known. Inside a request the timing is also reported in the
+    response's Server-Timing header.
+
+    Args:
+        stage (str): Stage name, used as the metric label
+        rows (int, optional): Rows processed by the stage
+        bytes_read (int, optional): Bytes read from disk by the stage
+    """
+    current = Span(stage, rows, bytes_read)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        current.seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(current.seconds, stage=stage)
+        if current.rows:
+            STAGE_ROWS.inc(current.rows, stage=stage)
+        if current.bytes_read:
+            STAGE_BYTES_READ.inc(current.bytes_read, stage=stage)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((stage, current.seconds))
+
+
+def file_sizes(paths):
+    """Total size in bytes of the given files, skipping any that are missing"""
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+def _server_timing(stages, total_seconds):
+    """Format stage timings for the Server-Timing response header"""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ', '.join(entries)
+
+
+def init_instrumentation(app):
+    """
+    Record request metrics for the app and optionally profile slow requests.
+
+    Every request is counted and timed by endpoint, and its stage spans are
+    returned in a Server-Timing header. When PROFILE_SLOW_REQUEST_SECONDS is
+    set, requests run under cProfile and the first PROFILE_MAX_DUMPS requests
+    slower than the threshold are dumped to PROFILE_FOLDER as .prof files.
+    """
+    import cProfile
+    from flask import g, request
+    from flask.json.provider import DefaultJSONProvider
+
+    class InstrumentedJSONProvider(DefaultJSONProvider):
+        """Default JSON provider that times response serialization"""
+
+        def dumps(self, obj, **kwargs):
+            with span('json_serialize'):
+                return super().dumps(obj, **kwargs)
+
+    app.json_provider_class = InstrumentedJSONProvider
+    app.json = InstrumentedJSONProvider(app)
+
+    profile_threshold = app.config.get('PROFILE_SLOW_REQUEST_SECONDS')
+    profile_state = {"dumps": 0, "lock": threading.Lock()}
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_peak_rss = PeakRssWindow()
+        if not g.metrics_peak_rss.start():
+            g.metrics_peak_rss = None
+        g.metrics_stages_token = _request_stages.set([])
+        HTTP_IN_FLIGHT.inc()
+        g.profiler = None
+        if profile_threshold is not None and profile_state['dumps'] < app.config['PROFILE_MAX_DUMPS']:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                g.profiler = profiler
+            except ValueError:
+                # Another request in this process is already being profiled
+                pass
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+        HTTP_IN_FLIGHT.dec()
+        HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+        HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, endpoint=endpoint)
+        peak_window = g.pop('metrics_peak_rss', None)
+        if peak_window is not None:
+            HTTP_REQUEST_PEAK_RSS.observe(peak_window.stop(), endpoint=endpoint)
+        response.headers['Server-Timing'] = _server_timing(_request_stages.get() or [], elapsed)
+        _request_stages.reset(g.pop('metrics_stages_token'))
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if elapsed >= profile_threshold:
+                _dump_profile(app, profiler, profile_state, request.method, endpoint, elapsed)
+        return response
+
+
+def _dump_profile(app, profiler, profile_state, method, endpoint, elapsed):
+    """Write a slow request's profile, up to PROFILE_MAX_DUMPS per process"""
+    with profile_state['lock']:
+        if profile_state['dumps'] >= app.config['PROFILE_MAX_DUMPS']:
+            return
+        profile_state['dumps'] += 1
+    name = endpoint.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'root'
+    path = os.path.join(app.config['PROFILE_FOLDER'],
+                        f"profile_{time.strftime('%Y%m%d_%H%M%S')}_{method}_{name}.prof")
+    profiler.dump_stats(path)
+    logger.warning("Slow request %s %s took %.3fs; profile written to %s", method, endpoint, elapsed, path)
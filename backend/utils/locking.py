@@ -0,0 +1,30 @@
+import os
+import fcntl
+from contextlib import contextmanager
+
+# Name of the lock file kept in each locked directory
+LOCK_FILENAME = '.lock'
+
+
+@contextmanager
+def directory_lock(directory):
+    """
+    Hold an exclusive lock on a directory across threads and processes.
+
+    The lock is an flock on ``directory/.lock``, so writers in different
+    server workers (or a batch run next to the server) wait for each other.
+    Every acquisition opens the file anew, and flock locks belong to the open
+    file, so threads of one process exclude each other as well. The lock is
+    released when the holder exits or dies.
+
+    Args:
+        directory (str): Directory to lock, created if missing
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
@@ -0,0 +1,201 @@
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import uuid
+import atexit
+import logging
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Request ID of the request being handled, attached to every record it logs
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record):
+        payload = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, 'request_id', None),
+            "process": record.process,
+            "thread": record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exception'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request ID; runs in the emitting thread, where the request context is set"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class DebugRateLimitFilter(logging.Filter):
+    """
+    Rate-limit DEBUG records per call site.
+
+    Each source line may emit at most ``rate`` debug records per second, with
+    bursts up to ``rate`` (a token bucket). Dropped records are counted and
+    the next record let through from that line reports how many were
+    suppressed. Records at INFO and above always pass.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate <= 0:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(site, (self.rate, now, 0))
+            tokens = min(self.rate, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[site] = (tokens, now, suppressed + 1)
+                return False
+            self._buckets[site] = (tokens - 1, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _PreparingQueueHandler(QueueHandler):
+    """
+    Queue handler that defers formatting to the listener thread.
+
+    The stock QueueHandler formats the message and traceback into one string
+    before enqueueing. Here only the message arguments are merged (they may
+    not be safe to use from another thread) and the traceback is rendered to
+    text, so the listener's formatter still sees a structured record.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _build_formatter(log_format):
+    if log_format == 'json':
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def configure_logging(level=None, log_format=None, log_file=None, debug_rate=None, force=False):
+    """
+    Route all logging through a queue to a background listener thread.
+
+    Request threads only enqueue records; formatting and I/O happen on the
+    listener thread. Settings default to the LOG_LEVEL (INFO), LOG_FORMAT
+    ('json' or 'text', default 'json'), LOG_FILE (optional rotating file) and
+    LOG_DEBUG_RATE (debug records per second per call site, default 10; 0
+    disables the limit) environment variables.
+
+    Like logging.basicConfig, this does nothing if the root logger already
+    has handlers, unless force is set.
+
+    Returns:
+        QueueListener: The running listener, or None if logging was already configured
+    """
+    global _listener
+    root = logging.getLogger()
+    with _listener_lock:
+        if root.handlers and not force:
+            return None
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+
+        level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+        log_format = (log_format or os.environ.get('LOG_FORMAT', 'json')).lower()
+        log_file = log_file or os.environ.get('LOG_FILE')
+        debug_rate = float(os.environ.get('LOG_DEBUG_RATE', 10)) if debug_rate is None else debug_rate
+
+        formatter = _build_formatter(log_format)
+        handlers = [logging.StreamHandler(sys.stderr)]
+        if log_file:
+            handlers.append(RotatingFileHandler(log_file, maxBytes=50 * 1024 * 1024, backupCount=5))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        queue_handler = _PreparingQueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(RequestIdFilter())
+        queue_handler.addFilter(DebugRateLimitFilter(debug_rate))
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+        return _listener
+
+
+def _stop_listener():
+    """Flush queued records on interpreter exit"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def init_request_logging(app):
+    """
+    Give every request an ID that is attached to its log records.
+
+    The ID is taken from an incoming X-Request-ID header when present, so it
+    can be correlated with a proxy's logs, and is echoed in the response.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def assign_request_id():
+        request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+        g.request_id_token = request_id_var.set(request_id)
+
+    @app.after_request
+    def echo_request_id(response):
+        request_id = request_id_var.get()
+        if request_id is not None:
+            response.headers['X-Request-ID'] = request_id
+        token = g.pop('request_id_token', None)
+        if token is not None:
+            request_id_var.reset(token)
+        return response
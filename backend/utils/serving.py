@@ -0,0 +1,250 @@
+import os
+import sys
+import math
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from flask import current_app, request, jsonify
+
+from utils.instrumentation import REGISTRY
+
+# Configure logging
+logger = logging.getLogger('inventory_optimizer_serving')
+
+# Environment variables sizing the thread pools of Polars and of the BLAS/OpenMP
+# libraries behind NumPy; each is read once, when its library is first imported
+THREAD_POOL_ENV_VARS = ('POLARS_MAX_THREADS', 'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+# Variables each library reads
+_LIBRARY_ENV_VARS = {
+    'polars': ('POLARS_MAX_THREADS',),
+    'numpy': ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+}
+
+# Serializes changes to THREAD_POOL_ENV_VARS while pool processes are spawned
+_pool_environment_lock = threading.Lock()
+
+# Smoothing factor of the running average of heavy request durations
+_DURATION_SMOOTHING = 0.2
+
+# Bytes read at a time when discarding the body of a rejected request
+_DISCARD_BLOCK_SIZE = 64 * 1024
+
+# Longest Retry-After suggested to a rejected client, in seconds
+MAX_RETRY_AFTER = 60
+
+HEAVY_IN_FLIGHT = REGISTRY.gauge(
+    'inventory_optimizer_heavy_requests_in_flight', 'CPU-heavy requests currently running in this worker')
+HEAVY_REJECTED = REGISTRY.counter(
+    'inventory_optimizer_heavy_requests_rejected_total', 'CPU-heavy requests turned away with 429', ['endpoint'])
+
+
+def threads_per_worker(workers, cpu_count=None):
+    """Share of the CPUs each of ``workers`` server processes may use, at least one"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, cpu_count // max(1, workers))
+
+
+def apply_thread_budget(workers=None):
+    """
+    Size Polars and NumPy thread pools to this worker's share of the CPUs.
+
+    Each library sizes its pool to every core by default, so several server
+    workers on one host would oversubscribe the CPU. The budget is exported
+    through THREAD_POOL_ENV_VARS and must be applied before polars or numpy
+    is imported. Variables already set in the environment are kept.
+
+    Args:
+        workers (int, optional): Server worker processes on this host
+            (default: WEB_CONCURRENCY, or 1)
+
+    Returns:
+        int: Threads Polars may use in this process, i.e. POLARS_MAX_THREADS
+    """
+    if workers is None:
+        workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    threads = threads_per_worker(workers)
+    applied = [name for name in THREAD_POOL_ENV_VARS if name not in os.environ]
+    for name in applied:
+        os.environ[name] = str(threads)
+
+    # Variables inherited from the environment, as by spawned pool processes,
+    # were in place when the libraries were imported
+    imported = [module for module in ('polars', 'numpy') if module in sys.modules
+                and any(name in applied for name in _LIBRARY_ENV_VARS[module])]
+    if imported:
+        logger.warning("Thread budget applied after %s was imported; its thread pool keeps its size",
+                       ', '.join(imported))
+    try:
+        return max(1, int(os.environ['POLARS_MAX_THREADS']))
+    except ValueError:
+        return threads
+
+
+@contextmanager
+def pool_environment(threads):
+    """
+    Export a pool process's share of the thread budget while it is spawned.
+
+    A spawned process inherits the server worker's whole thread budget, so
+    a pool of several processes would oversubscribe it. The process also
+    imports the parent's main module, and with it polars and numpy, before
+    its initializer runs, so its share must already be in the environment
+    it starts with. ProcessPoolExecutor spawns processes on demand inside
+    submit, so pools submit inside this block. The parent's variables are
+    restored afterwards; its own libraries read them long before.
+
+    Args:
+        threads (int, optional): Threads each library may use in a pool
+            process; None keeps the inherited settings
+    """
+    if threads is None:
+        yield
+        return
+    with _pool_environment_lock:
+        saved = {name: os.environ.get(name) for name in THREAD_POOL_ENV_VARS}
+        for name in THREAD_POOL_ENV_VARS:
+            os.environ[name] = str(threads)
+        try:
+            yield
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def init_pool_process(threads=None):
+    """
+    Initializer of spawned worker pool processes.
+
+    Exports the process's share of the thread budget, which pools also
+    pass through pool_environment, for libraries the task imports later
+    than the main module. Logging is then configured as in the server.
+
+    Args:
+        threads (int, optional): Threads each library may use in this
+            process; None keeps the inherited settings
+    """
+    from utils.logging_config import configure_logging
+    if threads is not None:
+        for name in THREAD_POOL_ENV_VARS:
+            os.environ[name] = str(threads)
+    configure_logging()
+
+
+class AdmissionController:
+    """
+    Cap the number of CPU-heavy requests a worker runs at once.
+
+    A request waits up to ``wait_seconds`` for a free slot and is otherwise
+    turned away, so a saturated server answers quickly instead of letting
+    every request slow down together. Durations of admitted requests feed a
+    running average used to suggest when a rejected client should retry.
+    """
+
+    def __init__(self, max_concurrent=1, wait_seconds=0.5):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be >= 1")
+        self.max_concurrent = max_concurrent
+        self.wait_seconds = max(0.0, wait_seconds)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._average_seconds = None
+
+    def acquire(self):
+        """Take a slot, waiting at most wait_seconds; returns False if none freed up"""
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            return False
+        HEAVY_IN_FLIGHT.inc()
+        return True
+
+    def release(self, seconds):
+        """Give back a slot held for ``seconds``"""
+        with self._lock:
+            if self._average_seconds is None:
+                self._average_seconds = seconds
+            else:
+                self._average_seconds += _DURATION_SMOOTHING * (seconds - self._average_seconds)
+        HEAVY_IN_FLIGHT.dec()
+        self._slots.release()
+
+    @contextmanager
+    def hold(self):
+        """
+        Hold a slot for background work started by a request, such as an
+        upload conversion, waiting as long as it takes for one to free up.
+        """
+        self._slots.acquire()
+        HEAVY_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def retry_after(self):
+        """Whole seconds until a slot is likely to be free"""
+        with self._lock:
+            average = self._average_seconds
+        if average is None:
+            return 1
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(average / self.max_concurrent)))
+
+
+def _discard_body():
+    """
+    Read and drop the request body.
+
+    A client still sending an upload when the response arrives would
+    otherwise see the connection reset instead of the 429.
+    """
+    stream = request.stream
+    while stream.read(_DISCARD_BLOCK_SIZE):
+        pass
+
+
+def heavy_request(view):
+    """
+    Run a view only when the worker's admission controller has a free slot.
+
+    Saturated workers respond with 429 Too Many Requests and a Retry-After
+    header. Views run unrestricted when admission control is not set up.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        controller = current_app.extensions.get('admission_controller')
+        if controller is None:
+            return view(*args, **kwargs)
+
+        if not controller.acquire():
+            retry_after = controller.retry_after()
+            endpoint = request.url_rule.rule if request.url_rule is not None else request.path
+            HEAVY_REJECTED.inc(endpoint=endpoint)
+            logger.warning("Rejected %s %s: %s heavy requests already running",
+                           request.method, endpoint, controller.max_concurrent)
+            _discard_body()
+            response = jsonify({"error": "Server is busy, please retry later", "retry_after": retry_after})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+
+        start = time.perf_counter()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            controller.release(time.perf_counter() - start)
+    return wrapper
+
+
+def init_admission_control(app):
+    """Create the worker's admission controller from MAX_HEAVY_REQUESTS and ADMISSION_WAIT_SECONDS"""
+    controller = AdmissionController(app.config['MAX_HEAVY_REQUESTS'], app.config['ADMISSION_WAIT_SECONDS'])
+    app.extensions['admission_controller'] = controller
+    logger.info("Admission control: %s heavy requests at once, waiting up to %ss for a slot; "
+                "POLARS_MAX_THREADS=%s", controller.max_concurrent, controller.wait_seconds,
+                os.environ.get('POLARS_MAX_THREADS'))
+    return controller
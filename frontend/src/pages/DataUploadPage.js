@@ -13,7 +13,8 @@ import {
   ListItem,
   ListItemIcon,
   ListItemText,
-  Divider
+  Divider,
+  Button
 } from '@mui/material';
 import CheckCircleOutlineIcon from '@mui/icons-material/CheckCircleOutline';
 import FileUploader from '../components/csv/FileUploader';
@@ -26,6 +27,7 @@ const API_URL = 'http://localhost:5000/api';
 function DataUploadPage() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [fileErrors, setFileErrors] = useState([]);
   const [notification, setNotification] = useState({ open: false, message: '', severity: 'info' });
   const navigate = useNavigate();
 
@@ -33,6 +35,8 @@ function DataUploadPage() {
     try {
       setLoading(true);
       setError(null);
+      setFileErrors([]);
+      let failedFiles = [];
       
       // Create FormData object
       const formData = new FormData();
@@ -48,13 +52,17 @@ function DataUploadPage() {
           }
         });
         
-        // Handle successful upload
-        console.log('Files uploaded successfully:', response.data);
+        // Handle successful upload; files that failed are listed under errors
+        console.log('Files uploaded:', response.data);
+        failedFiles = response.data.errors || [];
+        setFileErrors(failedFiles);
         
         setNotification({
           open: true,
-          message: `Successfully uploaded ${response.data.files.length} files.`,
-          severity: 'success'
+          message: failedFiles.length > 0
+            ? `Uploaded ${response.data.files.length} of ${response.data.files.length + failedFiles.length} files. ${failedFiles.length} failed.`
+            : `Successfully uploaded ${response.data.files.length} files.`,
+          severity: failedFiles.length > 0 ? 'warning' : 'success'
         });
         
         // Store the real file data
@@ -62,6 +70,18 @@ function DataUploadPage() {
         localStorage.setItem('filesToOptimize', JSON.stringify(response.data.files));
         localStorage.setItem('usingDemoData', 'false');
       } catch (apiError) {
+        if (apiError.response) {
+          // The server rejected every file; show why instead of falling back to demo data
+          const data = apiError.response.data || {};
+          setFileErrors(data.errors || []);
+          setError(data.error || 'Failed to upload files. Please try again.');
+          setNotification({
+            open: true,
+            message: 'None of the files could be uploaded.',
+            severity: 'error'
+          });
+          return;
+        }
         console.warn('API upload failed, using demo mode:', apiError);
         
         // For demo purposes, create sample files
@@ -100,10 +120,13 @@ function DataUploadPage() {
       // Set data ready flag
       localStorage.setItem('dataReady', 'true');
       
-      // Navigate to data management page after successful upload
-      setTimeout(() => {
-        navigate('/data-management');
-      }, 2000);
+      // Navigate to data management page after successful upload; stay
+      // on this page when some files failed so their errors can be read
+      if (failedFiles.length === 0) {
+        setTimeout(() => {
+          navigate('/data-management');
+        }, 2000);
+      }
       
     } catch (error) {
       console.error('Error in file upload process:', error);
@@ -153,6 +176,29 @@ function DataUploadPage() {
                 {error}
               </Alert>
             )}
+            
+            {fileErrors.length > 0 && (
+              <Alert severity="warning" sx={{ mt: 2 }}>
+                <Typography variant="body2" gutterBottom>
+                  These files were not uploaded:
+                </Typography>
+                <List dense disablePadding>
+                  {fileErrors.map((fileError, index) => (
+                    <ListItem key={`${fileError.name}-${index}`} disableGutters>
+                      <ListItemText primary={fileError.name} secondary={fileError.error} />
+                    </ListItem>
+                  ))}
+                </List>
+              </Alert>
+            )}
+            
+            {fileErrors.length > 0 && !error && (
+              <Box sx={{ mt: 2, display: 'flex', justifyContent: 'flex-end' }}>
+                <Button variant="contained" onClick={handleFinalize}>
+                  Continue with uploaded files
+                </Button>
+              </Box>
+            )}
           </Paper>
         </Grid>
         
@@ -24,6 +24,9 @@ import { useNavigate } from 'react-router-dom';
 // Define the API service URL
 const API_URL = 'http://localhost:5000/api';
 
+// Number of result rows loaded into the table
+const RESULTS_PAGE_SIZE = 1000;
+
 function OptimizationResultsPage() {
   const [loading, setLoading] = useState(false);
   const [optimizing, setOptimizing] = useState(false);
@@ -103,7 +106,13 @@ function OptimizationResultsPage() {
       
       // Handle successful optimization
       console.log('Optimization completed:', response.data);
-      setOptimizationResults(response.data);
+
+      // The optimize response only carries the summary and a result handle,
+      // so fetch the first page of rows from the paged results endpoint
+      const page = await axios.get(`${API_URL}/results/${response.data.result_id}`, {
+        params: { limit: RESULTS_PAGE_SIZE, sort: 'cost_savings', order: 'desc' }
+      });
+      setOptimizationResults({ ...response.data, data: page.data.data });
       
       setNotification({
         open: true,